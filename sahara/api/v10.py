@@ -57,6 +57,12 @@ def clusters_get(cluster_id):
     return u.render(api.get_cluster(cluster_id).to_wrapped_dict())
 
 
+@rest.get('/clusters/<cluster_id>/timeline')
+@v.check_exists(api.get_cluster, 'cluster_id')
+def clusters_timeline(cluster_id):
+    return u.render(timeline=api.get_cluster_timeline(cluster_id))
+
+
 @rest.delete('/clusters/<cluster_id>')
 @v.check_exists(api.get_cluster, 'cluster_id')
 def clusters_delete(cluster_id):
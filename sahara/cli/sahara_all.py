@@ -55,5 +55,8 @@ def main():
     server.setup_sahara_api('all-in-one')
     server.setup_sahara_engine()
 
-    wsgi.server(eventlet.listen((cfg.CONF.host, cfg.CONF.port), backlog=500),
-                app, log=logging.WritableLogger(LOG), debug=False)
+    sock = eventlet.listen((cfg.CONF.host, cfg.CONF.port), backlog=500)
+    try:
+        wsgi.server(sock, app, log=logging.WritableLogger(LOG), debug=False)
+    finally:
+        server.stop_sahara_engine()
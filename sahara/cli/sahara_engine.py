@@ -46,4 +46,7 @@ def main():
     server.setup_sahara_engine()
 
     ops_server = ops.OpsServer()
-    ops_server.start()
+    try:
+        ops_server.start()
+    finally:
+        server.stop_sahara_engine()
@@ -0,0 +1,121 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Forwards connections into a network namespace.
+
+The process is started inside of a router namespace and listens on
+a unix socket given as the only argument. Unix sockets are not bound
+to network namespaces, so processes outside of the namespace can
+connect to it. Every client sends 'host port' line first, the
+forwarder opens TCP connection to the address from inside of the
+namespace, answers 'OK' or 'ERR <reason>' line and then relays data
+in both directions.
+
+The process exits when its stdin is closed, i.e. when the sahara
+process which started it is gone.
+"""
+
+import os
+import socket
+import sys
+import threading
+
+
+CONNECT_TIMEOUT = 30
+BUFFER_SIZE = 32768
+
+
+def _read_line(sock):
+    # read byte by byte not to consume data following the line
+    line = ''
+    while not line.endswith('\n'):
+        char = sock.recv(1)
+        if not char:
+            raise socket.error('Connection closed')
+        line += char
+    return line.strip()
+
+
+def _pump(source, destination):
+    try:
+        while True:
+            data = source.recv(BUFFER_SIZE)
+            if not data:
+                break
+            destination.sendall(data)
+    except socket.error:
+        pass
+    finally:
+        try:
+            destination.shutdown(socket.SHUT_WR)
+        except socket.error:
+            pass
+
+
+def _serve(client):
+    upstream = None
+    try:
+        host, port = _read_line(client).split()
+        try:
+            upstream = socket.create_connection((host, int(port)),
+                                                CONNECT_TIMEOUT)
+            upstream.settimeout(None)
+        except (socket.error, ValueError) as e:
+            client.sendall('ERR %s\n' % e)
+            return
+
+        client.sendall('OK\n')
+        reader = threading.Thread(target=_pump, args=(upstream, client))
+        reader.daemon = True
+        reader.start()
+        _pump(client, upstream)
+        reader.join()
+    except (socket.error, ValueError):
+        pass
+    finally:
+        if upstream:
+            upstream.close()
+        client.close()
+
+
+def _wait_for_parent(server, path):
+    sys.stdin.read()
+    server.close()
+    if os.path.exists(path):
+        os.unlink(path)
+    os._exit(0)
+
+
+def main():
+    path = sys.argv[1]
+    if os.path.exists(path):
+        os.unlink(path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(128)
+
+    watcher = threading.Thread(target=_wait_for_parent, args=(server, path))
+    watcher.daemon = True
+    watcher.start()
+
+    sys.stdout.write('ready\n')
+    sys.stdout.flush()
+
+    while True:
+        client, _ = server.accept()
+        worker = threading.Thread(target=_serve, args=(client,))
+        worker.daemon = True
+        worker.start()
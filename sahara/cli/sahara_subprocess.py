@@ -17,26 +17,48 @@
 
 import pickle
 import sys
+import threading
 import traceback
 
+from sahara.utils import procutils
+
+
+def _serve(request, write_lock):
+    request_id, payload = request
+    result = dict()
+
+    try:
+        func, args, kwargs = pickle.loads(payload)
+        result['output'] = func(*args, **kwargs)
+    except BaseException as e:
+        result['exception'] = e.__class__.__name__ + ': ' + str(e)
+        result['traceback'] = traceback.format_exc()
+
+    with write_lock:
+        try:
+            procutils.write_frame(sys.stdout, (request_id, result))
+        except Exception as e:
+            # result could be not picklable
+            procutils.write_frame(sys.stdout, (request_id, {
+                'exception': e.__class__.__name__ + ': ' + str(e)}))
+
 
 def main():
     # NOTE(dmitryme): since we do not read stderr in the main process,
     # we need to flush it somewhere, otherwise both processes might
     # hang because of i/o buffer overflow.
     with open('/dev/null', 'w') as sys.stderr:
+        write_lock = threading.Lock()
         while True:
-            result = dict()
-
             try:
-                func = pickle.load(sys.stdin)
-                args = pickle.load(sys.stdin)
-                kwargs = pickle.load(sys.stdin)
-
-                result['output'] = func(*args, **kwargs)
-            except BaseException as e:
-                result['exception'] = e.__class__.__name__ + ': ' + str(e)
-                result['traceback'] = traceback.format_exc()
+                request = procutils.read_frame(sys.stdin)
+            except EOFError:
+                # parent process has closed the pipe, shutting down
+                break
 
-            pickle.dump(result, sys.stdout)
-            sys.stdout.flush()
+            # requests are served concurrently and could be
+            # answered in any order, parent matches them by id
+            worker = threading.Thread(target=_serve,
+                                      args=(request, write_lock))
+            worker.daemon = True
+            worker.start()
@@ -65,6 +65,13 @@ class LocalApi(object):
         """Return the cluster or None if it does not exist."""
         return self._manager.cluster_get(context, _get_id(cluster))
 
+    def cluster_get_status(self, context, cluster):
+        """Return status of the cluster or None if it does not exist.
+
+        Much cheaper than cluster_get since the cluster is not loaded.
+        """
+        return self._manager.cluster_get_status(context, _get_id(cluster))
+
     @r.wrap(r.ClusterResource)
     def cluster_get_all(self, context, **kwargs):
         """Get all clusters filtered by **kwargs  e.g.
@@ -143,6 +150,23 @@ class LocalApi(object):
         """Remove volume_id in instance."""
         self._manager.remove_volume(context, _get_id(instance), volume_id)
 
+    ## Timeline ops
+
+    def timeline_event_add(self, context, cluster, values):
+        """Create a cluster Timeline Event from the values dictionary.
+
+        Return ID of the created Timeline Event.
+        """
+        return self._manager.timeline_event_add(context, _get_id(cluster),
+                                                values)
+
+    def timeline_events_get(self, context, cluster):
+        """Return list of Timeline Events of the cluster as dicts.
+
+        Events are ordered by start time.
+        """
+        return self._manager.timeline_events_get(context, _get_id(cluster))
+
     ## Cluster Template ops
 
     @r.wrap(r.ClusterTemplateResource)
@@ -116,6 +116,10 @@ class ConductorManager(db_base.Base):
         """Return the cluster or None if it does not exist."""
         return self.db.cluster_get(context, cluster)
 
+    def cluster_get_status(self, context, cluster):
+        """Return status of the cluster or None if it does not exist."""
+        return self.db.cluster_get_status(context, cluster)
+
     def cluster_get_all(self, context, **kwargs):
         """Get all clusters filtered by **kwargs  e.g.
             cluster_get_all(plugin_name='vanilla', hadoop_version='1.1')
@@ -214,6 +218,18 @@ class ConductorManager(db_base.Base):
         """Remove volume_id in instance."""
         self.db.remove_volume(context, instance, volume_id)
 
+    ## Timeline ops
+
+    def timeline_event_add(self, context, cluster, values):
+        """Create a cluster Timeline Event from the values dictionary."""
+        values = copy.deepcopy(values)
+        values['tenant_id'] = context.tenant_id
+        return self.db.timeline_event_add(context, cluster, values)
+
+    def timeline_events_get(self, context, cluster):
+        """Return Timeline Events of the cluster ordered by start time."""
+        return self.db.timeline_events_get(context, cluster)
+
     ## Cluster Template ops
 
     def cluster_template_get(self, context, cluster_template):
@@ -120,6 +120,7 @@ class Instance(object):
     internal_ip
     management_ip
     volumes
+    phase_times - dict of provisioning phase -> time it was completed at
     """
 
     def hostname(self):
@@ -17,11 +17,11 @@ import eventlet
 from eventlet.green import threading
 from eventlet.green import time
 from eventlet import greenpool
-from eventlet import semaphore
 from oslo.config import cfg
 
 from sahara import exceptions as ex
 from sahara.openstack.common import log as logging
+from sahara.utils.openstack import catalog
 
 
 CONF = cfg.CONF
@@ -39,7 +39,8 @@ class Context(object):
                  tenant_name=None,
                  roles=None,
                  is_admin=None,
-                 remote_semaphore=None,
+                 remote_interactive=False,
+                 clients=None,
                  **kwargs):
         if kwargs:
             LOG.warn('Arguments dropped when creating context: %s', kwargs)
@@ -50,12 +51,31 @@ class Context(object):
         self.username = username
         self.tenant_name = tenant_name
         self.is_admin = is_admin
-        self.remote_semaphore = remote_semaphore or semaphore.Semaphore(
-            CONF.cluster_remote_threshold)
+        self.remote_interactive = remote_interactive
         self.roles = roles
+        # OpenStack clients shared by the context and its clones,
+        # see sahara.utils.openstack.base.get_client
+        self.clients = clients if clients is not None else {}
+
+    @property
+    def service_catalog(self):
+        return self._service_catalog
+
+    @service_catalog.setter
+    def service_catalog(self, service_catalog):
+        self._service_catalog = service_catalog
+        self._service_catalog_index = None
+
+    @property
+    def service_catalog_index(self):
+        """Service catalog parsed for endpoint lookups."""
+        if self._service_catalog_index is None:
+            self._service_catalog_index = catalog.ServiceCatalog(
+                self._service_catalog)
+        return self._service_catalog_index
 
     def clone(self):
-        return Context(
+        ctx = Context(
             self.user_id,
             self.tenant_id,
             self.token,
@@ -64,7 +84,11 @@ class Context(object):
             self.tenant_name,
             self.roles,
             self.is_admin,
-            self.remote_semaphore)
+            self.remote_interactive,
+            self.clients)
+        # clones share the catalog parsed once
+        ctx._service_catalog_index = self.service_catalog_index
+        return ctx
 
     def to_dict(self):
         return {
@@ -112,6 +112,11 @@ def cluster_get(context, cluster):
     return IMPL.cluster_get(context, cluster)
 
 
+def cluster_get_status(context, cluster):
+    """Return status of the cluster or None if it does not exist."""
+    return IMPL.cluster_get_status(context, cluster)
+
+
 @to_dict
 def cluster_get_all(context, **kwargs):
     """Get all clusters filtered by **kwargs  e.g.
@@ -183,6 +188,19 @@ def remove_volume(context, instance, volume_id):
     IMPL.remove_volume(context, instance, volume_id)
 
 
+## Timeline ops
+
+def timeline_event_add(context, cluster, values):
+    """Create a cluster Timeline Event from the values dictionary."""
+    return IMPL.timeline_event_add(context, cluster, values)
+
+
+@to_dict
+def timeline_events_get(context, cluster):
+    """Return Timeline Events of the cluster ordered by start time."""
+    return IMPL.timeline_events_get(context, cluster)
+
+
 ## Cluster Template ops
 
 @to_dict
@@ -0,0 +1,40 @@
+# Copyright 2014 OpenStack Foundation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""add phase_times to instances
+
+Revision ID: 007
+Revises: 006
+Create Date: 2014-07-14 12:31:07.104273
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+
+from alembic import op
+import sqlalchemy as sa
+
+from sahara.db.sqlalchemy import types as st
+
+
+def upgrade():
+    op.add_column('instances',
+                  sa.Column('phase_times', st.JsonEncoded(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('instances', 'phase_times')
@@ -0,0 +1,59 @@
+# Copyright 2014 OpenStack Foundation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""add timeline_events table
+
+Revision ID: 008
+Revises: 007
+Create Date: 2014-07-21 16:02:45.318920
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+
+from alembic import op
+import sqlalchemy as sa
+
+MYSQL_ENGINE = 'InnoDB'
+MYSQL_CHARSET = 'utf8'
+
+
+def upgrade():
+    op.create_table('timeline_events',
+                    sa.Column('created_at', sa.DateTime(), nullable=True),
+                    sa.Column('updated_at', sa.DateTime(), nullable=True),
+                    sa.Column('id', sa.String(length=36), nullable=False),
+                    sa.Column('tenant_id', sa.String(length=36),
+                              nullable=True),
+                    sa.Column('cluster_id', sa.String(length=36),
+                              nullable=True),
+                    sa.Column('event_type', sa.String(length=36),
+                              nullable=False),
+                    sa.Column('name', sa.String(length=80), nullable=False),
+                    sa.Column('instance_name', sa.String(length=80),
+                              nullable=True),
+                    sa.Column('start_time', sa.DateTime(), nullable=True),
+                    sa.Column('end_time', sa.DateTime(), nullable=True),
+                    sa.ForeignKeyConstraint(['cluster_id'],
+                                            ['clusters.id'], ),
+                    sa.PrimaryKeyConstraint('id'),
+                    mysql_engine=MYSQL_ENGINE,
+                    mysql_charset=MYSQL_CHARSET)
+
+
+def downgrade():
+    op.drop_table('timeline_events')
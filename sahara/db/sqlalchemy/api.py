@@ -26,6 +26,7 @@ from sahara import exceptions as ex
 from sahara.openstack.common.db import exception as db_exc
 from sahara.openstack.common.db.sqlalchemy import session as db_session
 from sahara.openstack.common import log as logging
+from sahara.openstack.common import timeutils
 
 
 LOG = logging.getLogger(__name__)
@@ -143,6 +144,13 @@ def cluster_get(context, cluster_id):
     return _cluster_get(context, get_session(), cluster_id)
 
 
+def cluster_get_status(context, cluster_id):
+    # query the only column not to load node groups, instances, etc.
+    query = model_query(m.Cluster.status, context)
+    row = query.filter_by(id=cluster_id).first()
+    return row[0] if row else None
+
+
 def cluster_get_all(context, **kwargs):
     query = model_query(m.Cluster, context)
     return query.filter_by(**kwargs).all()
@@ -183,11 +191,30 @@ def cluster_update(context, cluster_id, values):
         if cluster is None:
             raise ex.NotFoundException(cluster_id,
                                        "Cluster id '%s' not found!")
+        status = values.get('status')
+        if status is not None and status != cluster.status:
+            _record_status_change(context, session, cluster, status)
         cluster.update(values)
 
     return cluster
 
 
+def _record_status_change(context, session, cluster, status):
+    now = timeutils.utcnow()
+    query = model_query(m.TimelineEvent, context, session)
+    for event in query.filter_by(cluster_id=cluster.id, event_type='status',
+                                 end_time=None):
+        event.end_time = now
+
+    event = m.TimelineEvent()
+    event.update({'tenant_id': cluster.tenant_id,
+                  'cluster_id': cluster.id,
+                  'event_type': 'status',
+                  'name': status,
+                  'start_time': now})
+    event.save(session=session)
+
+
 def cluster_destroy(context, cluster_id):
     session = get_session()
     with session.begin():
@@ -323,6 +350,31 @@ def remove_volume(context, instance_id, volume_id):
         instance.volumes.remove(volume_id)
 
 
+## Timeline ops
+
+def timeline_event_add(context, cluster_id, values):
+    session = get_session()
+    with session.begin():
+        # query the id only not to load node groups, instances, etc.
+        query = model_query(m.Cluster.id, context, session)
+        if not query.filter_by(id=cluster_id).first():
+            raise ex.NotFoundException(cluster_id,
+                                       "Cluster id '%s' not found!")
+
+        event = m.TimelineEvent()
+        values['cluster_id'] = cluster_id
+        event.update(values)
+        event.save(session=session)
+
+    return event.id
+
+
+def timeline_events_get(context, cluster_id):
+    query = model_query(m.TimelineEvent, context)
+    return query.filter_by(cluster_id=cluster_id).order_by(
+        m.TimelineEvent.start_time).all()
+
+
 ## Cluster Template ops
 
 def _cluster_template_get(context, session, cluster_template_id):
@@ -21,6 +21,7 @@ from sqlalchemy.orm import relationship
 
 from sahara.db.sqlalchemy import model_base as mb
 from sahara.db.sqlalchemy import types as st
+from sahara.openstack.common import timeutils
 
 
 ## Helpers
@@ -71,6 +72,8 @@ class Cluster(mb.SaharaBase):
                                     sa.ForeignKey('cluster_templates.id'))
     cluster_template = relationship('ClusterTemplate',
                                     backref="clusters", lazy='joined')
+    timeline_events = relationship('TimelineEvent', cascade="all,delete",
+                                   backref='cluster')
 
     def to_dict(self):
         d = super(Cluster, self).to_dict()
@@ -134,6 +137,32 @@ class Instance(mb.SaharaBase):
     internal_ip = sa.Column(sa.String(15))
     management_ip = sa.Column(sa.String(15))
     volumes = sa.Column(st.JsonListType())
+    phase_times = sa.Column(st.JsonDictType())
+
+
+class TimelineEvent(mb.SaharaBase):
+    """Status of a cluster or a provisioning step with its duration."""
+
+    __tablename__ = 'timeline_events'
+
+    id = _id_column()
+    tenant_id = sa.Column(sa.String(36))
+    cluster_id = sa.Column(sa.String(36), sa.ForeignKey('clusters.id'))
+    event_type = sa.Column(sa.String(36), nullable=False)
+    name = sa.Column(sa.String(80), nullable=False)
+    instance_name = sa.Column(sa.String(80))
+    start_time = sa.Column(sa.DateTime)
+    end_time = sa.Column(sa.DateTime)
+
+    def to_dict(self):
+        d = super(TimelineEvent, self).to_dict()
+        d['duration'] = None
+        if self.start_time and self.end_time:
+            d['duration'] = timeutils.delta_seconds(self.start_time,
+                                                    self.end_time)
+        mb.datetime_to_str(d, 'start_time')
+        mb.datetime_to_str(d, 'end_time')
+        return d
 
 
 ## Template objects: ClusterTemplate, NodeGroupTemplate, TemplatesRelation
@@ -96,6 +96,20 @@ class RemoteCommandException(SaharaException):
         self.message = self.message.decode('ascii', 'ignore')
 
 
+class RemoteBroadcastException(SaharaException):
+    message = "Remote operation failed on instances: %s"
+
+    def __init__(self, failures):
+        self.code = "REMOTE_BROADCAST_FAILED"
+
+        self.failures = failures
+
+        self.message = self.message % ', '.join(sorted(failures))
+        for instance_name in sorted(failures):
+            self.message += '\n%s: %s' % (instance_name,
+                                          failures[instance_name])
+
+
 class InvalidDataException(SaharaException):
     """General exception to use for invalid data
 
@@ -216,3 +230,11 @@ class SystemError(SaharaException):
 
     def __init__(self, message):
         self.message = message
+
+
+class TimeoutException(SaharaException):
+    code = "TIMEOUT"
+
+    def __init__(self, operation, timeout):
+        self.message = ("Operation '%s' timed out after %s second(s)"
+                        % (operation, timeout))
@@ -34,6 +34,7 @@ from sahara.service import api as service_api
 from sahara.service.edp import api as edp_api
 from sahara.service import ops as service_ops
 from sahara.service import periodic
+from sahara.service import warm_pool
 from sahara.utils import api as api_utils
 from sahara.utils import remote
 
@@ -112,6 +113,12 @@ def setup_sahara_engine():
     remote_driver = _get_remote_driver()
     remote.setup_remote(remote_driver, engine)
 
+    warm_pool.setup()
+
+
+def stop_sahara_engine():
+    warm_pool.shutdown()
+
 
 def make_app():
     """App builder (wsgi)
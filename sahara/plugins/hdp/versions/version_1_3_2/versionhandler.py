@@ -20,12 +20,12 @@ from oslo.config import cfg
 import pkg_resources as pkg
 import requests
 
-from sahara import context
 from sahara.plugins.general import exceptions as ex
 from sahara.plugins.hdp import clusterspec as cs
 from sahara.plugins.hdp import configprovider as cfgprov
 from sahara.plugins.hdp.versions import abstractversionhandler as avm
 from sahara.plugins.hdp.versions.version_1_3_2 import services
+from sahara.utils import poll_utils
 from sahara import version
 
 
@@ -307,23 +307,27 @@ class AmbariClient():
                request_id)
 
     def _wait_for_async_request(self, request_url, ambari_info):
-        started = False
-        while not started:
+        failed = []
+
+        def _is_request_finished():
             result = self._get(request_url, ambari_info)
             LOG.debug(
                 'async request ' + request_url + ' response:\n' + result.text)
             json_result = json.loads(result.text)
-            started = True
+            finished = True
             for items in json_result['items']:
                 status = items['Tasks']['status']
                 if status == 'FAILED' or status == 'ABORTED':
-                    return False
-                else:
-                    if status != 'COMPLETED':
-                        started = False
+                    failed.append(status)
+                    return True
+                elif status != 'COMPLETED':
+                    finished = False
+            return finished
 
-            context.sleep(5)
-        return started
+        poll_utils.poll(_is_request_finished, 'ambari_async_request',
+                        timeout=CONF.ambari_request_timeout,
+                        delay=1, max_delay=10, backoff=1.5)
+        return not failed
 
     def _finalize_ambari_state(self, ambari_info):
         LOG.info('Finalizing Ambari cluster state.')
@@ -474,12 +478,8 @@ class AmbariClient():
             'Waiting for all Ambari agents to register with server ...')
 
         url = 'http://{0}/api/v1/hosts'.format(ambari_info.get_address())
-        result = None
-        json_result = None
 
-        #TODO(jspeidel): timeout
-        while result is None or len(json_result['items']) < num_hosts:
-            context.sleep(5)
+        def _are_hosts_registered():
             try:
                 result = self._get(url, ambari_info)
                 json_result = json.loads(result.text)
@@ -489,9 +489,14 @@ class AmbariClient():
                 for hosts in json_result['items']:
                     LOG.debug('Registered Host: {0}'.format(
                         hosts['Hosts']['host_name']))
+                return len(json_result['items']) >= num_hosts
             except requests.ConnectionError:
-                #TODO(jspeidel): max wait time
                 LOG.info('Waiting to connect to ambari server ...')
+                return False
+
+        poll_utils.poll(_are_hosts_registered, 'ambari_host_registration',
+                        timeout=CONF.ambari_request_timeout,
+                        delay=5, max_delay=10, backoff=1.5)
 
     def update_ambari_admin_user(self, password, ambari_info):
         old_pwd = ambari_info.password
@@ -235,34 +235,28 @@ class SparkProvider(p.ProvisioningPluginBase):
                    nn_path, dn_path,
                    nn_path, dn_path)
 
+        setup_cmds = [
+            'sudo chmod 0500 /tmp/sahara-hadoop-init.sh',
+            'sudo /tmp/sahara-hadoop-init.sh '
+            '>> /tmp/sahara-hadoop-init.log 2>&1',
+            hdfs_dir_cmd,
+            key_cmd
+        ]
+
+        if c_helper.is_data_locality_enabled(cluster):
+            files_hadoop['/etc/hadoop/topology.sh'] = f.get_file_text(
+                'plugins/spark/resources/topology.sh')
+            setup_cmds.append('sudo chmod +x /etc/hadoop/topology.sh')
+
         with remote.get_remote(instance) as r:
-            r.execute_command(
-                'sudo chown -R $USER:$USER /etc/hadoop'
-            )
-            r.execute_command(
+            r.execute_commands([
+                'sudo chown -R $USER:$USER /etc/hadoop',
                 'sudo chown -R $USER:$USER /opt/spark'
-            )
+            ])
             r.write_files_to(files_hadoop)
             r.write_files_to(files_spark)
             r.write_files_to(files_init)
-            r.execute_command(
-                'sudo chmod 0500 /tmp/sahara-hadoop-init.sh'
-            )
-            r.execute_command(
-                'sudo /tmp/sahara-hadoop-init.sh '
-                '>> /tmp/sahara-hadoop-init.log 2>&1')
-
-            r.execute_command(hdfs_dir_cmd)
-            r.execute_command(key_cmd)
-
-            if c_helper.is_data_locality_enabled(cluster):
-                r.write_file_to(
-                    '/etc/hadoop/topology.sh',
-                    f.get_file_text(
-                        'plugins/spark/resources/topology.sh'))
-                r.execute_command(
-                    'sudo chmod +x /etc/hadoop/topology.sh'
-                )
+            r.execute_commands(setup_cmds)
 
             self._write_topology_data(r, cluster, extra)
 
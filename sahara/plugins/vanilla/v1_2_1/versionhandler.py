@@ -31,7 +31,7 @@ from sahara.plugins.vanilla.v1_2_1 import scaling as sc
 from sahara.topology import topology_helper as th
 from sahara.utils import edp
 from sahara.utils import files as f
-from sahara.utils import general as g
+from sahara.utils import poll_utils
 from sahara.utils import remote
 
 
@@ -161,20 +161,13 @@ class VersionHandler(avm.AbstractVersionHandler):
 
         LOG.info("Waiting %s datanodes to start up" % datanodes_count)
         with remote.get_remote(vu.get_namenode(cluster)) as r:
-            while True:
-                if run.check_datanodes_count(r, datanodes_count):
-                    LOG.info(
-                        'Datanodes on cluster %s has been started' %
-                        cluster.name)
-                    return
-
-                context.sleep(1)
-
-                if not g.check_cluster_exists(cluster):
-                    LOG.info(
-                        'Stop waiting datanodes on cluster %s since it has '
-                        'been deleted' % cluster.name)
-                    return
+            if poll_utils.poll(
+                    lambda: run.check_datanodes_count(r, datanodes_count),
+                    'await_datanodes',
+                    timeout=CONF.datanodes_startup_timeout,
+                    delay=1, max_delay=10, backoff=1.5, cluster=cluster):
+                LOG.info('Datanodes on cluster %s has been started' %
+                         cluster.name)
 
     def _extract_configs_to_extra(self, cluster):
         oozie = vu.get_oozie(cluster)
@@ -293,32 +286,26 @@ class VersionHandler(avm.AbstractVersionHandler):
                   'sudo chown -R hadoop:hadoop /home/hadoop/.ssh && ' \
                   'sudo chmod 600 /home/hadoop/.ssh/{id_rsa,authorized_keys}'
 
+        setup_cmds = [
+            'sudo chmod 0500 /tmp/sahara-hadoop-init.sh',
+            'sudo /tmp/sahara-hadoop-init.sh '
+            '>> /tmp/sahara-hadoop-init.log 2>&1',
+            key_cmd
+        ]
+
+        if c_helper.is_data_locality_enabled(cluster):
+            files['/etc/hadoop/topology.sh'] = f.get_file_text(
+                'plugins/vanilla/v1_2_1/resources/topology.sh')
+            setup_cmds.append('sudo chmod +x /etc/hadoop/topology.sh')
+
         with remote.get_remote(instance) as r:
             # TODO(aignatov): sudo chown is wrong solution. But it works.
-            r.execute_command(
-                'sudo chown -R $USER:$USER /etc/hadoop'
-            )
-            r.execute_command(
+            r.execute_commands([
+                'sudo chown -R $USER:$USER /etc/hadoop',
                 'sudo chown -R $USER:$USER /opt/oozie/conf'
-            )
+            ])
             r.write_files_to(files)
-            r.execute_command(
-                'sudo chmod 0500 /tmp/sahara-hadoop-init.sh'
-            )
-            r.execute_command(
-                'sudo /tmp/sahara-hadoop-init.sh '
-                '>> /tmp/sahara-hadoop-init.log 2>&1')
-
-            r.execute_command(key_cmd)
-
-            if c_helper.is_data_locality_enabled(cluster):
-                r.write_file_to(
-                    '/etc/hadoop/topology.sh',
-                    f.get_file_text(
-                        'plugins/vanilla/v1_2_1/resources/topology.sh'))
-                r.execute_command(
-                    'sudo chmod +x /etc/hadoop/topology.sh'
-                )
+            r.execute_commands(setup_cmds)
 
             self._write_topology_data(r, cluster, extra)
             self._push_master_configs(r, cluster, extra, instance)
@@ -334,45 +321,54 @@ class VersionHandler(avm.AbstractVersionHandler):
         if not need_update:
             return
 
+        # existing nodes mostly have up to date files already, so
+        # only the changed ones are written
         with remote.get_remote(instance) as r:
-            self._write_topology_data(r, cluster, extra)
-            self._push_master_configs(r, cluster, extra, instance)
+            self._write_topology_data(r, cluster, extra, only_changed=True)
+            self._push_master_configs(r, cluster, extra, instance,
+                                      only_changed=True)
 
-    def _write_topology_data(self, r, cluster, extra):
+    def _write_topology_data(self, r, cluster, extra, only_changed=False):
         if c_helper.is_data_locality_enabled(cluster):
             topology_data = extra['topology_data']
-            r.write_file_to('/etc/hadoop/topology.data', topology_data)
+            r.write_file_to('/etc/hadoop/topology.data', topology_data,
+                            only_changed=only_changed)
 
-    def _push_master_configs(self, r, cluster, extra, instance):
+    def _push_master_configs(self, r, cluster, extra, instance,
+                             only_changed=False):
         ng_extra = extra[instance.node_group.id]
         node_processes = instance.node_group.node_processes
 
         if 'namenode' in node_processes:
-            self._push_namenode_configs(cluster, r)
+            self._push_namenode_configs(cluster, r, only_changed)
 
         if 'jobtracker' in node_processes:
-            self._push_jobtracker_configs(cluster, r)
+            self._push_jobtracker_configs(cluster, r, only_changed)
 
         if 'oozie' in node_processes:
-            self._push_oozie_configs(cluster, ng_extra, r)
+            self._push_oozie_configs(cluster, ng_extra, r, only_changed)
 
         if 'hiveserver' in node_processes:
             self._push_hive_configs(cluster, ng_extra,
-                                    extra['hive_mysql_passwd'], r)
+                                    extra['hive_mysql_passwd'], r,
+                                    only_changed)
 
-    def _push_namenode_configs(self, cluster, r):
+    def _push_namenode_configs(self, cluster, r, only_changed=False):
         r.write_file_to('/etc/hadoop/dn.incl',
                         utils.generate_fqdn_host_names(
-                            vu.get_datanodes(cluster)))
+                            vu.get_datanodes(cluster)),
+                        only_changed=only_changed)
 
-    def _push_jobtracker_configs(self, cluster, r):
+    def _push_jobtracker_configs(self, cluster, r, only_changed=False):
         r.write_file_to('/etc/hadoop/tt.incl',
                         utils.generate_fqdn_host_names(
-                            vu.get_tasktrackers(cluster)))
+                            vu.get_tasktrackers(cluster)),
+                        only_changed=only_changed)
 
-    def _push_oozie_configs(self, cluster, ng_extra, r):
+    def _push_oozie_configs(self, cluster, ng_extra, r, only_changed=False):
         r.write_file_to('/opt/oozie/conf/oozie-site.xml',
-                        ng_extra['xml']['oozie-site'])
+                        ng_extra['xml']['oozie-site'],
+                        only_changed=only_changed)
 
         if c_helper.is_mysql_enable(cluster):
             sql_script = f.get_file_text(
@@ -380,9 +376,10 @@ class VersionHandler(avm.AbstractVersionHandler):
             files = {
                 '/tmp/create_oozie_db.sql': sql_script
             }
-            r.write_files_to(files)
+            r.write_files_to(files, only_changed=only_changed)
 
-    def _push_hive_configs(self, cluster, ng_extra, hive_mysql_passwd, r):
+    def _push_hive_configs(self, cluster, ng_extra, hive_mysql_passwd, r,
+                           only_changed=False):
         files = {
             '/opt/hive/conf/hive-site.xml':
             ng_extra['xml']['hive-site']
@@ -394,7 +391,7 @@ class VersionHandler(avm.AbstractVersionHandler):
             sql_script = sql_script.replace('pass',
                                             hive_mysql_passwd)
             files.update({'/tmp/create_hive_db.sql': sql_script})
-        r.write_files_to(files)
+        r.write_files_to(files, only_changed=only_changed)
 
     def _set_cluster_info(self, cluster):
         nn = vu.get_namenode(cluster)
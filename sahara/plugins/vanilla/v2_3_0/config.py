@@ -296,4 +296,5 @@ def configure_topology_data(cluster):
         for ng in cluster.node_groups:
             for i in ng.instances:
                 i.remote().write_file_to(HADOOP_CONF_DIR + "/topology.data",
-                                         topology_data, run_as_root=True)
+                                         topology_data, run_as_root=True,
+                                         only_changed=True)
@@ -13,14 +13,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from sahara import context
+from oslo.config import cfg
+
 from sahara.openstack.common import log as logging
 from sahara.plugins.general import exceptions as ex
 from sahara.plugins.vanilla import utils as vu
 from sahara.plugins.vanilla.v2_3_0 import config_helper as c_helper
 from sahara.utils import files
-from sahara.utils import general as g
+from sahara.utils import poll_utils
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
@@ -127,20 +129,12 @@ def await_datanodes(cluster):
 
     LOG.info("Waiting %s datanodes to start up" % datanodes_count)
     with vu.get_namenode(cluster).remote() as r:
-        while True:
-            if _check_datanodes_count(r, datanodes_count):
-                LOG.info(
-                    'Datanodes on cluster %s has been started' %
-                    cluster.name)
-                return
-
-            context.sleep(1)
-
-            if not g.check_cluster_exists(cluster):
-                LOG.info(
-                    'Stop waiting datanodes on cluster %s since it has '
-                    'been deleted' % cluster.name)
-                return
+        if poll_utils.poll(
+                lambda: _check_datanodes_count(r, datanodes_count),
+                'await_datanodes', timeout=CONF.datanodes_startup_timeout,
+                delay=1, max_delay=10, backoff=1.5, cluster=cluster):
+            LOG.info('Datanodes on cluster %s has been started' %
+                     cluster.name)
 
 
 def _check_datanodes_count(remote, count):
@@ -21,6 +21,7 @@ from sahara.plugins.vanilla import utils as vu
 from sahara.plugins.vanilla.v2_3_0 import config
 from sahara.plugins.vanilla.v2_3_0 import run_scripts as run
 from sahara.plugins.vanilla.v2_3_0 import utils as pu
+from sahara.utils import remote
 
 HADOOP_CONF_DIR = config.HADOOP_CONF_DIR
 
@@ -51,14 +52,11 @@ def _update_include_files(cluster):
     nodemanagers = vu.get_nodemanagers(cluster)
     dn_hosts = u.generate_fqdn_host_names(datanodes)
     nm_hosts = u.generate_fqdn_host_names(nodemanagers)
-    for instance in instances:
-        with instance.remote() as r:
-            r.execute_command(
-                'sudo su - -c "echo \'%s\' > %s/dn-include" hadoop' % (
-                    dn_hosts, HADOOP_CONF_DIR))
-            r.execute_command(
-                'sudo su - -c "echo \'%s\' > %s/nm-include" hadoop' % (
-                    nm_hosts, HADOOP_CONF_DIR))
+    remote.broadcast(instances, [
+        'sudo su - -c "echo \'%s\' > %s/dn-include" hadoop' % (
+            dn_hosts, HADOOP_CONF_DIR),
+        'sudo su - -c "echo \'%s\' > %s/nm-include" hadoop' % (
+            nm_hosts, HADOOP_CONF_DIR)])
 
 
 def decommission_nodes(cluster, instances):
@@ -83,23 +81,17 @@ def _update_exclude_files(cluster, instances):
     nodemanagers = _get_instances_with_service(instances, 'nodemanager')
     dn_hosts = u.generate_fqdn_host_names(datanodes)
     nm_hosts = u.generate_fqdn_host_names(nodemanagers)
-    for instance in u.get_instances(cluster):
-        with instance.remote() as r:
-            r.execute_command(
-                'sudo su - -c "echo \'%s\' > %s/dn-exclude" hadoop' % (
-                    dn_hosts, HADOOP_CONF_DIR))
-            r.execute_command(
-                'sudo su - -c "echo \'%s\' > %s/nm-exclude" hadoop' % (
-                    nm_hosts, HADOOP_CONF_DIR))
+    remote.broadcast(u.get_instances(cluster), [
+        'sudo su - -c "echo \'%s\' > %s/dn-exclude" hadoop' % (
+            dn_hosts, HADOOP_CONF_DIR),
+        'sudo su - -c "echo \'%s\' > %s/nm-exclude" hadoop' % (
+            nm_hosts, HADOOP_CONF_DIR)])
 
 
 def _clear_exclude_files(cluster):
-    for instance in u.get_instances(cluster):
-        with instance.remote() as r:
-            r.execute_command(
-                'sudo su - -c "echo > %s/dn-exclude" hadoop' % HADOOP_CONF_DIR)
-            r.execute_command(
-                'sudo su - -c "echo > %s/nm-exclude" hadoop' % HADOOP_CONF_DIR)
+    remote.broadcast(u.get_instances(cluster), [
+        'sudo su - -c "echo > %s/dn-exclude" hadoop' % HADOOP_CONF_DIR,
+        'sudo su - -c "echo > %s/nm-exclude" hadoop' % HADOOP_CONF_DIR])
 
 
 def _check_decommission(cluster, instances, check_func, timeout):
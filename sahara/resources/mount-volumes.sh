@@ -0,0 +1,77 @@
+#!/bin/bash
+#
+# Usage:
+#   mount-volumes.sh list
+#       Prints unmounted disks, one per line.
+#   mount-volumes.sh mount MOUNT_POINT...
+#       Formats the first unmounted disks in parallel and mounts them to
+#       the mount points. Prints '<status> <device> <mount point>' line
+#       per disk, status is one of 'ok', 'mkfs_failed', 'mount_failed'.
+#
+# The script may be passed through stdin, so commands must not read it.
+
+list_unmounted_devices() {
+    local names=$(awk 'NR > 1 && NF > 3 {print $4}' /proc/partitions)
+    local mounted=$(mount | awk '{print $1}')
+    local name
+
+    for name in $names; do
+        # skip partitions and disks having partitions
+        if [[ $name =~ [0-9]$ ]] || echo "$names" | grep -q "^${name}[0-9]"
+        then
+            continue
+        fi
+        if ! echo "$mounted" | grep -qx "/dev/$name"; then
+            echo "/dev/$name"
+        fi
+    done
+}
+
+mount_volumes() {
+    local devices=($(list_unmounted_devices))
+    local mount_points=("$@")
+    local tmp_dir=$(mktemp -d)
+    local i
+
+    if [ ${#devices[@]} -lt ${#mount_points[@]} ]; then
+        echo "Found ${#devices[@]} unmounted disks," \
+             "${#mount_points[@]} required" >&2
+        exit 1
+    fi
+
+    # inode tables are initialized in background after mount with
+    # lazy_itable_init, so mkfs takes seconds even for big disks
+    for i in "${!mount_points[@]}"; do
+        (mkfs.ext4 -F -q -E lazy_itable_init=1 "${devices[$i]}" \
+            < /dev/null >&2; echo $? > "$tmp_dir/$i") &
+    done
+    wait
+
+    for i in "${!mount_points[@]}"; do
+        if [ "$(cat "$tmp_dir/$i")" != "0" ]; then
+            echo "mkfs_failed ${devices[$i]} ${mount_points[$i]}"
+        elif mkdir -p "${mount_points[$i]}" && \
+                mount "${devices[$i]}" "${mount_points[$i]}" < /dev/null
+        then
+            echo "ok ${devices[$i]} ${mount_points[$i]}"
+        else
+            echo "mount_failed ${devices[$i]} ${mount_points[$i]}"
+        fi
+    done
+
+    rm -rf "$tmp_dir"
+}
+
+case "$1" in
+    list)
+        list_unmounted_devices
+        ;;
+    mount)
+        shift
+        mount_volumes "$@"
+        ;;
+    *)
+        echo "Unknown command '$1'" >&2
+        exit 1
+        ;;
+esac
@@ -50,6 +50,10 @@ def get_cluster(id):
     return conductor.cluster_get(context.ctx(), id)
 
 
+def get_cluster_timeline(id):
+    return conductor.timeline_events_get(context.ctx(), id)
+
+
 def scale_cluster(id, data):
     ctx = context.ctx()
 
@@ -13,26 +13,48 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import sys
+
+from eventlet import semaphore
 from novaclient import exceptions as nova_exceptions
 from oslo.config import cfg
 import six
 
 from sahara import conductor as c
+from sahara.conductor import resource as r
 from sahara import context
 from sahara import exceptions as exc
 from sahara.openstack.common import excutils
 from sahara.openstack.common import log as logging
+from sahara.openstack.common import timeutils
 from sahara.service import engine as e
 from sahara.service import networks
 from sahara.service import volumes
+from sahara.service import warm_pool
 from sahara.utils import general as g
 from sahara.utils.openstack import nova
+from sahara.utils import poll_utils
+from sahara.utils import timeline
+
 
+opts = [
+    cfg.IntOpt('instance_launch_concurrency',
+               default=10,
+               help='Maximum number of instances of a cluster requested '
+                    'from Nova or assigned floating IPs at the same time. '
+                    'Instances with anti-affine processes are always '
+                    'requested one by one.')
+]
 
 conductor = c.API
 CONF = cfg.CONF
+CONF.register_opts(opts)
 LOG = logging.getLogger(__name__)
 
+# instance_add increments node group count, so it shouldn't be
+# called for the same node group concurrently
+_instance_add_lock = semaphore.Semaphore()
+
 
 class DirectEngine(e.Engine):
     def get_node_group_image_username(self, node_group):
@@ -54,23 +76,17 @@ class DirectEngine(e.Engine):
 
             instances = g.get_instances(cluster)
 
-            self._await_active(cluster, instances)
-
-            self._assign_floating_ips(instances)
-
-            self._await_networks(cluster, instances)
-
-            cluster = conductor.cluster_get(ctx, cluster)
-
-            # attach volumes
-            volumes.attach(cluster)
+            # every instance is prepared independently of others
+            if not self._provision_instances(cluster, instances):
+                return
 
-            # prepare all instances
+            # the only step which needs all instances to be ready
             cluster = conductor.cluster_update(ctx, cluster,
                                                {"status": "Preparing"})
             LOG.info(g.format_cluster_status(cluster))
 
-            self._configure_instances(cluster)
+            with timeline.step(cluster, 'write_hosts_files'):
+                self._write_hosts_files(cluster)
         except Exception as ex:
             with excutils.save_and_reraise_exception():
                 self._log_operation_exception(
@@ -96,16 +112,18 @@ class DirectEngine(e.Engine):
             cluster = conductor.cluster_get(ctx, cluster)
             instances = g.get_instances(cluster, instance_ids)
 
-            self._await_active(cluster, instances)
-
-            self._assign_floating_ips(instances)
+            with timeline.step(cluster, 'await_active'):
+                self._await_active(cluster, instances)
 
-            self._await_networks(cluster, instances)
+            with timeline.step(cluster, 'await_networks'):
+                self._assign_floating_ips(instances)
+                self._await_networks(cluster, instances)
 
             cluster = conductor.cluster_get(ctx, cluster)
 
-            volumes.attach_to_instances(
-                g.get_instances(cluster, instance_ids))
+            with timeline.step(cluster, 'attach_volumes'):
+                volumes.attach_to_instances(
+                    g.get_instances(cluster, instance_ids))
 
         except Exception as ex:
             with excutils.save_and_reraise_exception():
@@ -127,7 +145,8 @@ class DirectEngine(e.Engine):
         # we should be here with valid cluster: if instances creation
         # was not successful all extra-instances will be removed above
         if instance_ids:
-            self._configure_instances(cluster)
+            with timeline.step(cluster, 'configure_instances'):
+                self._configure_instances(cluster)
         return instance_ids
 
     def _generate_anti_affinity_groups(self, cluster):
@@ -147,13 +166,14 @@ class DirectEngine(e.Engine):
     def _create_instances(self, cluster):
         ctx = context.ctx()
 
-        aa_groups = {}
-
+        launches = []
         for node_group in cluster.node_groups:
             count = node_group.count
             conductor.node_group_update(ctx, node_group, {'count': 0})
-            for idx in six.moves.xrange(1, count + 1):
-                self._run_instance(cluster, node_group, idx, aa_groups)
+            launches += [(node_group, idx)
+                         for idx in six.moves.xrange(1, count + 1)]
+
+        self._run_instances(cluster, launches, {})
 
     def _scale_cluster_instances(self, cluster, node_group_id_map):
         ctx = context.ctx()
@@ -175,8 +195,7 @@ class DirectEngine(e.Engine):
                 ctx, cluster, {"status": "Deleting Instances"})
             LOG.info(g.format_cluster_status(cluster))
 
-            for instance in instances_to_delete:
-                self._shutdown_instance(instance)
+            self._shutdown_instances_list(instances_to_delete)
 
         cluster = conductor.cluster_get(ctx, cluster)
 
@@ -185,15 +204,65 @@ class DirectEngine(e.Engine):
             cluster = conductor.cluster_update(ctx, cluster,
                                                {"status": "Adding Instances"})
             LOG.info(g.format_cluster_status(cluster))
+            launches = []
             for node_group in node_groups_to_enlarge:
                 count = node_group_id_map[node_group.id]
-                for idx in six.moves.xrange(node_group.count + 1, count + 1):
-                    instance_id = self._run_instance(cluster, node_group, idx,
-                                                     aa_groups)
-                    instances_to_add.append(instance_id)
+                launches += [(node_group, idx) for idx in
+                             six.moves.xrange(node_group.count + 1, count + 1)]
+            instances_to_add = self._run_instances(cluster, launches,
+                                                   aa_groups)
 
         return instances_to_add
 
+    def _run_instances(self, cluster, launches, aa_groups):
+        """Create instances for (node group, index) pairs concurrently.
+
+        Instances with anti-affine processes need ids of the previously
+        created ones for scheduler hints, so they are created one by one
+        in a separate thread while the rest are created in parallel.
+        """
+        aa_launches = []
+        other_launches = []
+        for node_group, idx in launches:
+            if set(node_group.node_processes) & set(cluster.anti_affinity):
+                aa_launches.append((node_group, idx))
+            else:
+                other_launches.append((node_group, idx))
+
+        instance_ids = []
+        errors = []
+        with context.ThreadGroup(CONF.instance_launch_concurrency) as tg:
+            if aa_launches:
+                tg.spawn('run-anti-affine-instances',
+                         self._run_instances_serially, cluster, aa_launches,
+                         aa_groups, instance_ids, errors)
+
+            for node_group, idx in other_launches:
+                tg.spawn('run-instance-%s-%s' % (node_group.name, idx),
+                         self._run_instances_serially, cluster,
+                         [(node_group, idx)], aa_groups, instance_ids, errors)
+
+        if errors:
+            # the original exception is re-raised, so that the cluster
+            # status describes the real reason of the failure
+            six.reraise(*errors[0])
+
+        return instance_ids
+
+    def _run_instances_serially(self, cluster, launches, aa_groups,
+                                instance_ids, errors):
+        for node_group, idx in launches:
+            if errors:
+                # don't create instances which will be deleted by rollback
+                return
+
+            try:
+                instance_ids.append(
+                    self._run_instance(cluster, node_group, idx, aa_groups))
+            except Exception:
+                errors.append(sys.exc_info())
+                return
+
     def _find_by_id(self, lst, id):
         for obj in lst:
             if obj.id == id:
@@ -209,8 +278,6 @@ class DirectEngine(e.Engine):
         ctx = context.ctx()
         name = self._get_inst_name(cluster.name, node_group.name, idx)
 
-        userdata = self._generate_user_data_script(node_group, name)
-
         # aa_groups: node process -> instance ids
         aa_ids = []
         for node_process in node_group.node_processes:
@@ -220,8 +287,37 @@ class DirectEngine(e.Engine):
         # w/ aa-enabled processes
         hints = {'different_host': list(set(aa_ids))} if aa_ids else None
 
+        net_id = None
         if CONF.use_neutron:
             net_id = cluster.neutron_management_network
+
+        server_id = None
+        if not hints:
+            # pooled instances were placed without scheduler hints
+            server_id = warm_pool.claim(node_group, net_id, name)
+        if server_id is None:
+            server_id = self._create_server(cluster, node_group, name,
+                                            hints, net_id)
+
+        with _instance_add_lock:
+            instance_id = conductor.instance_add(
+                ctx, node_group, {"instance_id": server_id,
+                                  "instance_name": name,
+                                  "phase_times": {
+                                      "created": timeutils.strtime()}})
+        # save instance id to aa_groups to support aa feature
+        for node_process in node_group.node_processes:
+            if node_process in cluster.anti_affinity:
+                aa_group_ids = aa_groups.get(node_process, [])
+                aa_group_ids.append(server_id)
+                aa_groups[node_process] = aa_group_ids
+
+        return instance_id
+
+    def _create_server(self, cluster, node_group, name, hints, net_id):
+        userdata = self._generate_user_data_script(node_group, name)
+
+        if net_id:
             nics = [{"net-id": net_id, "v4-fixed-ip": ""}]
 
             nova_instance = nova.client().servers.create(
@@ -235,46 +331,160 @@ class DirectEngine(e.Engine):
                 scheduler_hints=hints, userdata=userdata,
                 key_name=cluster.user_keypair_id)
 
-        instance_id = conductor.instance_add(ctx, node_group,
-                                             {"instance_id": nova_instance.id,
-                                              "instance_name": name})
-        # save instance id to aa_groups to support aa feature
-        for node_process in node_group.node_processes:
-            if node_process in cluster.anti_affinity:
-                aa_group_ids = aa_groups.get(node_process, [])
-                aa_group_ids.append(nova_instance.id)
-                aa_groups[node_process] = aa_group_ids
+        return nova_instance.id
 
-        return instance_id
+    def _wait_until_accessible(self, instance):
+        # instances taken from the warm pool accept only the pool key
+        if not warm_pool.rekey(instance):
+            return False
+
+        return super(DirectEngine, self)._wait_until_accessible(instance)
 
     def _assign_floating_ips(self, instances):
-        for instance in instances:
-            node_group = instance.node_group
-            if node_group.floating_ip_pool:
-                networks.assign_floating_ip(instance.instance_id,
-                                            node_group.floating_ip_pool)
+        with context.ThreadGroup(CONF.instance_launch_concurrency) as tg:
+            for instance in instances:
+                node_group = instance.node_group
+                if node_group.floating_ip_pool:
+                    tg.spawn('assign-floating-ip-%s' %
+                             instance.instance_name,
+                             networks.assign_floating_ip,
+                             instance.instance_id,
+                             node_group.floating_ip_pool)
+
+    def _provision_instances(self, cluster, instances):
+        """Provisions every instance as soon as it's ready.
+
+        Each instance goes through becoming active, getting IPs, being
+        accessible via ssh, attaching volumes and configuring on its own,
+        so that slow instances don't hold up the rest. Active statuses of
+        all the instances are still polled by a single request.
+        Returns False if the cluster is deleted meanwhile.
+        """
+        if not instances:
+            return True
+
+        servers = nova.ServerInfoCache(cluster, instances)
+        volume_statuses = volumes.VolumeStatusCache()
+        provisioned = []
+        errors = []
+        with context.ThreadGroup() as tg:
+            def _check_if_active(instance, server):
+                if errors:
+                    # stop polling, the cluster is rolled back anyway
+                    six.reraise(*errors[0])
+                return self._check_if_active(instance, server)
+
+            def _start_provisioning(instance):
+                tg.spawn('provision-instance-%s' % instance.instance_name,
+                         self._provision_instance, cluster, instance,
+                         servers, volume_statuses, provisioned, errors)
+
+            self._await_instances(cluster, instances, _check_if_active,
+                                  'await_active', on_ready=_start_provisioning)
+
+        if errors:
+            # the original exception is re-raised, so that the cluster
+            # status describes the real reason of the failure
+            six.reraise(*errors[0])
+
+        if len(provisioned) < len(instances):
+            return False
+
+        LOG.info("Cluster '%s': all instances are provisioned" % cluster.id)
+        return True
+
+    def _provision_instance(self, cluster, instance, servers, volume_statuses,
+                            provisioned, errors):
+        phase_times = dict(instance.phase_times or {})
+        try:
+            if self._provision_instance_phases(cluster, instance, phase_times,
+                                               servers, volume_statuses):
+                provisioned.append(instance.id)
+        except Exception:
+            errors.append(sys.exc_info())
+        finally:
+            # every phase is recorded in the timeline as soon as it's
+            # completed, the instance is updated once
+            try:
+                conductor.instance_update(context.ctx(), instance,
+                                          {'phase_times': phase_times})
+            except exc.NotFoundException:
+                LOG.debug("Phases of instance %s are not saved since it "
+                          "has been deleted", instance.instance_name)
+
+    def _provision_instance_phases(self, cluster, instance, phase_times,
+                                   servers, volume_statuses):
+        started_at = timeutils.utcnow()
+        if 'created' in phase_times:
+            started_at = timeutils.parse_strtime(phase_times['created'])
+        started_at = self._complete_phase(cluster, instance, phase_times,
+                                          'active', started_at)
+
+        node_group = instance.node_group
+        if node_group.floating_ip_pool:
+            networks.assign_floating_ip(instance.instance_id,
+                                        node_group.floating_ip_pool)
+
+        ips = {}
+
+        def _get_ips():
+            internal_ip, management_ip = networks.get_instance_ips(
+                servers.get(instance))
+            if not (internal_ip and management_ip):
+                return False
+            ips.update(internal_ip=internal_ip, management_ip=management_ip)
+            return True
+
+        if not poll_utils.poll(_get_ips, 'await_networks',
+                               timeout=CONF.await_instances_timeout,
+                               delay=e.POLL_INITIAL_INTERVAL,
+                               max_delay=e.POLL_MAX_INTERVAL,
+                               backoff=e.POLL_BACKOFF, cluster=cluster):
+            return False
+        conductor.instance_update(context.ctx(), instance, ips)
+        # resources are immutable, the instance is copied with its IPs
+        # instead of reloading the whole cluster
+        instance = r.InstanceResource(dict(instance, **ips))
+        started_at = self._complete_phase(cluster, instance, phase_times,
+                                          'networks', started_at)
+
+        if not self._wait_until_accessible(instance):
+            return False
+        started_at = self._complete_phase(cluster, instance, phase_times,
+                                          'accessible', started_at)
+
+        volumes.attach_to_instances([instance], volume_statuses)
+        if not g.check_cluster_exists(cluster):
+            return False
+        started_at = self._complete_phase(cluster, instance, phase_times,
+                                          'volumes', started_at)
+
+        self._prepare_instance(instance)
+        self._complete_phase(cluster, instance, phase_times, 'configured',
+                             started_at)
+        return True
+
+    def _complete_phase(self, cluster, instance, phase_times, phase,
+                        started_at):
+        now = timeutils.utcnow()
+        phase_times[phase] = timeutils.strtime(now)
+        timeline.add_step(cluster, phase, started_at, now, instance)
+        LOG.debug("Instance %s: %s phase is completed",
+                  instance.instance_name, phase)
+        return now
 
     def _await_active(self, cluster, instances):
         """Await all instances are in Active status and available."""
         if not instances:
             return
 
-        active_ids = set()
-        while len(active_ids) != len(instances):
-            if not g.check_cluster_exists(instances[0].node_group.cluster):
-                return
-            for instance in instances:
-                if instance.id not in active_ids:
-                    if self._check_if_active(instance):
-                        active_ids.add(instance.id)
-
-            context.sleep(1)
+        if not self._await_instances(cluster, instances,
+                                     self._check_if_active, 'await_active'):
+            return
 
         LOG.info("Cluster '%s': all instances are active" % cluster.id)
 
-    def _check_if_active(self, instance):
-
-        server = nova.get_instance_info(instance)
+    def _check_if_active(self, instance, server):
         if server.status == 'ERROR':
             raise exc.SystemError("Node %s has error status" % server.name)
 
@@ -292,20 +502,28 @@ class DirectEngine(e.Engine):
         LOG.info("Cluster '%s' scaling rollback (reason: %s)",
                  cluster.name, ex)
 
-        for i in instances:
-            self._shutdown_instance(i)
+        self._shutdown_instances_list(instances)
 
     def _shutdown_instances(self, cluster):
-        for node_group in cluster.node_groups:
-            for instance in node_group.instances:
-                self._shutdown_instance(instance)
+        self._shutdown_instances_list([instance
+                                       for node_group in cluster.node_groups
+                                       for instance in node_group.instances])
+
+    def _shutdown_instances_list(self, instances):
+        fl_ips = {}
+        if any(i.node_group.floating_ip_pool for i in instances):
+            # a single request for floating IPs of all instances
+            fl_ips = networks.get_floating_ips()
+
+        for instance in instances:
+            self._shutdown_instance(instance, fl_ips)
 
-    def _shutdown_instance(self, instance):
+    def _shutdown_instance(self, instance, fl_ips):
         ctx = context.ctx()
 
         if instance.node_group.floating_ip_pool:
             try:
-                networks.delete_floating_ip(instance.instance_id)
+                networks.delete_floating_ip(instance.instance_id, fl_ips)
             except nova_exceptions.NotFound:
                 LOG.warn("Attempted to delete non-existent floating IP in "
                          "pool %s from instancie %s",
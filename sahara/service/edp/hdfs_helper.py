@@ -21,6 +21,7 @@ from sahara import conductor as c
 from sahara import context
 from sahara.plugins.general import utils as u
 from sahara.utils import general as g
+from sahara.utils import remote
 
 
 conductor = c.API
@@ -94,8 +95,6 @@ def configure_cluster_for_hdfs(cluster, data_source):
     create_etc_host += '/etc/hosts > /tmp/etc-hosts"'
     copy_etc_host = 'sudo "cat /tmp/etc-hosts > /etc/hosts"'
 
-    for inst in u.get_instances(cluster):
-        with inst.remote as r:
-            r.write_file_to('/tmp/etc-hosts-update', etc_hosts_information)
-            r.execute_command(create_etc_host)
-            r.execute_command(copy_etc_host)
+    remote.broadcast(u.get_instances(cluster),
+                     [create_etc_host, copy_etc_host],
+                     files={'/tmp/etc-hosts-update': etc_hosts_information})
@@ -117,6 +117,13 @@ def cancel_job(job_execution_id):
 
 
 def run_job(job_execution_id):
+    # job submission is short and the user waits for it, so it shouldn't
+    # be stuck behind provisioning of other clusters
+    with remote.interactive():
+        _run_job(job_execution_id)
+
+
+def _run_job(job_execution_id):
     ctx = context.ctx()
 
     job_execution = conductor.job_execution_get(ctx,
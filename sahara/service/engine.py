@@ -18,19 +18,37 @@ import abc
 import datetime
 import string
 
+from eventlet.green import socket
+from oslo.config import cfg
 import six
 
 from sahara import conductor as c
 from sahara import context
 from sahara.openstack.common import log as logging
+from sahara.openstack.common import timeutils
 from sahara.service import networks
 from sahara.utils import general as g
+from sahara.utils.openstack import nova
+from sahara.utils import poll_utils
 from sahara.utils import remote
+from sahara.utils import timeline
 
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 conductor = c.API
 
+SSH_PORT = 22
+# delays between attempts to reach booting instances, in seconds
+PROBE_INITIAL_DELAY = 1
+PROBE_MAX_DELAY = 16
+PROBE_CONNECT_TIMEOUT = 3
+SSH_CHECK_DELAY = 5
+# intervals between polls of instance statuses, in seconds
+POLL_INITIAL_INTERVAL = 1
+POLL_MAX_INTERVAL = 10
+POLL_BACKOFF = 1.5
+
 
 @six.add_metaclass(abc.ABCMeta)
 class Engine:
@@ -54,22 +72,16 @@ class Engine:
         if not instances:
             return
 
-        ips_assigned = set()
-        while len(ips_assigned) != len(instances):
-            if not g.check_cluster_exists(instances[0].node_group.cluster):
-                return
-            for instance in instances:
-                if instance.id not in ips_assigned:
-                    if networks.init_instances_ips(instance):
-                        ips_assigned.add(instance.id)
-
-            context.sleep(1)
+        if not self._await_instances(cluster, instances,
+                                     networks.init_instances_ips,
+                                     'await_networks'):
+            return
 
         LOG.info("Cluster '%s': all instances have IPs assigned" % cluster.id)
 
         ctx = context.ctx()
         cluster = conductor.cluster_get(ctx, instances[0].node_group.cluster)
-        instances = g.get_instances(cluster, ips_assigned)
+        instances = g.get_instances(cluster, [i.id for i in instances])
 
         with context.ThreadGroup() as tg:
             for instance in instances:
@@ -78,26 +90,94 @@ class Engine:
 
         LOG.info("Cluster '%s': all instances are accessible" % cluster.id)
 
+    def _await_instances(self, cluster, instances, check, operation,
+                         on_ready=None):
+        """Polls Nova until check(instance, server) is true for instances.
+
+        Servers of all pending instances are fetched by a single request
+        per poll. Polls are frequent while instances change and become
+        rarer while nothing happens. If 'on_ready' is passed, it's called
+        for every instance as soon as the check passes for it. Returns
+        False if the cluster is deleted meanwhile.
+        """
+        pending = dict((instance.id, instance) for instance in instances)
+
+        def _check_pending():
+            servers = nova.get_instances_info(cluster, pending.values())
+            done = [instance for instance in pending.values()
+                    if check(instance, servers[instance.instance_id])]
+            for instance in done:
+                del pending[instance.id]
+                if on_ready:
+                    on_ready(instance)
+
+            if not pending:
+                return True
+            return poll_utils.PROGRESSED if done else False
+
+        return poll_utils.poll(_check_pending, operation,
+                               timeout=CONF.await_instances_timeout,
+                               delay=POLL_INITIAL_INTERVAL,
+                               max_delay=POLL_MAX_INTERVAL,
+                               backoff=POLL_BACKOFF, cluster=cluster)
+
     def _wait_until_accessible(self, instance):
-        while True:
-            try:
-                # check if ssh is accessible and cloud-init
-                # script is finished generating authorized_keys
-                exit_code, stdout = instance.remote().execute_command(
-                    "ls .ssh/authorized_keys", raise_when_error=False)
-
-                if exit_code == 0:
-                    LOG.debug(
-                        'Instance %s is accessible' % instance.instance_name)
-                    return
-            except Exception as ex:
-                LOG.debug("Can't login to node %s (%s), reason %s",
-                          instance.instance_name, instance.management_ip, ex)
-
-            context.sleep(5)
-
-            if not g.check_cluster_exists(instance.node_group.cluster):
-                return
+        cluster = instance.node_group.cluster
+        start_time = timeutils.utcnow()
+
+        # TCP probe is much cheaper than logging in, so don't try to log
+        # in until sshd is listening. Instances are not reachable directly
+        # from this host when namespaces are used.
+        if not (CONF.use_namespaces and not CONF.use_floating_ips):
+            if not self._wait_until_port_open(instance, SSH_PORT):
+                return False
+            timeline.add_step(cluster, 'await_port', start_time,
+                              instance=instance)
+        port_open_time = timeutils.utcnow()
+
+        if not poll_utils.poll(lambda: self._is_accessible(instance),
+                               'await_ssh',
+                               timeout=CONF.await_instances_timeout,
+                               delay=SSH_CHECK_DELAY, cluster=cluster):
+            return False
+
+        end_time = timeutils.utcnow()
+        timeline.add_step(cluster, 'await_ssh', port_open_time, end_time,
+                          instance=instance)
+        LOG.info("Instance %s is accessible in %.1f seconds "
+                 "(port is open in %.1f seconds, ssh login "
+                 "is possible in %.1f seconds after that)",
+                 instance.instance_name,
+                 timeutils.delta_seconds(start_time, end_time),
+                 timeutils.delta_seconds(start_time, port_open_time),
+                 timeutils.delta_seconds(port_open_time, end_time))
+        return True
+
+    def _is_accessible(self, instance):
+        try:
+            # check if ssh is accessible and cloud-init
+            # script is finished generating authorized_keys
+            exit_code, stdout = instance.remote().execute_command(
+                "ls .ssh/authorized_keys", raise_when_error=False)
+            return exit_code == 0
+        except Exception as ex:
+            LOG.debug("Can't login to node %s (%s), reason %s",
+                      instance.instance_name, instance.management_ip, ex)
+            return False
+
+    def _wait_until_port_open(self, instance, port):
+        # jitter spreads attempts to instances booted at the same time
+        if not poll_utils.poll(
+                lambda: _is_port_open(instance.management_ip, port),
+                'await_port', timeout=CONF.await_instances_timeout,
+                delay=PROBE_INITIAL_DELAY,
+                max_delay=PROBE_MAX_DELAY, backoff=2, jitter=0.5,
+                cluster=instance.node_group.cluster):
+            return False
+
+        LOG.debug("Port %s of instance %s is open",
+                  port, instance.instance_name)
+        return True
 
     def _configure_instances(self, cluster):
         """Configure active instances.
@@ -115,15 +195,30 @@ class Engine:
                              self._configure_instance, instance, hosts_file)
 
     def _configure_instance(self, instance, hosts_file):
+        self._prepare_instance(instance)
+        self._write_hosts_file(instance, hosts_file)
+
+    def _prepare_instance(self, instance):
+        """Configures things which don't depend on other instances."""
         LOG.debug('Configuring instance %s' % instance.instance_name)
 
         with instance.remote() as r:
-            r.write_file_to('etc-hosts', hosts_file)
             r.execute_command('sudo hostname %s' % instance.fqdn())
-            r.execute_command('sudo mv etc-hosts /etc/hosts')
-
             r.execute_command('sudo usermod -s /bin/bash $USER')
 
+    def _write_hosts_files(self, cluster):
+        hosts_file = g.generate_etc_hosts(cluster)
+
+        with context.ThreadGroup() as tg:
+            for instance in g.get_instances(cluster):
+                tg.spawn("write-hosts-file-%s" % instance.instance_name,
+                         self._write_hosts_file, instance, hosts_file)
+
+    def _write_hosts_file(self, instance, hosts_file):
+        with instance.remote() as r:
+            r.write_file_to('etc-hosts', hosts_file)
+            r.execute_command('sudo mv etc-hosts /etc/hosts')
+
     def _generate_user_data_script(self, node_group, instance_name):
         script = """#!/bin/bash
 echo "${public_key}" >> ${user_home}/.ssh/authorized_keys\n
@@ -159,3 +254,15 @@ echo "${public_key}" >> ${user_home}/.ssh/authorized_keys\n
         if cluster is None:
             LOG.warn("Presumably the operation failed because the cluster was"
                      "deleted by a user during the process.")
+
+
+def _is_port_open(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(PROBE_CONNECT_TIMEOUT)
+    try:
+        sock.connect((host, port))
+        return True
+    except (socket.error, socket.timeout):
+        return False
+    finally:
+        sock.close()
@@ -28,15 +28,30 @@ conductor = c.API
 CONF = cfg.CONF
 
 
-def init_instances_ips(instance):
+def init_instances_ips(instance, server=None):
     """Extracts internal and management ips.
 
     As internal ip will be used the first ip from the nova networks CIDRs.
     If use_floating_ip flag is set than management ip will be the first
     non-internal ip.
+
+    Nova server of the instance is requested if it is not passed.
     """
 
-    server = nova.get_instance_info(instance)
+    if server is None:
+        server = nova.get_instance_info(instance)
+
+    internal_ip, management_ip = get_instance_ips(server)
+
+    conductor.instance_update(context.ctx(), instance,
+                              {"management_ip": management_ip,
+                               "internal_ip": internal_ip})
+
+    return internal_ip and management_ip
+
+
+def get_instance_ips(server):
+    """Returns internal and management ips of the Nova server."""
 
     management_ip = None
     internal_ip = None
@@ -77,19 +92,29 @@ def init_instances_ips(instance):
                     LOG.debug('Found floating IP %s for %s' % (management_ip,
                                                                server.name))
 
-    conductor.instance_update(context.ctx(), instance,
-                              {"management_ip": management_ip,
-                               "internal_ip": internal_ip})
-
-    return internal_ip and management_ip
+    return internal_ip, management_ip
 
 
 def assign_floating_ip(instance_id, pool):
     ip = nova.client().floating_ips.create(pool)
-    nova.client().servers.get(instance_id).add_floating_ip(ip)
+    nova.client().servers.add_floating_ip(instance_id, ip)
 
 
-def delete_floating_ip(instance_id):
-    fl_ips = nova.client().floating_ips.findall(instance_id=instance_id)
-    for fl_ip in fl_ips:
+def get_floating_ips():
+    """Returns floating IPs of the tenant keyed by instance id."""
+    fl_ips = {}
+    for fl_ip in nova.client().floating_ips.list():
+        if fl_ip.instance_id:
+            fl_ips.setdefault(fl_ip.instance_id, []).append(fl_ip)
+    return fl_ips
+
+
+def delete_floating_ip(instance_id, fl_ips=None):
+    """Deletes floating IPs of the instance.
+
+    fl_ips is a result of get_floating_ips, it is requested if not given.
+    """
+    if fl_ips is None:
+        fl_ips = get_floating_ips()
+    for fl_ip in fl_ips.get(instance_id, []):
         nova.client().floating_ips.delete(fl_ip.id)
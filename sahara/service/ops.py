@@ -25,7 +25,9 @@ from sahara.plugins import base as plugin_base
 from sahara.service.edp import job_manager
 from sahara.service import trusts
 from sahara.utils import general as g
+from sahara.utils import remote
 from sahara.utils import rpc as rpc_utils
+from sahara.utils import timeline
 
 
 conductor = c.API
@@ -123,17 +125,25 @@ def _provision_cluster(cluster_id):
     cluster = conductor.cluster_update(ctx, cluster,
                                        {"status": "InfraUpdating"})
     LOG.info(g.format_cluster_status(cluster))
-    plugin.update_infra(cluster)
+    with timeline.step(cluster, 'plugin_update_infra'):
+        plugin.update_infra(cluster)
 
     # creating instances and configuring them
     cluster = conductor.cluster_get(ctx, cluster_id)
     INFRA.create_cluster(cluster)
 
+    # the engine stops waiting for instances if the cluster is deleted
+    if not g.check_cluster_exists(cluster):
+        LOG.info("Cluster '%s' has been deleted, its provisioning is "
+                 "stopped", cluster.name)
+        return
+
     # configure cluster
     cluster = conductor.cluster_update(ctx, cluster, {"status": "Configuring"})
     LOG.info(g.format_cluster_status(cluster))
     try:
-        plugin.configure_cluster(cluster)
+        with timeline.step(cluster, 'plugin_configure'):
+            plugin.configure_cluster(cluster)
     except Exception as ex:
         LOG.exception("Can't configure cluster '%s' (reason: %s)",
                       cluster.name, ex)
@@ -145,7 +155,8 @@ def _provision_cluster(cluster_id):
     cluster = conductor.cluster_update(ctx, cluster, {"status": "Starting"})
     LOG.info(g.format_cluster_status(cluster))
     try:
-        plugin.start_cluster(cluster)
+        with timeline.step(cluster, 'plugin_start'):
+            plugin.start_cluster(cluster)
     except Exception as ex:
         LOG.exception("Can't start services for cluster '%s' (reason: %s)",
                       cluster.name, ex)
@@ -180,7 +191,8 @@ def _provision_scaled_cluster(cluster_id, node_group_id_map):
                                                         node_group.count]
 
     if instances_to_delete:
-        plugin.decommission_nodes(cluster, instances_to_delete)
+        with timeline.step(cluster, 'plugin_decommission'):
+            plugin.decommission_nodes(cluster, instances_to_delete)
 
     # Scaling infrastructure
     cluster = conductor.cluster_update(ctx, cluster, {"status": "Scaling"})
@@ -188,6 +200,11 @@ def _provision_scaled_cluster(cluster_id, node_group_id_map):
 
     instances = INFRA.scale_cluster(cluster, node_group_id_map)
 
+    if not g.check_cluster_exists(cluster):
+        LOG.info("Cluster '%s' has been deleted, its scaling is stopped",
+                 cluster.name)
+        return
+
     # Setting up new nodes with the plugin
 
     if instances:
@@ -196,7 +213,8 @@ def _provision_scaled_cluster(cluster_id, node_group_id_map):
         LOG.info(g.format_cluster_status(cluster))
         try:
             instances = g.get_instances(cluster, instances)
-            plugin.scale_cluster(cluster, instances)
+            with timeline.step(cluster, 'plugin_scale'):
+                plugin.scale_cluster(cluster, instances)
         except Exception as ex:
             LOG.exception("Can't scale cluster '%s' (reason: %s)",
                           cluster.name, ex)
@@ -210,18 +228,25 @@ def _provision_scaled_cluster(cluster_id, node_group_id_map):
 
 
 def _terminate_cluster(cluster_id):
-    ctx = context.ctx()
-    cluster = conductor.cluster_get(ctx, cluster_id)
-    plugin = plugin_base.PLUGINS.get_plugin(cluster.plugin_name)
+    # stop provisioning of the cluster running in this process
+    g.cancel_cluster_operations(cluster_id)
+
+    try:
+        ctx = context.ctx()
+        cluster = conductor.cluster_get(ctx, cluster_id)
+        plugin = plugin_base.PLUGINS.get_plugin(cluster.plugin_name)
 
-    plugin.on_terminate_cluster(cluster)
+        plugin.on_terminate_cluster(cluster)
 
-    INFRA.shutdown_cluster(cluster)
+        INFRA.shutdown_cluster(cluster)
+        remote.close_cluster_connections(cluster)
 
-    if CONF.use_identity_api_v3:
-        trusts.delete_trust(cluster)
+        if CONF.use_identity_api_v3:
+            trusts.delete_trust(cluster)
 
-    conductor.cluster_destroy(ctx, cluster)
+        conductor.cluster_destroy(ctx, cluster)
+    finally:
+        g.forget_cancelled_cluster(cluster_id)
 
 
 def _run_edp_job(job_execution_id):
@@ -26,6 +26,8 @@ from sahara.openstack.common import timeutils
 from sahara.service import api
 from sahara.service.edp import job_manager
 from sahara.service import trusts
+from sahara.utils import metrics
+from sahara.utils import remote
 
 
 LOG = log.getLogger(__name__)
@@ -101,6 +103,23 @@ class SaharaPeriodicTasks(periodic_task.PeriodicTasks):
                         {'status': 'AwaitingTermination'})
         context.set_ctx(None)
 
+    @periodic_task.periodic_task(spacing=60)
+    def close_idle_remote_connections(self, ctx):
+        LOG.debug('Closing idle remote connections')
+        remote.close_idle_connections()
+
+    @periodic_task.periodic_task(spacing=60)
+    def dump_metrics(self, ctx):
+        if not CONF.metrics_dump_file:
+            return
+
+        LOG.debug('Dumping metrics to %s', CONF.metrics_dump_file)
+        try:
+            metrics.dump(CONF.metrics_dump_file)
+        except (IOError, OSError) as e:
+            LOG.warn('Failed to dump metrics to %s: %s',
+                     CONF.metrics_dump_file, e)
+
 
 def setup():
     if CONF.periodic_enable:
@@ -13,114 +13,173 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import re
+import pipes
+
+from eventlet.green import time
+from eventlet import semaphore
+from oslo.config import cfg
+import six
 
 from sahara import conductor as c
 from sahara import context
 from sahara import exceptions as ex
 from sahara.openstack.common import log as logging
+from sahara.utils import files as f
+from sahara.utils import general as g
 from sahara.utils.openstack import cinder
 from sahara.utils.openstack import nova
+from sahara.utils import poll_utils
+
 
+opts = [
+    cfg.IntOpt('volume_create_concurrency',
+               default=10,
+               help='Maximum number of volumes of a cluster requested '
+                    'from Cinder at the same time.')
+]
 
 conductor = c.API
+CONF = cfg.CONF
+CONF.register_opts(opts)
 LOG = logging.getLogger(__name__)
 
+# volumes are appended to a list stored in the instance row, so it
+# shouldn't be done for the same instance concurrently
+_volume_append_lock = semaphore.Semaphore()
 
-def attach(cluster):
-    with context.ThreadGroup() as tg:
-        for node_group in cluster.node_groups:
-            tg.spawn('attach-volumes-for-ng-%s' % node_group.name,
-                     attach_to_instances, node_group.instances)
 
+def attach(cluster):
+    attach_to_instances(g.get_instances(cluster))
+
+
+class VolumeStatusCache(object):
+    """Statuses of volumes shared by concurrent pollers.
+
+    Pollers which request statuses at about the same time reuse the ones
+    fetched by a single request if they are not older than 'max_age'
+    seconds. Volumes missing in the list, e.g. because it's paginated,
+    are requested one by one.
+    """
+
+    def __init__(self, max_age=1):
+        self.max_age = max_age
+        self._lock = semaphore.Semaphore()
+        self._statuses = {}
+        self._updated_at = None
+
+    def get(self, volume_ids):
+        with self._lock:
+            now = time.time()
+            if (self._updated_at is None or
+                    now - self._updated_at >= self.max_age):
+                self._statuses = dict(
+                    (volume.id, volume.status)
+                    for volume in cinder.client().volumes.list())
+                self._updated_at = now
+
+            for volume_id in volume_ids:
+                if volume_id not in self._statuses:
+                    self._statuses[volume_id] = cinder.get_volume(
+                        volume_id).status
+
+            return dict((volume_id, self._statuses[volume_id])
+                        for volume_id in volume_ids)
+
+
+def attach_to_instances(instances, volume_statuses=None):
+    instances = [i for i in instances if i.node_group.volumes_per_node]
+    if not instances:
+        return
+
+    # volume id -> instance the volume is to be attached to
+    pending = {}
+    with context.ThreadGroup(CONF.volume_create_concurrency) as tg:
+        for instance in instances:
+            ng = instance.node_group
+            for idx in range(1, ng.volumes_per_node + 1):
+                display_name = "volume_%s_%s" % (instance.instance_name, idx)
+                tg.spawn('create-volume-%s' % display_name,
+                         _create_volume, instance, ng.volumes_size,
+                         display_name, pending)
+
+    if not _attach_available_volumes(instances[0].node_group.cluster,
+                                     pending, volume_statuses or
+                                     VolumeStatusCache(max_age=0)):
+        return
 
-def attach_to_instances(instances):
     with context.ThreadGroup() as tg:
         for instance in instances:
-            tg.spawn('attach-volumes-for-instance-%s' % instance.instance_name,
-                     _attach_volumes_to_node, instance.node_group, instance)
+            tg.spawn('await-volumes-for-instance-%s' % instance.instance_name,
+                     _await_attach_volumes, instance,
+                     instance.node_group.volumes_per_node)
 
     mount_to_instances(instances)
 
 
 def _await_attach_volumes(instance, count_volumes):
-    timeout = 10
-    step = 2
-    while timeout > 0:
-        if len(_get_unmounted_devices(instance)) == count_volumes:
-            return
+    poll_utils.poll(
+        lambda: len(_get_unmounted_devices(instance)) == count_volumes,
+        'await_attach_volumes', timeout=CONF.volume_available_timeout,
+        delay=1, max_delay=10, backoff=1.5)
 
-        timeout -= step
-        context.sleep(step)
 
-    raise ex.SystemError("Error attach volume to instance %s" %
-                         instance.instance_name)
-
-
-def _attach_volumes_to_node(node_group, instance, volume_type=None):
-    ctx = context.ctx()
-    count = node_group.volumes_per_node
-    size = node_group.volumes_size
-    for idx in range(1, count + 1):
-        display_name = "volume_" + instance.instance_name + "_" + str(idx)
-        _create_attach_volume(ctx, instance, size, display_name, volume_type)
-        LOG.debug("Attach volume to instance %s, type %s" %
-                  (instance.instance_id, volume_type))
-
-    _await_attach_volumes(instance, node_group.volumes_per_node)
-
-
-def _create_attach_volume(ctx, instance, size, display_name=None,
-                          volume_type=None):
+def _create_volume(instance, size, display_name, pending, volume_type=None):
     volume = cinder.client().volumes.create(size=size,
                                             display_name=display_name,
                                             volume_type=volume_type)
-    conductor.append_volume(ctx, instance, volume.id)
-
-    while volume.status != 'available':
-        volume = cinder.get_volume(volume.id)
-        if volume.status == 'error':
-            raise ex.SystemError("Volume %s has error status" % volume.id)
-
-        context.sleep(1)
-
-    nova.client().volumes.create_server_volume(instance.instance_id,
-                                               volume.id, None)
+    with _volume_append_lock:
+        conductor.append_volume(context.ctx(), instance, volume.id)
+    pending[volume.id] = instance
+    LOG.debug("Created volume %s for instance %s, type %s" %
+              (volume.id, instance.instance_id, volume_type))
+
+
+def _attach_available_volumes(cluster, pending, volume_statuses):
+    """Attaches volumes to instances as soon as volumes are available.
+
+    Statuses of all the volumes are requested by a single request per
+    poll. Returns False if the cluster is deleted meanwhile.
+    """
+    def _attach():
+        statuses = volume_statuses.get(list(pending))
+
+        attached = []
+        for volume_id, instance in six.iteritems(pending):
+            status = statuses[volume_id]
+            if status == 'error':
+                raise ex.SystemError("Volume %s has error status" %
+                                     volume_id)
+            if status == 'available':
+                nova.client().volumes.create_server_volume(
+                    instance.instance_id, volume_id, None)
+                LOG.debug("Attach volume %s to instance %s" %
+                          (volume_id, instance.instance_id))
+                attached.append(volume_id)
+
+        for volume_id in attached:
+            del pending[volume_id]
+
+        if not pending:
+            return True
+        return poll_utils.PROGRESSED if attached else False
+
+    return poll_utils.poll(_attach, 'await_volumes',
+                           timeout=CONF.volume_available_timeout,
+                           delay=1, max_delay=10, backoff=1.5,
+                           cluster=cluster)
+
+
+def _execute_volumes_script(remote, args):
+    # the script is passed through stdin not to upload it first
+    script = f.get_file_text('resources/mount-volumes.sh')
+    return remote.execute_command(
+        "sudo bash -s %s <<'SAHARA_SCRIPT_EOF'\n%sSAHARA_SCRIPT_EOF" %
+        (' '.join(pipes.quote(arg) for arg in args), script))
 
 
 def _get_unmounted_devices(instance):
-    code, part_info = instance.remote().execute_command('cat /proc/partitions')
-
-    devices = []
-    partitions = []
-    for line in part_info.split('\n')[1:]:
-        tokens = line.split()
-        if len(tokens) > 3:
-            dev = tokens[3]
-            if re.search('\d$', dev):
-                partitions.append(dev)
-            else:
-                devices.append(dev)
-
-    # remove devices for which there are partitions
-    for partition in partitions:
-        match = re.search(r'(.*)\d+', partition)
-        if match:
-            if match.group(1) in devices:
-                devices.remove(match.group(1))
-
-    # add dev prefix
-    devices = ['/dev/' + device for device in devices]
-
-    # remove mounted devices
-    code, mount_info = instance.remote().execute_command('mount')
-    for mount_item in mount_info.split('\n'):
-        tokens = mount_item.split(' ')
-        if tokens:
-            if tokens[0] in devices:
-                devices.remove(tokens[0])
-
-    return devices
+    code, stdout = _execute_volumes_script(instance.remote(), ['list'])
+    return stdout.split()
 
 
 def mount_to_instances(instances):
@@ -130,29 +189,38 @@ def mount_to_instances(instances):
                      _mount_volumes_to_node, instance)
 
 
-def _mount_volumes_to_node(instance, volume_type=None):
+def _mount_volumes_to_node(instance):
     ng = instance.node_group
-    count = ng.volumes_per_node
-    device_paths = _get_unmounted_devices(instance)
+    if not ng.volumes_per_node:
+        return
 
-    for idx in range(0, count):
-        LOG.debug("Mounting volume %s to instance %s, type %s" %
-                  (device_paths[idx], instance.instance_name, volume_type))
-        mount_point = ng.storage_paths()[idx]
-        _mount_volume(instance, device_paths[idx], mount_point)
-        LOG.debug("Mounted volume to instance %s" % instance.instance_id)
+    mount_points = ng.storage_paths()
+    LOG.debug("Mounting volumes to instance %s" % instance.instance_name)
+    with instance.remote() as r:
+        code, stdout = _execute_volumes_script(r, ['mount'] + mount_points)
 
+    results = _parse_mount_results(stdout)
+    failed = [result for result in results if result['status'] != 'ok']
+    if failed or len(results) != len(mount_points):
+        LOG.error("Error mounting volumes to instance %s: %s" %
+                  (instance.instance_id, failed))
+        raise ex.SystemError("Error mounting volumes to instance %s" %
+                             instance.instance_name)
 
-def _mount_volume(instance, device_path, mount_point):
-    with instance.remote() as r:
-        try:
-            r.execute_command('sudo mkdir -p %s' % mount_point)
-            r.execute_command('sudo mkfs.ext4 %s' % device_path)
-            r.execute_command('sudo mount %s %s' % (device_path, mount_point))
-        except Exception:
-            LOG.error("Error mounting volume to instance %s" %
-                      instance.instance_id)
-            raise
+    LOG.debug("Mounted volumes to instance %s: %s" %
+              (instance.instance_id, results))
+    return results
+
+
+def _parse_mount_results(output):
+    results = []
+    for line in output.split('\n'):
+        tokens = line.split()
+        if len(tokens) == 3:
+            results.append({'status': tokens[0],
+                            'device': tokens[1],
+                            'mount_point': tokens[2]})
+    return results
 
 
 def detach_from_instance(instance):
@@ -0,0 +1,436 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pool of pre-booted instances for fast cluster creation.
+
+Booting an instance and waiting for cloud-init and sshd takes minutes,
+so the pool keeps instances booted in advance for every combination of
+tenant, image, flavor and network clusters are created with. A cluster
+claims a pooled instance instead of booting a new one: the server is
+renamed, and once it's reachable the pool key is replaced with the keys
+of the cluster. The pool is refilled in background after every claim.
+
+Pooled servers are booted and deleted by the admin user in the tenant of
+the pool rather than with tokens of users creating clusters. They are
+deleted when the engine stops, and leftovers of an engine which didn't
+stop cleanly are deleted when it starts again. A claim is recorded in the
+server metadata until the server is rekeyed, so claimed servers which
+still have the pool key after a crash are deleted on start as well: the
+key pair of the pool is lost with the engine, and they can't be rekeyed.
+"""
+
+import collections
+import json
+import pipes
+import socket
+import string
+import uuid
+
+from eventlet import semaphore
+from novaclient import exceptions as nova_exceptions
+from oslo.config import cfg
+import six
+
+from sahara import conductor as c
+from sahara import context
+from sahara import exceptions as ex
+from sahara.openstack.common import log as logging
+from sahara.utils import crypto
+from sahara.utils.openstack import keystone
+from sahara.utils.openstack import nova
+from sahara.utils import poll_utils
+from sahara.utils import remote
+
+
+opts = [
+    cfg.IntOpt('warm_pool_min_size',
+               default=0,
+               help='Number of pre-booted instances kept ready for every '
+                    'combination of tenant, image, flavor and network '
+                    'clusters are created with. Such instances are used '
+                    'instead of booting new ones. 0 disables the pool.'),
+    cfg.IntOpt('warm_pool_max_size',
+               default=10,
+               help='Maximum number of pre-booted instances kept for a '
+                    'combination of tenant, image, flavor and network. '
+                    'The pool grows from warm_pool_min_size up to this size '
+                    'while clusters request more instances than it has.')
+]
+
+conductor = c.API
+CONF = cfg.CONF
+CONF.register_opts(opts)
+LOG = logging.getLogger(__name__)
+
+SERVER_NAME_PREFIX = 'sahara-pool-'
+# set on claimed servers until the pool key is replaced, the value is the
+# host of the engine
+CLAIMED_METADATA_KEY = 'sahara_warm_pool_claimed'
+# remote operations on unclaimed instances are accounted to it
+POOL_ID = 'warm-pool'
+# intervals between polls of server statuses, in seconds
+POLL_INITIAL_INTERVAL = 1
+POLL_MAX_INTERVAL = 10
+POLL_BACKOFF = 1.5
+SSH_CHECK_DELAY = 5
+
+USERDATA_TEMPLATE = """#!/bin/bash
+echo "${public_key}" >> ${user_home}/.ssh/authorized_keys\n
+"""
+
+# cluster keys replace the pool key, so that the pool can't access
+# instances of clusters
+REKEY_COMMAND = ('keys=.ssh/authorized_keys; '
+                 '(grep -vxF %(pool_key)s $keys; echo %(keys)s) > $keys.new '
+                 '&& chmod 600 $keys.new && mv $keys.new $keys')
+
+PoolKey = collections.namedtuple(
+    'PoolKey', ['tenant_id', 'image_id', 'flavor_id', 'network_id'])
+
+
+class _Attributes(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _PooledServer(object):
+    """Server accessed with the pool key.
+
+    Remote takes address and credentials from an instance, its node
+    group and cluster, so the server provides the same attributes.
+    """
+
+    def __init__(self, server_id, management_ip, username, network_id,
+                 private_key, cluster_id=POOL_ID):
+        self.instance_id = server_id
+        self.instance_name = server_id
+        self.management_ip = management_ip
+        self.node_group = _Attributes(
+            image_username=username,
+            cluster=_Attributes(id=cluster_id,
+                                management_private_key=private_key,
+                                neutron_management_network=network_id))
+
+    def remote(self):
+        return remote.get_remote(self)
+
+
+class _Pool(object):
+    def __init__(self, target):
+        # ids of servers ready to be claimed
+        self.ready = []
+        self.booting = 0
+        self.target = target
+
+
+class WarmPool(object):
+    def __init__(self):
+        self._lock = semaphore.Semaphore()
+        self._pools = {}
+        self._claimed = set()
+        self._private_key = None
+        self._public_key = None
+        self._stopped = False
+        # servers of other engines are told apart by the host name
+        self._host = socket.gethostname()
+        self._name_prefix = '%s%s-' % (SERVER_NAME_PREFIX, self._host)
+
+    def _get_key_pair(self):
+        with self._lock:
+            if self._private_key is None:
+                self._private_key, self._public_key = (
+                    crypto.generate_key_pair())
+            return self._private_key, self._public_key
+
+    def claim(self, node_group, network_id, name):
+        """Takes a pooled server for an instance of the node group.
+
+        The server is renamed to 'name'. Returns its id or None if there
+        are no ready servers. The pool is refilled in background.
+        """
+        if not CONF.warm_pool_min_size:
+            return None
+
+        key = PoolKey(context.ctx().tenant_id, node_group.get_image_id(),
+                      node_group.flavor_id, network_id)
+        try:
+            while True:
+                server_id = self._pop_ready(key)
+                if server_id is None:
+                    return None
+
+                try:
+                    # the claim is recorded before the server is renamed,
+                    # so that it's never lost for a server of a cluster
+                    nova.client().servers.set_meta(
+                        server_id, {CLAIMED_METADATA_KEY: self._host})
+                    nova.client().servers.update(server_id, name=name)
+                except nova_exceptions.NotFound:
+                    LOG.warn("Pooled instance %s was deleted", server_id)
+                    continue
+
+                with self._lock:
+                    self._claimed.add(server_id)
+                LOG.info("Instance %s is taken from the warm pool as %s",
+                         server_id, name)
+                return server_id
+        finally:
+            self._refill(key, node_group.image_username)
+
+    def _pop_ready(self, key):
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                # the pool is filled for keys clusters are created with
+                self._pools[key] = _Pool(CONF.warm_pool_min_size)
+                return None
+
+            if pool.ready:
+                return pool.ready.pop(0)
+
+            # the demand is higher than the pool size
+            if pool.target < CONF.warm_pool_max_size:
+                pool.target += 1
+            return None
+
+    def _refill(self, key, username):
+        with self._lock:
+            if self._stopped:
+                return
+            pool = self._pools[key]
+            count = pool.target - len(pool.ready) - pool.booting
+            pool.booting += max(count, 0)
+
+        for idx in six.moves.xrange(count):
+            context.spawn('warm-pool-boot-%s' % key.image_id,
+                          self._boot, key, username)
+
+    def _boot(self, key, username):
+        server_id = None
+        try:
+            _use_admin_context(key.tenant_id)
+            server_id = self._create_server(key, username)
+            ready = self._await_ready(key, server_id, username)
+        except Exception as e:
+            LOG.warn("Can't boot instance for the warm pool (reason: %s)", e)
+            ready = False
+
+        with self._lock:
+            pool = self._pools[key]
+            pool.booting -= 1
+            if ready and not self._stopped:
+                pool.ready.append(server_id)
+                return
+
+        if server_id is not None:
+            _delete_server(server_id)
+
+    def _create_server(self, key, username):
+        name = self._name_prefix + uuid.uuid4().hex[:8]
+        user_home = "/root/" if username == "root" else "/home/%s/" % username
+        script = string.Template(
+            USERDATA_TEMPLATE + remote.get_userdata_template())
+        userdata = script.safe_substitute(public_key=self._get_key_pair()[1],
+                                          user_home=user_home,
+                                          instance_name=name)
+
+        kwargs = {'userdata': userdata}
+        if key.network_id:
+            kwargs['nics'] = [{"net-id": key.network_id, "v4-fixed-ip": ""}]
+
+        server = nova.client().servers.create(name, key.image_id,
+                                              key.flavor_id, **kwargs)
+        LOG.debug("Booting instance %s for the warm pool", server.id)
+        return server.id
+
+    def _await_ready(self, key, server_id, username):
+        servers = []
+
+        def _is_active():
+            server = nova.client().servers.get(server_id)
+            if server.status == 'ERROR':
+                raise ex.SystemError("Node %s has error status" % server.name)
+            servers[:] = [server]
+            return server.status == 'ACTIVE'
+
+        poll_utils.poll(_is_active, 'warm_pool_await_active',
+                        timeout=CONF.await_instances_timeout,
+                        delay=POLL_INITIAL_INTERVAL,
+                        max_delay=POLL_MAX_INTERVAL, backoff=POLL_BACKOFF)
+
+        # servers can't be reached by fixed IPs if floating IPs are used,
+        # ssh is checked after the server gets one in a cluster then
+        if not CONF.use_floating_ips:
+            target = _PooledServer(server_id, _get_fixed_ip(servers[0]),
+                                   username, key.network_id,
+                                   self._get_key_pair()[0])
+            poll_utils.poll(lambda: _is_accessible(target),
+                            'warm_pool_await_ssh',
+                            timeout=CONF.await_instances_timeout,
+                            delay=SSH_CHECK_DELAY)
+
+        LOG.debug("Instance %s of the warm pool is ready", server_id)
+        return True
+
+    def rekey(self, instance):
+        """Replaces the pool key on a claimed instance with cluster keys.
+
+        Does nothing for instances which are not taken from the pool.
+        Returns False if the cluster is deleted meanwhile.
+        """
+        with self._lock:
+            if instance.instance_id not in self._claimed:
+                return True
+
+        cluster = instance.node_group.cluster
+        keys = [cluster.management_public_key.strip()]
+        if cluster.user_keypair_id:
+            keys.append(nova.client().keypairs.get(
+                cluster.user_keypair_id).public_key.strip())
+
+        private_key, public_key = self._get_key_pair()
+        target = _PooledServer(instance.instance_id, instance.management_ip,
+                               instance.node_group.image_username,
+                               cluster.neutron_management_network,
+                               private_key, cluster.id)
+        command = REKEY_COMMAND % {'pool_key': pipes.quote(public_key.strip()),
+                                   'keys': pipes.quote('\n'.join(keys))}
+
+        if not poll_utils.poll(lambda: _execute_quietly(target, command),
+                               'warm_pool_rekey',
+                               timeout=CONF.await_instances_timeout,
+                               delay=SSH_CHECK_DELAY, cluster=cluster):
+            return False
+
+        nova.client().servers.delete_meta(instance.instance_id,
+                                          [CLAIMED_METADATA_KEY])
+        with self._lock:
+            self._claimed.discard(instance.instance_id)
+        LOG.debug("Instance %s is rekeyed", instance.instance_name)
+        return True
+
+    def delete_leftovers(self):
+        """Deletes servers pooled by a previous run of the engine.
+
+        Servers claimed by the previous run but not rekeyed are deleted
+        too. Only tenants which have clusters are looked through, as pools
+        are created for tenants of clusters.
+        """
+        ctx = context.get_admin_context()
+        context.set_ctx(ctx)
+        tenant_ids = set(cluster.tenant_id
+                         for cluster in conductor.cluster_get_all(ctx))
+        try:
+            for tenant_id in tenant_ids:
+                try:
+                    _use_admin_context(tenant_id)
+                    for server in nova.client().servers.list():
+                        if server.name.startswith(self._name_prefix):
+                            _delete_server(server.id)
+                        elif (server.metadata.get(CLAIMED_METADATA_KEY) ==
+                                self._host):
+                            LOG.warn("Instance %s taken from the warm pool "
+                                     "wasn't rekeyed before the engine "
+                                     "stopped, deleting it", server.name)
+                            _delete_server(server.id)
+                except Exception as e:
+                    LOG.warn("Can't delete instances left in the warm pool "
+                             "of tenant %s (reason: %s)", tenant_id, e)
+        finally:
+            context.set_ctx(None)
+
+    def shutdown(self):
+        """Deletes ready servers of all the pools.
+
+        Servers which are still booting are deleted as soon as they boot.
+        """
+        with self._lock:
+            self._stopped = True
+            pools = self._pools
+            self._pools = {}
+
+        try:
+            for key, pool in six.iteritems(pools):
+                if not pool.ready:
+                    continue
+                try:
+                    _use_admin_context(key.tenant_id)
+                    for server_id in pool.ready:
+                        _delete_server(server_id)
+                except Exception as e:
+                    LOG.warn("Can't delete instances of the warm pool of "
+                             "tenant %s (reason: %s)", key.tenant_id, e)
+        finally:
+            context.set_ctx(None)
+
+
+def _use_admin_context(tenant_id):
+    client = keystone.client_for_admin(tenant_id)
+    context.set_ctx(context.Context(
+        user_id=client.user_id, tenant_id=tenant_id,
+        token=client.auth_token, username=CONF.os_admin_username,
+        service_catalog=json.dumps(
+            client.service_catalog.catalog['catalog'])))
+
+
+def _delete_server(server_id):
+    try:
+        nova.client().servers.delete(server_id)
+    except nova_exceptions.NotFound:
+        pass
+
+
+def _get_fixed_ip(server):
+    for addresses in six.itervalues(server.addresses):
+        for address in addresses:
+            if address['OS-EXT-IPS:type'] == 'fixed':
+                return address['addr']
+
+
+def _is_accessible(target):
+    return _execute_quietly(target, "ls .ssh/authorized_keys")
+
+
+def _execute_quietly(target, command):
+    try:
+        with target.remote() as r:
+            exit_code, stdout = r.execute_command(command,
+                                                  raise_when_error=False)
+            return exit_code == 0
+    except Exception as e:
+        LOG.debug("Can't login to pooled instance %s (%s), reason %s",
+                  target.instance_id, target.management_ip, e)
+        return False
+
+
+_pool = WarmPool()
+
+
+def setup():
+    if CONF.warm_pool_min_size:
+        _pool.delete_leftovers()
+
+
+def shutdown():
+    if CONF.warm_pool_min_size:
+        _pool.shutdown()
+
+
+def claim(node_group, network_id, name):
+    return _pool.claim(node_group, network_id, name)
+
+
+def rekey(instance):
+    return _pool.rekey(instance)
@@ -32,7 +32,7 @@ SWIFT_URL_SUFFIX = SWIFT_URL_SUFFIX_START + 'sahara'
 
 def _get_service_address(service_type):
     ctx = context.current()
-    identity_url = base.url_for(ctx.service_catalog, service_type)
+    identity_url = base.url_for(ctx.service_catalog_index, service_type)
     address_regexp = r"^\w+://(.+?)/"
     identity_host = re.search(address_regexp, identity_url).group(1)
     return identity_host
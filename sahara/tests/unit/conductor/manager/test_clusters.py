@@ -14,6 +14,7 @@
 # limitations under the License.
 
 import copy
+import datetime
 
 from sahara.conductor import manager
 from sahara import context
@@ -145,6 +146,54 @@ class ClusterTest(test_base.ConductorManagerTestCase):
         with self.assertRaises(ex.NotFoundException):
             self.api.cluster_update(ctx, "bad_id", {"status": "Active"})
 
+    def test_cluster_get_status(self):
+        ctx = context.ctx()
+        cluster_db_obj = self.api.cluster_create(ctx, SAMPLE_CLUSTER)
+        _id = cluster_db_obj["id"]
+
+        self.api.cluster_update(ctx, _id, {"status": "Deleting"})
+        self.assertEqual("Deleting", self.api.cluster_get_status(ctx, _id))
+
+        self.api.cluster_destroy(ctx, _id)
+        self.assertIsNone(self.api.cluster_get_status(ctx, _id))
+
+    def test_cluster_timeline(self):
+        ctx = context.ctx()
+        cluster_db_obj = self.api.cluster_create(ctx, SAMPLE_CLUSTER)
+        _id = cluster_db_obj["id"]
+
+        self.api.cluster_update(ctx, _id, {"status": "Spawning"})
+        self.api.cluster_update(ctx, _id, {"status": "Spawning"})
+        self.api.cluster_update(ctx, _id, {"status": "Waiting"})
+        start_time = datetime.datetime(2014, 7, 21, 10, 0, 0)
+        self.api.timeline_event_add(
+            ctx, _id, {"event_type": "step",
+                       "name": "active",
+                       "instance_name": "test_cluster-ng_1-001",
+                       "start_time": start_time,
+                       "end_time": start_time + datetime.timedelta(
+                           seconds=30)})
+
+        events = self.api.timeline_events_get(ctx, _id)
+        self.assertEqual(["active", "Spawning", "Waiting"],
+                         [event["name"] for event in events])
+
+        step, spawning, waiting = events
+        self.assertEqual("step", step["event_type"])
+        self.assertEqual("test_cluster-ng_1-001", step["instance_name"])
+        self.assertEqual(30, step["duration"])
+        self.assertEqual("status", spawning["event_type"])
+        # a status lasts till the next one
+        self.assertEqual(spawning["end_time"], waiting["start_time"])
+        self.assertIsNone(waiting["end_time"])
+        self.assertIsNone(waiting["duration"])
+
+        self.api.cluster_destroy(ctx, _id)
+        self.assertEqual([], self.api.timeline_events_get(ctx, _id))
+        with self.assertRaises(ex.NotFoundException):
+            self.api.timeline_event_add(ctx, _id, {"event_type": "step",
+                                                   "name": "active"})
+
     def _ng_in_cluster(self, cluster_db_obj, ng_id):
         for ng in cluster_db_obj["node_groups"]:
             if ng["id"] == ng_id:
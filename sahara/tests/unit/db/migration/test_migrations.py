@@ -355,3 +355,24 @@ class TestMigrations(base.BaseWalkMigrationTestCase, base.CommonTestsMixIn):
     def _check_006(self, engine, data):
         # currently, 006 is just a placeholder
         self._check_001(engine, data)
+
+    def _check_007(self, engine, data):
+        self.assertColumnExists(engine, 'instances', 'phase_times')
+
+    def _check_008(self, engine, data):
+        timeline_events_columns = [
+            'created_at',
+            'updated_at',
+            'id',
+            'tenant_id',
+            'cluster_id',
+            'event_type',
+            'name',
+            'instance_name',
+            'start_time',
+            'end_time'
+        ]
+        self.assertColumnsExists(
+            engine, 'timeline_events', timeline_events_columns)
+        self.assertColumnCount(
+            engine, 'timeline_events', timeline_events_columns)
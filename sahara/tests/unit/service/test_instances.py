@@ -20,10 +20,12 @@ import six
 
 from sahara import conductor as cond
 from sahara import context
+from sahara import exceptions as exc
 from sahara.service import direct_engine as e
 from sahara.tests.unit import base
 import sahara.utils.crypto as c
 from sahara.utils import general as g
+from sahara.utils.openstack import nova
 
 
 conductor = cond.API
@@ -205,6 +207,45 @@ class NodePlacementTest(AbstractInstanceTest):
         inst_number += len(cluster_obj.node_groups[1].instances)
         self.assertEqual(inst_number, 3)
 
+    def test_anti_affine_and_parallel_instances(self):
+        node_groups = [_make_ng_dict("test_group_1", "test_flavor",
+                                     ["data node"], 2),
+                       _make_ng_dict("test_group_2", "test_flavor",
+                                     ["task tracker"], 2)]
+
+        self.override_config('instance_launch_concurrency', 3)
+        running = [0]
+        max_running = [0]
+        created = iter(_mock_instances(4))
+
+        def create(name, *args, **kwargs):
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+            context.sleep(0.01)
+            running[0] -= 1
+            return next(created)
+
+        self.nova.servers.create.side_effect = create
+
+        cluster = _create_cluster_mock(node_groups, ["data node"])
+        self.engine._create_instances(cluster)
+
+        hints = dict((call[1][0], call[2]['scheduler_hints'])
+                     for call in self.nova.servers.create.mock_calls)
+        self.assertIsNone(hints['test_cluster-test_group_2-001'])
+        self.assertIsNone(hints['test_cluster-test_group_2-002'])
+        # anti-affine instances are created one after another
+        aa_hints = [hints['test_cluster-test_group_1-001'],
+                    hints['test_cluster-test_group_1-002']]
+        self.assertIsNone(aa_hints[0])
+        self.assertEqual(1, len(aa_hints[1]['different_host']))
+
+        self.assertEqual(3, max_running[0])
+
+        ctx = context.ctx()
+        cluster_obj = conductor.cluster_get_all(ctx)[0]
+        self.assertEqual([2, 2], [ng.count for ng in cluster_obj.node_groups])
+
 
 class IpManagementTest(AbstractInstanceTest):
     def setUp(self):
@@ -234,6 +275,138 @@ class IpManagementTest(AbstractInstanceTest):
 
         self.assertEqual(self.nova.floating_ips.create.call_count, 2,
                          "Not expected floating IPs number found.")
+        self.assertEqual(2, self.nova.servers.add_floating_ip.call_count)
+
+
+class AwaitInstancesTest(AbstractInstanceTest):
+    def _create_cluster(self):
+        node_groups = [_make_ng_dict("test_group_1", "test_flavor",
+                                     ["data node"], 3)]
+        cluster = _create_cluster_mock(node_groups, [])
+        self.engine._create_instances(cluster)
+        cluster = conductor.cluster_get(context.ctx(), cluster)
+        return cluster, g.get_instances(cluster)
+
+    @mock.patch('sahara.context.sleep')
+    def test_await_active(self, sleep):
+        cluster, instances = self._create_cluster()
+
+        servers = _mock_instances(3)
+        for server in servers:
+            server.status = 'BUILD'
+        statuses = iter([['BUILD', 'BUILD', 'BUILD'],
+                         ['ACTIVE', 'BUILD', 'BUILD'],
+                         ['ACTIVE', 'BUILD', 'BUILD'],
+                         ['ACTIVE', 'BUILD', 'BUILD'],
+                         ['ACTIVE', 'ACTIVE', 'ACTIVE']])
+
+        def list_servers(search_opts):
+            self.assertEqual({'name': '^test_cluster-'}, search_opts)
+            for server, status in zip(servers, next(statuses)):
+                server.status = status
+            return servers
+
+        self.nova.servers.list.side_effect = list_servers
+
+        self.engine._await_active(cluster, instances)
+
+        # a single request per poll for all instances
+        self.assertEqual(5, self.nova.servers.list.call_count)
+        self.assertFalse(self.nova.servers.get.called)
+        # polls become rarer while nothing changes
+        self.assertEqual([1, 1, 1.5, 2.25],
+                         [call[0][0] for call in sleep.call_args_list])
+
+    @mock.patch('sahara.context.sleep')
+    def test_await_active_error(self, sleep):
+        cluster, instances = self._create_cluster()
+        servers = _mock_instances(3)
+        servers[1].status = 'ERROR'
+        self.nova.servers.list.return_value = servers
+
+        self.assertRaises(exc.SystemError, self.engine._await_active,
+                          cluster, instances)
+
+    @base.mock_thread_group
+    @mock.patch('sahara.service.volumes.attach_to_instances')
+    @mock.patch('sahara.service.direct_engine.DirectEngine.'
+                '_prepare_instance')
+    @mock.patch('sahara.service.direct_engine.DirectEngine.'
+                '_wait_until_accessible', return_value=True)
+    @mock.patch('sahara.context.sleep')
+    def test_provision_instances(self, sleep, accessible, prepare, attach):
+        cluster, instances = self._create_cluster()
+
+        servers = _mock_instances(3)
+        # the second request is made for IPs of the first instance
+        statuses = iter([['ACTIVE', 'BUILD', 'BUILD'],
+                         ['ACTIVE', 'BUILD', 'BUILD'],
+                         ['ACTIVE', 'ACTIVE', 'ACTIVE']])
+        provisioned = []
+
+        def list_servers(search_opts):
+            for server, status in zip(servers, next(statuses)):
+                server.status = status
+            return servers
+
+        def prepare_instance(instance):
+            provisioned.append(instance.instance_id)
+
+        self.nova.servers.list.side_effect = list_servers
+        prepare.side_effect = prepare_instance
+
+        self.assertTrue(self.engine._provision_instances(cluster, instances))
+
+        # the first instance is provisioned before others become active
+        self.assertEqual('1', provisioned[0])
+        self.assertEqual(['1', '2', '3'], sorted(provisioned))
+        # servers are shared by polls of statuses and IPs
+        self.assertEqual(3, self.nova.servers.list.call_count)
+        self.assertFalse(self.nova.servers.get.called)
+
+        # volumes of instances are attached separately, but statuses of
+        # volumes are shared
+        self.assertEqual(3, attach.call_count)
+        self.assertEqual(1, len(set(call[0][1]
+                                    for call in attach.call_args_list)))
+
+        cluster = conductor.cluster_get(context.ctx(), cluster)
+        for instance in g.get_instances(cluster):
+            self.assertEqual('{0}.{0}.{0}.{0}'.format(instance.instance_id),
+                             instance.management_ip)
+            self.assertEqual(
+                set(['created', 'active', 'networks', 'accessible',
+                     'volumes', 'configured']), set(instance.phase_times))
+
+        # the same phases are in the timeline of the cluster
+        events = conductor.timeline_events_get(context.ctx(), cluster)
+        self.assertEqual(15, len(events))
+        self.assertEqual(5, len([e for e in events if e['instance_name'] ==
+                                 'test_cluster-test_group_1-001']))
+
+    @base.mock_thread_group
+    @mock.patch('sahara.service.direct_engine.DirectEngine.'
+                '_wait_until_accessible', side_effect=RuntimeError)
+    @mock.patch('sahara.context.sleep')
+    def test_provision_instances_error(self, sleep, accessible):
+        cluster, instances = self._create_cluster()
+        self.nova.servers.list.return_value = _mock_instances(3)
+
+        # the original exception is raised instead of ThreadException
+        self.assertRaises(RuntimeError, self.engine._provision_instances,
+                          cluster, instances)
+
+    def test_servers_missing_in_list(self):
+        cluster, instances = self._create_cluster()
+        servers = _mock_instances(3)
+        # e.g. renamed servers are not found by name
+        self.nova.servers.list.return_value = servers[:2]
+        self.nova.servers.get.return_value = servers[2]
+
+        result = nova.get_instances_info(cluster, instances)
+
+        self.assertEqual(['1', '2', '3'], sorted(result))
+        self.nova.servers.get.assert_called_once_with('3')
 
 
 class ShutdownClusterTest(AbstractInstanceTest):
@@ -250,7 +423,19 @@ class ShutdownClusterTest(AbstractInstanceTest):
 
         self.engine._assign_floating_ips(instances_list)
 
+        ips = _mock_ips(3)
+        ips[0].instance_id = instances_list[0].instance_id
+        ips[1].instance_id = instances_list[1].instance_id
+        # not assigned IP
+        ips[2].instance_id = None
+        self.nova.floating_ips.list.return_value = ips
+
         self.engine._shutdown_instances(cluster)
+
+        # a single request for all the instances
+        self.nova.floating_ips.list.assert_called_once_with()
+        self.nova.floating_ips.delete.assert_has_calls(
+            [mock.call('1'), mock.call('2')], any_order=True)
         self.assertEqual(self.nova.floating_ips.delete.call_count, 2,
                          "Not expected floating IPs number found in delete")
         self.assertEqual(self.nova.servers.delete.call_count, 2,
@@ -333,7 +518,6 @@ def _create_nova_mock(novaclient):
     nova.servers.create.side_effect = _mock_instances(4)
     nova.servers.get.return_value = _mock_instance(1)
     nova.floating_ips.create.side_effect = _mock_ips(4)
-    nova.floating_ips.findall.return_value = _mock_ips(1)
     nova.floating_ips.delete.side_effect = _mock_deletes(2)
     images = mock.Mock()
     images.username = "root"
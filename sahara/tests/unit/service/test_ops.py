@@ -0,0 +1,56 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+
+from sahara.service import ops
+from sahara.tests.unit import base
+from sahara.utils import general as g
+
+
+class TestOps(base.SaharaTestCase):
+    def setUp(self):
+        super(TestOps, self).setUp()
+        self.infra = mock.Mock()
+        ops.setup_ops(self.infra)
+        self.addCleanup(ops.setup_ops, None)
+
+    @mock.patch('sahara.utils.general.check_cluster_exists',
+                return_value=False)
+    @mock.patch('sahara.utils.timeline.conductor')
+    @mock.patch('sahara.service.ops.conductor')
+    @mock.patch('sahara.service.ops._prepare_provisioning')
+    def test_provision_deleted_cluster(self, prepare, conductor,
+                                       timeline_conductor, cluster_exists):
+        plugin = mock.Mock()
+        prepare.return_value = (mock.Mock(), mock.Mock(is_transient=False),
+                                plugin)
+
+        ops._provision_cluster('1')
+
+        self.assertTrue(self.infra.create_cluster.called)
+        self.assertFalse(plugin.configure_cluster.called)
+        statuses = [call[0][2]['status']
+                    for call in conductor.cluster_update.call_args_list]
+        self.assertNotIn('Configuring', statuses)
+
+    @mock.patch('sahara.plugins.base.PLUGINS')
+    @mock.patch('sahara.service.ops.conductor')
+    def test_terminate_failure_forgets_cluster(self, conductor, plugins):
+        self.infra.shutdown_cluster.side_effect = RuntimeError
+
+        self.assertRaises(RuntimeError, ops._terminate_cluster, '1')
+
+        self.assertNotIn('1', g._cancelled_clusters)
@@ -24,20 +24,29 @@ from sahara.tests.unit import base
 
 class TestAttachVolume(base.SaharaWithDbTestCase):
 
-    @mock.patch(
-        'sahara.service.engine.Engine.get_node_group_image_username')
-    def test_mount_volume(self, p_get_username):
-        p_get_username.return_value = 'root'
-
+    def test_mount_volumes(self):
         instance = self._get_instance()
+        instance.node_group.volumes_per_node = 2
+        instance.node_group.storage_paths.return_value = ['/mnt/vols1',
+                                                          '/mnt/vols2']
         execute_com = instance.remote().execute_command
-
-        self.assertIsNone(volumes._mount_volume(instance, '123', '456'))
-        self.assertEqual(execute_com.call_count, 3)
-
-        execute_com.side_effect = ex.RemoteCommandException('cmd')
-        self.assertRaises(ex.RemoteCommandException, volumes._mount_volume,
-                          instance, '123', '456')
+        execute_com.return_value = (0, 'ok /dev/vdb /mnt/vols1\n'
+                                       'ok /dev/vdc /mnt/vols2\n')
+
+        self.assertEqual([{'status': 'ok', 'device': '/dev/vdb',
+                           'mount_point': '/mnt/vols1'},
+                          {'status': 'ok', 'device': '/dev/vdc',
+                           'mount_point': '/mnt/vols2'}],
+                         volumes._mount_volumes_to_node(instance))
+        # all volumes are mounted by a single command
+        self.assertEqual(1, execute_com.call_count)
+        self.assertIn('sudo bash -s mount /mnt/vols1 /mnt/vols2',
+                      execute_com.call_args[0][0])
+
+        execute_com.return_value = (0, 'ok /dev/vdb /mnt/vols1\n'
+                                       'mkfs_failed /dev/vdc /mnt/vols2\n')
+        self.assertRaises(ex.SystemError, volumes._mount_volumes_to_node,
+                          instance)
 
     @mock.patch('sahara.conductor.manager.ConductorManager.cluster_get')
     @mock.patch('cinderclient.v1.volumes.Volume.delete')
@@ -60,20 +69,38 @@ class TestAttachVolume(base.SaharaWithDbTestCase):
         self.assertRaises(RuntimeError, volumes.detach_from_instance, instance)
 
     @base.mock_thread_group
-    @mock.patch('sahara.service.volumes._mount_volume')
+    @mock.patch('sahara.utils.general.check_cluster_exists',
+                return_value=True)
+    @mock.patch('sahara.context.sleep')
+    @mock.patch('sahara.conductor.api.LocalApi.append_volume')
+    @mock.patch('sahara.utils.openstack.nova.client')
+    @mock.patch('sahara.utils.openstack.cinder.client')
+    @mock.patch('sahara.service.volumes._mount_volumes_to_node')
     @mock.patch('sahara.service.volumes._await_attach_volumes')
-    @mock.patch('sahara.service.volumes._create_attach_volume')
-    @mock.patch('sahara.service.volumes._get_unmounted_devices')
-    def test_attach(self, p_dev_path, p_create_attach_vol,
-                    p_await, p_mount):
-        p_dev_path.return_value = ['123', '456']
-        p_create_attach_vol.return_value = None
+    def test_attach(self, p_await, p_mount, p_cinder, p_nova,
+                    p_append, p_sleep, p_cluster_exists):
         p_await.return_value = None
         p_mount.return_value = None
 
-        instance1 = {'instance_id': '123',
+        created = [_mock_volume(str(i), 'creating') for i in range(4)]
+        p_cinder().volumes.create.side_effect = created
+
+        statuses = iter([['creating', 'creating', 'creating', 'creating'],
+                         ['available', 'creating', 'available', 'creating'],
+                         ['available', 'available', 'available',
+                          'available']])
+
+        def list_volumes():
+            return [_mock_volume(str(i), status)
+                    for i, status in enumerate(next(statuses))]
+
+        p_cinder().volumes.list.side_effect = list_volumes
+
+        instance1 = {'id': '1',
+                     'instance_id': '123',
                      'instance_name': 'inst_1'}
-        instance2 = {'instance_id': '456',
+        instance2 = {'id': '2',
+                     'instance_id': '456',
                      'instance_name': 'inst_2'}
 
         ng = {'volumes_per_node': 2,
@@ -85,10 +112,56 @@ class TestAttachVolume(base.SaharaWithDbTestCase):
         cluster = r.ClusterResource({'node_groups': [ng]})
 
         volumes.attach(cluster)
-        self.assertEqual(p_create_attach_vol.call_count, 4)
+        self.assertEqual(p_cinder().volumes.create.call_count, 4)
+        self.assertEqual(p_append.call_count, 4)
+        # a single request per poll for all volumes
+        self.assertEqual(p_cinder().volumes.list.call_count, 3)
+        self.assertFalse(p_cinder().volumes.get.called)
+
+        attach = p_nova().volumes.create_server_volume
+        self.assertEqual(attach.call_count, 4)
+        # volumes available earlier are attached earlier
+        self.assertEqual(set(['0', '2']),
+                         set(call[0][1] for call in attach.call_args_list[:2]))
+
         self.assertEqual(p_await.call_count, 2)
-        self.assertEqual(p_mount.call_count, 4)
-        self.assertEqual(p_dev_path.call_count, 2)
+        self.assertEqual(p_mount.call_count, 2)
+
+    @mock.patch('sahara.utils.openstack.cinder.client')
+    def test_attach_error_volume(self, p_cinder):
+        p_cinder().volumes.list.return_value = [_mock_volume('1', 'error')]
+        instance = mock.Mock(instance_id='123')
+
+        self.assertRaises(ex.SystemError, volumes._attach_available_volumes,
+                          mock.Mock(), {'1': instance},
+                          volumes.VolumeStatusCache())
+
+    @mock.patch('eventlet.green.time.time')
+    @mock.patch('sahara.utils.openstack.cinder.client')
+    def test_volume_status_cache(self, p_cinder, p_time):
+        p_cinder().volumes.list.return_value = [_mock_volume('1', 'creating')]
+        p_time.side_effect = [0, 0.5, 1]
+        statuses = volumes.VolumeStatusCache(max_age=1)
+
+        self.assertEqual({'1': 'creating'}, statuses.get(['1']))
+        # statuses are reused by pollers within max_age
+        statuses.get(['1'])
+        self.assertEqual(1, p_cinder().volumes.list.call_count)
+
+        statuses.get(['1'])
+        self.assertEqual(2, p_cinder().volumes.list.call_count)
+        self.assertFalse(p_cinder().volumes.get.called)
+
+    @mock.patch('sahara.utils.openstack.cinder.client')
+    def test_volume_status_cache_missing_volume(self, p_cinder):
+        p_cinder().volumes.list.return_value = [_mock_volume('1', 'creating')]
+        p_cinder().volumes.get.return_value = _mock_volume('2', 'available')
+        statuses = volumes.VolumeStatusCache()
+
+        # the volume isn't on the first page of the list
+        self.assertEqual({'1': 'creating', '2': 'available'},
+                         statuses.get(['1', '2']))
+        p_cinder().volumes.get.assert_called_once_with('2')
 
     @mock.patch('sahara.context.sleep')
     @mock.patch('sahara.service.volumes._get_unmounted_devices')
@@ -97,30 +170,19 @@ class TestAttachVolume(base.SaharaWithDbTestCase):
         p_sleep.return_value = None
         instance = r.InstanceResource({'instance_id': '123454321',
                                        'instance_name': 'instt'})
+        self.override_config('volume_available_timeout', 0)
         self.assertIsNone(volumes._await_attach_volumes(instance, 2))
-        self.assertRaises(ex.SystemError, volumes._await_attach_volumes,
+        self.assertRaises(ex.TimeoutException, volumes._await_attach_volumes,
                           instance, 3)
 
     def test_get_unmounted_devices(self):
-        partitions = """major minor  #blocks  name
-
-   7        0   41943040 vdd
-   7        1  102400000 vdc
-   7        1  222222222 vdc1
-   8        0  976762584 vda
-   8        0  111111111 vda1
-   8        1  842576896 vdb"""
-
-        mount = """
-/dev/vda1 qwe rty
-/dev/vdb asd fgh"""
-
         instance = self._get_instance()
         ex_cmd = instance.remote().execute_command
-        ex_cmd.side_effect = [(0, partitions), (0, mount)]
+        ex_cmd.return_value = (0, '/dev/vdb\n/dev/vdd\n')
 
-        self.assertEqual(
-            volumes._get_unmounted_devices(instance), ['/dev/vdd'])
+        self.assertEqual(['/dev/vdb', '/dev/vdd'],
+                         volumes._get_unmounted_devices(instance))
+        self.assertIn('sudo bash -s list', ex_cmd.call_args[0][0])
 
     def _get_instance(self):
         inst_remote = mock.MagicMock()
@@ -131,3 +193,10 @@ class TestAttachVolume(base.SaharaWithDbTestCase):
         inst.remote.return_value = inst_remote
 
         return inst
+
+
+def _mock_volume(id, status):
+    volume = mock.Mock()
+    volume.id = id
+    volume.status = status
+    return volume
@@ -0,0 +1,261 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+
+import mock
+from novaclient import exceptions as nova_exceptions
+
+from sahara.service import warm_pool
+from sahara.tests.unit import base
+
+
+class FakeServers(object):
+    def __init__(self, status='ACTIVE'):
+        self.status = status
+        self.servers = {}
+        self._ids = itertools.count(1)
+
+    def create(self, name, image, flavor, userdata=None, nics=None):
+        server = mock.Mock()
+        server.id = str(next(self._ids))
+        server.name = name
+        server.status = self.status
+        server.userdata = userdata
+        server.metadata = {}
+        server.addresses = {'private': [{'OS-EXT-IPS:type': 'fixed',
+                                         'addr': '10.0.0.%s' % server.id}]}
+        self.servers[server.id] = server
+        return server
+
+    def get(self, server_id):
+        return self.servers[server_id]
+
+    def list(self):
+        return list(self.servers.values())
+
+    def update(self, server_id, name):
+        if server_id not in self.servers:
+            raise nova_exceptions.NotFound(404)
+        self.servers[server_id].name = name
+
+    def set_meta(self, server_id, metadata):
+        if server_id not in self.servers:
+            raise nova_exceptions.NotFound(404)
+        self.servers[server_id].metadata.update(metadata)
+
+    def delete_meta(self, server_id, keys):
+        for key in keys:
+            self.servers[server_id].metadata.pop(key, None)
+
+    def delete(self, server_id):
+        del self.servers[server_id]
+
+
+class FakeNova(object):
+    def __init__(self, status='ACTIVE'):
+        self.servers = FakeServers(status)
+        self.keypairs = mock.Mock()
+
+
+class TestWarmPool(base.SaharaTestCase):
+    def setUp(self):
+        super(TestWarmPool, self).setUp()
+        self.override_config('warm_pool_min_size', 2)
+        self.override_config('warm_pool_max_size', 3)
+        self.override_config('use_floating_ips', True)
+
+        self.nova = FakeNova()
+        self._patch('sahara.utils.openstack.nova.client',
+                    return_value=self.nova)
+        self._patch('sahara.utils.remote.get_userdata_template',
+                    return_value='')
+        self._patch('sahara.utils.crypto.generate_key_pair',
+                    return_value=('private', 'public\n'))
+        self._patch('sahara.context.sleep')
+        self.use_admin_context = self._patch(
+            'sahara.service.warm_pool._use_admin_context')
+        # boot instances of the pool right away
+        self.spawn = self._patch(
+            'sahara.context.spawn',
+            side_effect=lambda name, func, *args: func(*args))
+
+        self.pool = warm_pool.WarmPool()
+        self.node_group = mock.Mock(flavor_id='flavor',
+                                    image_username='ubuntu')
+        self.node_group.get_image_id.return_value = 'image'
+
+    def _patch(self, target, **kwargs):
+        patcher = mock.patch(target, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _get_stats(self):
+        pool = list(self.pool._pools.values())[0]
+        return {'ready': len(pool.ready), 'booting': pool.booting,
+                'target': pool.target}
+
+    def test_disabled(self):
+        self.override_config('warm_pool_min_size', 0)
+
+        self.assertIsNone(self.pool.claim(self.node_group, None, 'inst'))
+        self.assertEqual({}, self.nova.servers.servers)
+
+    def test_claim(self):
+        # the pool is filled after the first request
+        self.assertIsNone(self.pool.claim(self.node_group, None, 'inst-1'))
+        self.assertEqual(2, len(self.nova.servers.servers))
+        self.assertEqual({'ready': 2, 'booting': 0, 'target': 2},
+                         self._get_stats())
+        self.assertIn('echo "public', self.nova.servers.get('1').userdata)
+        self.assertIn('/home/ubuntu/', self.nova.servers.get('1').userdata)
+        # instances are booted by the admin user in the tenant
+        self.use_admin_context.assert_called_with('tenant_1')
+
+        self.assertEqual('1', self.pool.claim(self.node_group, None,
+                                              'inst-2'))
+        self.assertEqual('inst-2', self.nova.servers.get('1').name)
+        # the claim is recorded until the instance is rekeyed
+        self.assertIn(warm_pool.CLAIMED_METADATA_KEY,
+                      self.nova.servers.get('1').metadata)
+        # the claimed instance is replaced
+        self.assertEqual(3, len(self.nova.servers.servers))
+        self.assertEqual({'ready': 2, 'booting': 0, 'target': 2},
+                         self._get_stats())
+
+    def test_pools_are_separated(self):
+        self.pool.claim(self.node_group, None, 'inst-1')
+
+        self.assertIsNone(self.pool.claim(self.node_group, 'net', 'inst-2'))
+        self.assertEqual(2, len(self.pool._pools))
+
+    def test_pool_grows_on_demand(self):
+        self.pool.claim(self.node_group, None, 'inst')
+        # instances are still booting
+        self.spawn.side_effect = None
+
+        for idx in range(4):
+            self.pool.claim(self.node_group, None, 'inst')
+            self.pool.claim(self.node_group, None, 'inst')
+
+        self.assertEqual({'ready': 0, 'booting': 3, 'target': 3},
+                         self._get_stats())
+
+    def test_deleted_instance_is_skipped(self):
+        self.pool.claim(self.node_group, None, 'inst-1')
+        self.nova.servers.delete('1')
+
+        self.assertEqual('2', self.pool.claim(self.node_group, None,
+                                              'inst-2'))
+
+    def test_failed_instance_is_deleted(self):
+        self.nova.servers.status = 'ERROR'
+
+        self.pool.claim(self.node_group, None, 'inst')
+
+        self.assertEqual({}, self.nova.servers.servers)
+        self.assertEqual({'ready': 0, 'booting': 0, 'target': 2},
+                         self._get_stats())
+
+    @mock.patch('sahara.service.warm_pool._execute_quietly',
+                return_value=True)
+    def test_ssh_checked_without_floating_ips(self, execute):
+        self.override_config('use_floating_ips', False)
+
+        self.pool.claim(self.node_group, None, 'inst')
+
+        self.assertEqual(2, execute.call_count)
+        target = execute.call_args[0][0]
+        self.assertEqual('10.0.0.2', target.management_ip)
+        self.assertEqual('ubuntu', target.node_group.image_username)
+        self.assertEqual('private',
+                         target.node_group.cluster.management_private_key)
+
+    @mock.patch('sahara.service.warm_pool._execute_quietly',
+                return_value=True)
+    def test_rekey(self, execute):
+        self.pool.claim(self.node_group, None, 'inst-1')
+        self.pool.claim(self.node_group, None, 'inst-2')
+        self.nova.keypairs.get.return_value.public_key = 'user-key\n'
+
+        instance = mock.Mock(instance_id='1', management_ip='172.18.0.1')
+        cluster = instance.node_group.cluster
+        cluster.management_public_key = 'cluster-key'
+        cluster.user_keypair_id = 'user-keypair'
+
+        self.assertTrue(self.pool.rekey(instance))
+
+        target, command = execute.call_args[0]
+        self.assertEqual('172.18.0.1', target.management_ip)
+        self.assertEqual(cluster.id, target.node_group.cluster.id)
+        self.assertIn("grep -vxF public ", command)
+        self.assertIn("echo 'cluster-key\nuser-key'", command)
+
+        self.assertEqual({}, self.nova.servers.get('1').metadata)
+
+        # instance is rekeyed once
+        self.assertTrue(self.pool.rekey(instance))
+        self.assertEqual(1, execute.call_count)
+
+    @mock.patch('sahara.service.warm_pool._execute_quietly')
+    def test_rekey_not_pooled_instance(self, execute):
+        self.assertTrue(self.pool.rekey(mock.Mock(instance_id='1')))
+        self.assertFalse(execute.called)
+
+    def test_shutdown(self):
+        self.pool.claim(self.node_group, None, 'inst-1')
+        self.pool.claim(self.node_group, None, 'inst-2')
+        self.assertEqual(3, len(self.nova.servers.servers))
+
+        self.pool.shutdown()
+        # pooled servers are deleted out of requests, with no context left
+        self.setup_context()
+
+        # the claimed instance is kept
+        self.assertEqual(['1'], list(self.nova.servers.servers))
+        # the pool isn't refilled anymore
+        self.assertIsNone(self.pool.claim(self.node_group, None, 'inst-3'))
+        self.assertEqual(['1'], list(self.nova.servers.servers))
+
+    @mock.patch('sahara.service.warm_pool.conductor')
+    def test_delete_leftovers(self, conductor):
+        conductor.cluster_get_all.return_value = [
+            mock.Mock(tenant_id='tenant-1'), mock.Mock(tenant_id='tenant-1')]
+        self.pool.claim(self.node_group, None, 'inst-1')
+        other_engine = self.nova.servers.create('sahara-pool-other-1',
+                                                'image', 'flavor')
+        self.use_admin_context.reset_mock()
+
+        warm_pool.WarmPool().delete_leftovers()
+
+        self.use_admin_context.assert_called_once_with('tenant-1')
+        self.assertEqual([other_engine.id], list(self.nova.servers.servers))
+
+    @mock.patch('sahara.service.warm_pool.conductor')
+    def test_delete_claimed_leftovers(self, conductor):
+        conductor.cluster_get_all.return_value = [
+            mock.Mock(tenant_id='tenant-1')]
+        self.pool.claim(self.node_group, None, 'inst-1')
+        self.pool.claim(self.node_group, None, 'inst-2')
+        self.pool.claim(self.node_group, None, 'inst-3')
+        # only the first instance is rekeyed before the engine crashes
+        self.nova.servers.delete_meta('1', [warm_pool.CLAIMED_METADATA_KEY])
+        other_engine = self.nova.servers.create('inst-4', 'image', 'flavor')
+        other_engine.metadata[warm_pool.CLAIMED_METADATA_KEY] = 'other'
+
+        warm_pool.WarmPool().delete_leftovers()
+
+        self.assertEqual(['1', other_engine.id],
+                         sorted(self.nova.servers.servers))
@@ -28,8 +28,7 @@ rnd = random.Random()
 
 class ContextTest(unittest2.TestCase):
     def setUp(self):
-        ctx = context.Context('test_user', 'tenant_1', 'test_auth_token', {},
-                              remote_semaphore='123')
+        ctx = context.Context('test_user', 'tenant_1', 'test_auth_token', {})
         context.set_ctx(ctx)
 
     def _add_element(self, lst, i):
@@ -124,11 +123,21 @@ class ContextTest(unittest2.TestCase):
         existing_ctx = context.ctx()
         try:
             ctx = context.Context('test_user', 'tenant_1', 'test_auth_token',
-                                  {"network": "aURL"}, remote_semaphore='123')
+                                  {"network": "aURL"})
             self.assertTrue(ctx.is_auth_capable())
         finally:
             context.set_ctx(existing_ctx)
 
+    def test_clone_shares_service_catalog_index(self):
+        ctx = context.Context('test_user', 'tenant_1', 'test_auth_token',
+                              '[{"type": "compute", "endpoints": []}]')
+        index = ctx.service_catalog_index
+        self.assertEqual(set(['compute']), index.service_types)
+        self.assertIs(index, ctx.clone().service_catalog_index)
+
+        ctx.service_catalog = '[]'
+        self.assertEqual(set(), ctx.service_catalog_index.service_types)
+
 
 class TestException(Exception):
     pass
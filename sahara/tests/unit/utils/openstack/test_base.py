@@ -13,6 +13,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import mock
+
+from sahara import context
+from sahara import exceptions as ex
 from sahara.tests.unit import base as ub
 from sahara.utils.openstack import base as b
 
@@ -43,3 +47,42 @@ class TestBase(ub.SaharaTestCase):
         self.override_config("os_region_name", "RegionTwo")
         self.assertEqual("http://172.18.184.6:8774/v2",
                          b.url_for(service_catalog, "compute"))
+
+    def test_url_for_v3(self):
+        service_catalog = (
+            '[{"endpoints": '
+            '  [{"url": "http://192.168.0.5:8774/v2", '
+            '    "region": "RegionOne", '
+            '    "interface": "admin"}, '
+            '   {"url": "http://172.18.184.5:8774/v2", '
+            '    "region": "RegionOne", '
+            '    "interface": "public"}], '
+            '  "type": "compute"}]')
+        index = context.Context(service_catalog=service_catalog
+                                ).service_catalog_index
+
+        self.assertEqual("http://172.18.184.5:8774/v2",
+                         b.url_for(index, "compute"))
+        self.assertEqual("http://192.168.0.5:8774/v2",
+                         b.url_for(index, "compute", admin=True))
+
+        self.assertRaises(ex.SystemError, b.url_for, index, "compute",
+                          endpoint_type="internalURL")
+        self.assertRaises(ex.SystemError, b.url_for, index, "network")
+
+    def test_get_client(self):
+        create_client = mock.Mock(side_effect=lambda ctx: object())
+        client = b.get_client('nova', create_client)
+
+        # shared by clones of the context
+        context.set_ctx(context.ctx().clone())
+        self.assertIs(client, b.get_client('nova', create_client))
+        self.assertEqual(1, create_client.call_count)
+
+        self.assertIsNot(client, b.get_client('cinder', create_client))
+
+        context.ctx().token = 'new_token'
+        new_client = b.get_client('nova', create_client)
+        self.assertIsNot(client, new_client)
+        self.assertIs(new_client, b.get_client('nova', create_client))
+        self.assertEqual(3, create_client.call_count)
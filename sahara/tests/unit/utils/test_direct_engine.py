@@ -13,9 +13,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import mock
 import unittest2
 
+from sahara import exceptions as ex
 from sahara.service import direct_engine as e
+from sahara.tests.unit import base
 
 
 class TestDirectEngine(unittest2.TestCase):
@@ -29,3 +32,67 @@ class TestDirectEngine(unittest2.TestCase):
             self.engine._get_inst_name("cluster", "worker", 1), inst_name)
         self.assertEqual(
             self.engine._get_inst_name("CLUSTER", "WORKER", 1), inst_name)
+
+
+class TestWaitUntilAccessible(base.SaharaTestCase):
+    def setUp(self):
+        super(TestWaitUntilAccessible, self).setUp()
+        self.engine = e.DirectEngine()
+        self.instance = mock.Mock()
+        self.instance.remote.return_value.execute_command.return_value = (
+            0, '')
+        patcher = mock.patch('sahara.utils.timeline.add_step')
+        self.add_step = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('sahara.utils.general.check_cluster_exists',
+                return_value=True)
+    @mock.patch('sahara.context.sleep')
+    @mock.patch('sahara.service.engine._is_port_open')
+    def test_probe_port_before_ssh(self, is_port_open, sleep, cluster_exists):
+        is_port_open.side_effect = [False, False, False, True]
+
+        self.assertTrue(self.engine._wait_until_accessible(self.instance))
+
+        self.assertEqual(4, is_port_open.call_count)
+        self.assertEqual(1, self.instance.remote.call_count)
+        # readiness timing is recorded per instance
+        self.assertEqual(['await_port', 'await_ssh'],
+                         [call[0][1] for call in self.add_step.call_args_list])
+        delays = [call[0][0] for call in sleep.call_args_list]
+        self.assertEqual(3, len(delays))
+        for delay, max_delay in zip(delays, [1, 2, 4]):
+            self.assertTrue(max_delay / 2.0 <= delay <= max_delay)
+
+    @mock.patch('sahara.utils.general.check_cluster_exists',
+                return_value=False)
+    @mock.patch('sahara.context.sleep')
+    @mock.patch('sahara.service.engine._is_port_open', return_value=False)
+    def test_cluster_deleted_while_probing(self, is_port_open, sleep,
+                                           cluster_exists):
+        self.assertFalse(self.engine._wait_until_accessible(self.instance))
+
+        self.assertEqual(1, is_port_open.call_count)
+        self.assertFalse(self.instance.remote.called)
+
+    @mock.patch('sahara.service.engine._is_port_open')
+    def test_no_probe_with_namespaces(self, is_port_open):
+        self.override_config('use_namespaces', True)
+        self.override_config('use_floating_ips', False)
+
+        self.engine._wait_until_accessible(self.instance)
+
+        self.assertFalse(is_port_open.called)
+        self.assertEqual(1, self.instance.remote.call_count)
+
+    @mock.patch('sahara.utils.general.check_cluster_exists',
+                return_value=True)
+    @mock.patch('sahara.context.sleep')
+    @mock.patch('sahara.service.engine._is_port_open', return_value=True)
+    def test_ssh_timeout(self, is_port_open, sleep, cluster_exists):
+        self.override_config('await_instances_timeout', 0)
+        self.instance.remote.return_value.execute_command.return_value = (
+            2, '')
+
+        self.assertRaises(ex.TimeoutException,
+                          self.engine._wait_until_accessible, self.instance)
@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import mock
 import unittest2
 
 from sahara.utils import general
@@ -39,3 +40,33 @@ class FindDictTest(unittest2.TestCase):
 
         self.assertEqual({"a": 1, "b": 2, "c": 3},
                          general.find_dict(iterable, a=1, b=2))
+
+
+class CheckClusterExistsTest(unittest2.TestCase):
+    def setUp(self):
+        super(CheckClusterExistsTest, self).setUp()
+        self.cluster = mock.Mock(id='1')
+        self.addCleanup(general.forget_cancelled_cluster, '1')
+
+    @mock.patch('sahara.context.ctx')
+    @mock.patch('sahara.conductor.api.LocalApi.cluster_get_status')
+    def test_check_cluster_exists(self, get_status, ctx):
+        get_status.return_value = 'Configuring'
+        self.assertTrue(general.check_cluster_exists(self.cluster))
+
+        get_status.return_value = 'Deleting'
+        self.assertFalse(general.check_cluster_exists(self.cluster))
+
+        get_status.return_value = None
+        self.assertFalse(general.check_cluster_exists(self.cluster))
+
+    @mock.patch('sahara.context.ctx')
+    @mock.patch('sahara.conductor.api.LocalApi.cluster_get_status',
+                return_value='Configuring')
+    def test_cancelled_cluster(self, get_status, ctx):
+        general.cancel_cluster_operations('1')
+        self.assertFalse(general.check_cluster_exists(self.cluster))
+        self.assertFalse(get_status.called)
+
+        general.forget_cancelled_cluster('1')
+        self.assertTrue(general.check_cluster_exists(self.cluster))
@@ -0,0 +1,93 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+
+import unittest2
+
+from sahara.utils import metrics
+
+
+def _find(items, name):
+    return [item for item in items if item['name'] == name]
+
+
+class TestMetrics(unittest2.TestCase):
+    def setUp(self):
+        super(TestMetrics, self).setUp()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_histogram(self):
+        histogram = metrics.Histogram(buckets=(1, 10))
+        for value in (0.5, 1, 5, 20):
+            histogram.observe(value)
+
+        self.assertEqual({'count': 4,
+                          'sum': 26.5,
+                          'min': 0.5,
+                          'max': 20,
+                          'buckets': {'le_1': 2, 'le_10': 1, 'inf': 1}},
+                         histogram.to_dict())
+
+    def test_labels(self):
+        metrics.observe('latency', 1, operation='read')
+        metrics.observe('latency', 3, operation='read')
+        metrics.observe('latency', 2, operation='write')
+        metrics.increment('bytes', 10, operation='write')
+        metrics.increment('bytes', 5, operation='write')
+
+        snapshot = metrics.snapshot()
+
+        histograms = _find(snapshot['histograms'], 'latency')
+        self.assertEqual(2, len(histograms))
+        read = [h for h in histograms if h['operation'] == 'read'][0]
+        self.assertEqual(2, read['count'])
+        self.assertEqual(4, read['sum'])
+
+        self.assertEqual([{'name': 'bytes', 'operation': 'write',
+                           'value': 15}],
+                         _find(snapshot['counters'], 'bytes'))
+
+    def test_gauges(self):
+        metrics.register_gauge('queue', lambda: {'queued': 3})
+        self.addCleanup(metrics._gauges.pop, 'queue')
+
+        self.assertEqual({'queued': 3}, metrics.snapshot()['gauges']['queue'])
+
+    def test_call_site(self):
+        def helper():
+            return metrics.get_call_site(['sahara.utils.remote'])
+
+        self.assertEqual('%s:helper' % __name__, helper())
+        self.assertEqual('%s:test_call_site' % __name__,
+                         metrics.get_call_site([]))
+
+    def test_dump(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'metrics.json')
+
+        with metrics.timer('step', plugin='vanilla'):
+            pass
+        metrics.dump(path)
+
+        with open(path) as f:
+            dumped = json.load(f)
+        self.assertEqual(1, _find(dumped['histograms'], 'step')[0]['count'])
+        self.assertEqual(['metrics.json'], os.listdir(tmp_dir))
@@ -13,13 +13,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import shutil
+import tempfile
+
 import mock
 import unittest2
 
+from sahara import exceptions as ex
 from sahara.utils.openstack import neutron as neutron_client
 
 
 class NeutronClientRemoteWrapperTest(unittest2.TestCase):
+    def setUp(self):
+        super(NeutronClientRemoteWrapperTest, self).setUp()
+        neutron_client._routers.clear()
+        self.addCleanup(neutron_client._routers.clear)
+
     @mock.patch("neutronclient.neutron.client.Client")
     def test_get_router(self, patched):
         patched.side_effect = _test_get_neutron_client
@@ -28,12 +38,162 @@ class NeutronClientRemoteWrapperTest(unittest2.TestCase):
         self.assertEqual('6c4d4e32-3667-4cd4-84ea-4cc1e98d18be',
                          neutron.get_router())
 
+    @mock.patch("sahara.utils.openstack.neutron.time.time")
+    @mock.patch("neutronclient.neutron.client.Client")
+    def test_get_router_cached(self, patched, time):
+        fake_client = FakeNeutronClient()
+        patched.return_value = fake_client
+        neutron = neutron_client.NeutronClientRemoteWrapper(
+            '33b47310-b7a8-4559-bf95-45ba669a448e', None, None, None)
+
+        time.return_value = 1000
+        neutron.get_router()
+        neutron.get_router()
+        self.assertEqual(1, fake_client.list_ports_calls)
+
+        neutron_client.invalidate_router(
+            '33b47310-b7a8-4559-bf95-45ba669a448e')
+        neutron.get_router()
+        self.assertEqual(2, fake_client.list_ports_calls)
+
+        # cached router has expired
+        time.return_value = 2000
+        neutron.get_router()
+        self.assertEqual(3, fake_client.list_ports_calls)
+
+    @mock.patch("neutronclient.neutron.client.Client")
+    def test_get_router_not_found(self, patched):
+        patched.side_effect = _test_get_neutron_client
+        neutron = neutron_client.NeutronClientRemoteWrapper(
+            'unknown-network', None, None, None)
+        self.assertRaises(ex.SystemError, neutron.get_router)
+
+
+class FakeProxy(object):
+    def __init__(self, qrouter, path):
+        self.qrouter = qrouter
+        self.path = path
+        self.alive = True
+        self.closed = False
+
+    def is_alive(self):
+        return self.alive
+
+    def close(self):
+        self.closed = True
+
+
+@mock.patch("sahara.utils.openstack.neutron.NetnsProxy", FakeProxy)
+class NetnsProxyTest(unittest2.TestCase):
+    def setUp(self):
+        super(NetnsProxyTest, self).setUp()
+        self.addCleanup(neutron_client._routers.clear)
+        self.addCleanup(neutron_client._proxies.clear)
+
+    def _get_proxy(self, qrouter):
+        neutron_client.get_netns_proxy(qrouter)
+        return neutron_client._proxies[qrouter]
+
+    def test_dead_proxy_replaced(self):
+        proxy = self._get_proxy('router')
+        self.assertIs(proxy, self._get_proxy('router'))
+
+        proxy.alive = False
+        self.assertIsNot(proxy, self._get_proxy('router'))
+        self.assertTrue(proxy.closed)
+
+    @mock.patch("sahara.utils.openstack.neutron.time.time")
+    def test_unused_proxies_closed(self, time):
+        time.return_value = 1000
+        neutron_client._routers.update({'net1': ('router1', 1500),
+                                        'net2': ('router1', 1500),
+                                        'net3': ('router2', 2000)})
+        proxy1 = self._get_proxy('router1')
+        proxy2 = self._get_proxy('router2')
+
+        # the router is still cached for another network
+        neutron_client.invalidate_router('net1')
+        self.assertFalse(proxy1.closed)
+
+        time.return_value = 1600
+        neutron_client.close_expired_proxies()
+        self.assertTrue(proxy1.closed)
+        self.assertFalse(proxy2.closed)
+        self.assertEqual(['router2'], list(neutron_client._proxies))
+
+        neutron_client.invalidate_router('net3')
+        self.assertTrue(proxy2.closed)
+        self.assertEqual({}, neutron_client._proxies)
+
+
+class NetnsProxyCloseTest(unittest2.TestCase):
+    @mock.patch("sahara.utils.openstack.neutron.e_subprocess.Popen")
+    def test_close_removes_socket(self, popen):
+        popen.return_value.stdout.readline.return_value = 'ready\n'
+        proxy_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, proxy_dir)
+        path = os.path.join(proxy_dir, 'router.sock')
+
+        proxy = neutron_client.NetnsProxy('router', path)
+        # the socket is left by the proxy process
+        open(path, 'w').close()
+        proxy.close()
+
+        self.assertTrue(popen.return_value.stdin.close.called)
+        self.assertFalse(os.path.exists(path))
+
+
+class FakeSocket(object):
+    def __init__(self, response):
+        self.response = response
+        self.sent = ''
+        self.closed = False
+
+    def connect(self, path):
+        self.path = path
+
+    def sendall(self, data):
+        self.sent += data
+
+    def recv(self, size):
+        data, self.response = self.response[:size], self.response[size:]
+        return data
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectThroughProxyTest(unittest2.TestCase):
+    @mock.patch("socket.socket")
+    def test_connect(self, socket):
+        sock = FakeSocket('OK\nSSH-2.0-OpenSSH\r\n')
+        socket.return_value = sock
+
+        self.assertEqual(sock, neutron_client.connect_through_proxy(
+            '/tmp/proxy.sock', '10.0.0.2', 22))
+        self.assertEqual('/tmp/proxy.sock', sock.path)
+        self.assertEqual('10.0.0.2 22\n', sock.sent)
+        # data following the answer is left for the caller
+        self.assertEqual('SSH-2.0-OpenSSH\r\n', sock.response)
+
+    @mock.patch("socket.socket")
+    def test_connect_failed(self, socket):
+        sock = FakeSocket('ERR timed out\n')
+        socket.return_value = sock
+
+        self.assertRaises(ex.SystemError,
+                          neutron_client.connect_through_proxy,
+                          '/tmp/proxy.sock', '10.0.0.2', 22)
+        self.assertTrue(sock.closed)
+
 
 def _test_get_neutron_client(api_version, *args, **kwargs):
     return FakeNeutronClient()
 
 
 class FakeNeutronClient():
+    list_ports_calls = 0
+
     def list_routers(self):
         return {"routers": [{"status": "ACTIVE", "external_gateway_info": {
             "network_id": "61f95d3f-495e-4409-8c29-0b806283c81e"},
@@ -42,7 +202,8 @@ class FakeNeutronClient():
             "routes": [],
             "id": "6c4d4e32-3667-4cd4-84ea-4cc1e98d18be"}]}
 
-    def list_ports(self, device_id=None):
+    def list_ports(self, **kwargs):
+        self.list_ports_calls += 1
         return {"ports": [
             {"status": "ACTIVE", "name": "", "admin_state_up": True,
              "network_id": "33b47310-b7a8-4559-bf95-45ba669a448e",
@@ -0,0 +1,91 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import unittest2
+
+from sahara import exceptions as ex
+from sahara.utils import metrics
+from sahara.utils import poll_utils
+
+
+class TestPoll(unittest2.TestCase):
+    def setUp(self):
+        super(TestPoll, self).setUp()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def _get_sleeps(self, sleep):
+        return [call[0][0] for call in sleep.call_args_list]
+
+    @mock.patch('sahara.context.sleep')
+    def test_backoff(self, sleep):
+        predicate = mock.Mock(side_effect=[False, False, False, False, True])
+
+        self.assertTrue(poll_utils.poll(predicate, 'test', delay=1,
+                                        max_delay=5, backoff=2))
+
+        self.assertEqual(5, predicate.call_count)
+        self.assertEqual([1, 2, 4, 5], self._get_sleeps(sleep))
+
+        histogram = metrics.snapshot()['histograms'][0]
+        self.assertEqual('poll.duration', histogram['name'])
+        self.assertEqual('test', histogram['operation'])
+        self.assertEqual('done', histogram['result'])
+
+    @mock.patch('sahara.context.sleep')
+    def test_progress_resets_delay(self, sleep):
+        predicate = mock.Mock(side_effect=[False, False, poll_utils.PROGRESSED,
+                                           False, True])
+
+        poll_utils.poll(predicate, 'test', delay=1, backoff=2)
+
+        self.assertEqual([1, 2, 1, 2], self._get_sleeps(sleep))
+
+    @mock.patch('sahara.context.sleep')
+    def test_jitter(self, sleep):
+        predicate = mock.Mock(side_effect=[False] * 10 + [True])
+
+        poll_utils.poll(predicate, 'test', delay=4, jitter=0.5)
+
+        for delay in self._get_sleeps(sleep):
+            self.assertTrue(2 <= delay <= 4)
+
+    @mock.patch('sahara.utils.general.check_cluster_exists',
+                side_effect=[True, False])
+    @mock.patch('sahara.context.sleep')
+    def test_cluster_deleted(self, sleep, cluster_exists):
+        predicate = mock.Mock(return_value=False)
+
+        self.assertFalse(poll_utils.poll(predicate, 'test',
+                                         cluster=mock.Mock()))
+
+        self.assertEqual(2, predicate.call_count)
+        self.assertEqual(1, sleep.call_count)
+
+    @mock.patch('sahara.context.sleep')
+    @mock.patch('eventlet.green.time.time')
+    def test_timeout(self, time, sleep):
+        time.side_effect = [0, 0, 4, 8, 10, 10, 10]
+        predicate = mock.Mock(return_value=False)
+
+        with self.assertRaises(ex.TimeoutException) as context:
+            poll_utils.poll(predicate, 'test', timeout=10, delay=4)
+
+        self.assertEqual("TIMEOUT", context.exception.code)
+        # the last sleep doesn't go beyond the deadline
+        self.assertEqual([4, 4, 2], self._get_sleeps(sleep))
+        self.assertEqual('timeout',
+                         metrics.snapshot()['histograms'][0]['result'])
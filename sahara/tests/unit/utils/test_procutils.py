@@ -0,0 +1,148 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import six
+import unittest2
+
+from sahara.utils import procutils
+
+
+def _make_proc():
+    proc = mock.Mock()
+    proc.poll.return_value = None
+    proc.terminated = False
+    proc.requests = 0
+    return proc
+
+
+@mock.patch('eventlet.spawn_n', lambda func: func())
+@mock.patch('sahara.utils.procutils.kill_subprocess')
+@mock.patch('sahara.utils.procutils.start_subprocess',
+            side_effect=lambda: _make_proc())
+class TestSubprocessPool(unittest2.TestCase):
+    def test_prefork(self, start, kill):
+        pool = procutils.SubprocessPool(min_size=2, max_size=4)
+        self.assertEqual(2, start.call_count)
+
+        pool.get()
+        self.assertEqual(3, start.call_count)
+
+    def test_prefork_in_background(self, start, kill):
+        with mock.patch('eventlet.spawn_n') as spawn_n:
+            pool = procutils.SubprocessPool(min_size=2, max_size=4)
+
+        self.assertEqual(0, start.call_count)
+        spawn_n.assert_called_once_with(pool._refill)
+
+    def test_reuse(self, start, kill):
+        pool = procutils.SubprocessPool(max_size=1)
+
+        proc = pool.get()
+        pool.put(proc)
+        self.assertIs(proc, pool.get())
+        self.assertEqual(1, start.call_count)
+        self.assertEqual(0, kill.call_count)
+
+    def test_max_size(self, start, kill):
+        pool = procutils.SubprocessPool(max_size=1)
+
+        proc1 = pool.get()
+        proc2 = pool.get()
+        pool.put(proc1)
+        pool.put(proc2)
+        kill.assert_called_once_with(proc2)
+
+    def test_max_tasks(self, start, kill):
+        pool = procutils.SubprocessPool(max_size=1, max_tasks=3)
+
+        proc = pool.get()
+        proc.requests = 2
+        pool.put(proc)
+        self.assertIs(proc, pool.get())
+        # requests are counted rather than leases
+        proc.requests = 3
+        pool.put(proc)
+        kill.assert_called_once_with(proc)
+        self.assertIsNot(proc, pool.get())
+
+    def test_crashed_subprocess(self, start, kill):
+        pool = procutils.SubprocessPool(max_size=1)
+
+        proc = pool.get()
+        pool.put(proc)
+        proc.poll.return_value = -9
+
+        self.assertIsNot(proc, pool.get())
+        kill.assert_called_once_with(proc)
+
+    def test_max_leases(self, start, kill):
+        pool = procutils.SubprocessPool(max_size=1, max_leases=2)
+
+        proc1 = pool.get()
+        self.assertIs(proc1, pool.get())
+        proc2 = pool.get()
+        self.assertIsNot(proc1, proc2)
+        self.assertEqual(2, start.call_count)
+
+        pool.put(proc2)
+        self.assertIs(proc2, pool.get())
+        self.assertEqual(0, kill.call_count)
+
+
+class TestSubprocess(unittest2.TestCase):
+    def _make_subprocess(self, responses):
+        popen = mock.Mock()
+        popen.stdin = six.BytesIO()
+        popen.stdout = six.BytesIO()
+        for response in responses:
+            procutils.write_frame(popen.stdout, response)
+        popen.stdout.seek(0)
+
+        with mock.patch('eventlet.spawn', lambda func: func):
+            proc = procutils.Subprocess(popen)
+        return proc
+
+    def test_dead_reader_fails_calls(self):
+        proc = self._make_subprocess([])
+        # the reader stops on the end of the stream
+        proc._reader()
+
+        self.assertTrue(proc.terminated)
+        self.assertFalse(procutils.is_alive(proc))
+        self.assertRaises(EOFError, proc.call, len, ('abc',))
+        self.assertEqual({}, proc._waiters)
+
+    def test_call_timeout(self):
+        proc = self._make_subprocess([])
+
+        self.assertRaises(procutils.e_timeout.Timeout, proc.call, len,
+                          ('abc',), timeout=0.01)
+        self.assertEqual({}, proc._waiters)
+        self.assertEqual(1, proc.requests)
+
+
+class TestFrames(unittest2.TestCase):
+    def test_write_read_frames(self):
+        stream = six.BytesIO()
+        procutils.write_frame(stream, (1, {'output': 'data'}))
+        procutils.write_frame(stream, (2, {'exception': 'error'}))
+        stream.seek(0)
+
+        self.assertEqual((1, {'output': 'data'}),
+                         procutils.read_frame(stream))
+        self.assertEqual((2, {'exception': 'error'}),
+                         procutils.read_frame(stream))
+        self.assertRaises(EOFError, procutils.read_frame, stream)
@@ -0,0 +1,67 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+
+from sahara import exceptions as ex
+from sahara.tests.unit import base
+from sahara.utils import remote
+
+
+def _make_instance(name):
+    instance = mock.Mock()
+    instance.instance_name = name
+    return instance
+
+
+@mock.patch('sahara.utils.remote.get_remote')
+class TestBroadcast(base.SaharaTestCase):
+    def _make_remote(self, get_remote, results):
+        r = mock.MagicMock()
+        r.__enter__.return_value = r
+        r.execute_commands.side_effect = results
+        get_remote.return_value = r
+        return r
+
+    def test_broadcast(self, get_remote):
+        r = self._make_remote(get_remote, lambda *args, **kwargs: [(0, '')])
+        instances = [_make_instance('i1'), _make_instance('i2')]
+
+        results = remote.broadcast(instances, ['cmd'], {'file': 'data'})
+
+        self.assertEqual({'i1': [(0, '')], 'i2': [(0, '')]}, results)
+        self.assertEqual(2, r.write_files_to.call_count)
+        r.execute_commands.assert_called_with(['cmd'], run_as_root=False,
+                                              raise_when_error=True)
+
+    def test_broadcast_failures(self, get_remote):
+        remotes = {
+            'i1': self._make_remote(get_remote, [[(0, '')]]),
+            'i2': self._make_remote(get_remote,
+                                    ex.RemoteCommandException('cmd')),
+            'i3': self._make_remote(get_remote, [[(0, '')]])
+        }
+        get_remote.side_effect = lambda inst: remotes[inst.instance_name]
+        instances = [_make_instance('i1'), _make_instance('i2'),
+                     _make_instance('i3')]
+
+        with self.assertRaises(ex.RemoteBroadcastException) as e:
+            remote.broadcast(instances, ['cmd'], max_parallel=1)
+
+        self.assertEqual(['i2'], list(e.exception.failures))
+
+    def test_broadcast_no_instances(self, get_remote):
+        self.assertEqual({}, remote.broadcast([], ['cmd']))
+        self.assertEqual(0, get_remote.call_count)
@@ -0,0 +1,134 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import eventlet
+import unittest2
+
+from sahara.utils import scheduler
+
+
+class TestFairScheduler(unittest2.TestCase):
+    def _spawn_waiters(self, sched, requests, served):
+        def _acquire(tenant_id, cluster_id, interactive):
+            sched.acquire(tenant_id, cluster_id, interactive)
+            served.append((tenant_id, cluster_id))
+
+        threads = [eventlet.spawn(_acquire, *request)
+                   for request in requests]
+        # let all the threads queue up
+        eventlet.sleep(0)
+        return threads
+
+    def _release_all(self, sched, served):
+        released = 0
+        while released < len(served):
+            tenant_id, cluster_id = served[released]
+            sched.release(tenant_id, cluster_id)
+            released += 1
+            eventlet.sleep(0)
+
+    def test_acquire_without_contention(self):
+        sched = scheduler.FairScheduler(2, 2)
+        sched.acquire('t1', 'c1')
+        sched.acquire('t1', 'c1')
+
+        stats = sched.stats()
+        self.assertEqual(2, stats['running'])
+        self.assertEqual(0, stats['queued'])
+        self.assertEqual({'c1': 2}, stats['running_by_cluster'])
+
+        sched.release('t1', 'c1')
+        sched.release('t1', 'c1')
+        self.assertEqual(0, sched.stats()['running'])
+        self.assertEqual({}, sched.stats()['running_by_tenant'])
+
+    def test_tenants_are_served_fairly(self):
+        sched = scheduler.FairScheduler(1, 1)
+        sched.acquire('t0', 'c0')
+
+        served = []
+        requests = ([('t1', 'c1', False)] * 4 +
+                    [('t2', 'c2', False)] * 2)
+        self._spawn_waiters(sched, requests, served)
+        self.assertEqual(6, sched.stats()['queued'])
+        self.assertEqual({'t1': 4, 't2': 2},
+                         sched.stats()['queued_by_tenant'])
+
+        sched.release('t0', 'c0')
+        eventlet.sleep(0)
+        self._release_all(sched, served)
+
+        self.assertEqual(['t1', 't2', 't1', 't2', 't1', 't1'],
+                         [tenant_id for tenant_id, _ in served])
+
+    def test_tenant_weights(self):
+        sched = scheduler.FairScheduler(1, 1, weights={'t1': 2})
+        sched.acquire('t0', 'c0')
+
+        served = []
+        requests = ([('t1', 'c1', False)] * 4 +
+                    [('t2', 'c2', False)] * 2)
+        self._spawn_waiters(sched, requests, served)
+
+        sched.release('t0', 'c0')
+        eventlet.sleep(0)
+        self._release_all(sched, served)
+
+        self.assertEqual(['t1', 't2', 't1', 't1', 't2', 't1'],
+                         [tenant_id for tenant_id, _ in served])
+
+    def test_interactive_first(self):
+        sched = scheduler.FairScheduler(1, 1)
+        sched.acquire('t0', 'c0')
+
+        served = []
+        requests = [('t1', 'c1', False), ('t1', 'c1', False),
+                    ('t2', 'c2', True)]
+        self._spawn_waiters(sched, requests, served)
+
+        sched.release('t0', 'c0')
+        eventlet.sleep(0)
+        self._release_all(sched, served)
+
+        self.assertEqual(['t2', 't1', 't1'],
+                         [tenant_id for tenant_id, _ in served])
+
+    def test_cluster_capacity(self):
+        sched = scheduler.FairScheduler(3, 1)
+        sched.acquire('t1', 'c1')
+
+        served = []
+        self._spawn_waiters(sched, [('t1', 'c1', False),
+                                    ('t1', 'c2', False)], served)
+
+        # the second cluster is not blocked by the busy first one
+        self.assertEqual([('t1', 'c2')], served)
+        self.assertEqual({'c1': 1}, sched.stats()['queued_by_cluster'])
+
+        sched.release('t1', 'c1')
+        eventlet.sleep(0)
+        self.assertEqual([('t1', 'c2'), ('t1', 'c1')], served)
+
+    def test_killed_waiter(self):
+        sched = scheduler.FairScheduler(1, 1)
+        sched.acquire('t1', 'c1')
+
+        served = []
+        threads = self._spawn_waiters(sched, [('t2', 'c2', False)], served)
+        threads[0].kill()
+
+        self.assertEqual(0, sched.stats()['queued'])
+        sched.release('t1', 'c1')
+        self.assertEqual(0, sched.stats()['running'])
@@ -13,8 +13,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import tarfile
+
+import eventlet
+import mock
+import six
 import unittest2
 
+from sahara import exceptions as ex
+from sahara.tests.unit import base
+from sahara.utils import remote
+from sahara.utils import scheduler
 from sahara.utils import ssh_remote
 
 
@@ -22,3 +31,361 @@ class TestEscapeQuotes(unittest2.TestCase):
     def test_escape_quotes(self):
         s = ssh_remote._escape_quotes('echo "\\"Hello, world!\\""')
         self.assertEqual(s, r'echo \"\\\"Hello, world!\\\"\"')
+
+
+class FakeChannel(object):
+    def __init__(self, stdout, stderr):
+        self.stdout = list(stdout)
+        self.stderr = list(stderr)
+
+    def recv_ready(self):
+        return bool(self.stdout)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv(self, size):
+        return self.stdout.pop(0) if self.stdout else ''
+
+    def recv_stderr(self, size):
+        return self.stderr.pop(0) if self.stderr else ''
+
+    def exit_status_ready(self):
+        return True
+
+
+@mock.patch('select.select')
+class TestReadStreams(unittest2.TestCase):
+    def test_read_streams(self, select):
+        chan = FakeChannel(['out1\n', 'out2'], ['err1', 'err2'])
+
+        self.assertEqual(('out1\nout2', 'err1err2'),
+                         ssh_remote._read_paramiko_streams(chan))
+
+
+class TestExecuteCommands(unittest2.TestCase):
+    def _batch_output(self, marker, results):
+        stdout = stderr = ''
+        for idx, (code, out, err) in enumerate(results):
+            stdout += '%s-begin-%d\n%s\n%s-end-%d %d\n' % (
+                marker, idx, out, marker, idx, code)
+            stderr += '%s-begin-%d\n%s\n%s-end-%d\n' % (
+                marker, idx, err, marker, idx)
+
+        return stdout, stderr
+
+    @mock.patch('uuid.uuid4')
+    @mock.patch('sahara.utils.ssh_remote._execute_command')
+    def test_execute_commands(self, execute, uuid4):
+        uuid4.return_value.hex = 'id'
+        stdout, stderr = self._batch_output(
+            'sahara-id', [(0, 'out1\n', ''), (0, 'out2', 'err2')])
+        execute.return_value = 0, stdout, stderr
+
+        self.assertEqual(
+            [(0, 'out1\n', ''), (0, 'out2', 'err2')],
+            ssh_remote._execute_commands(['cmd1', 'cmd2'], get_stderr=True))
+        self.assertEqual(1, execute.call_count)
+
+    @mock.patch('uuid.uuid4')
+    @mock.patch('sahara.utils.ssh_remote._execute_command')
+    def test_execute_commands_stop_on_error(self, execute, uuid4):
+        uuid4.return_value.hex = 'id'
+        stdout, stderr = self._batch_output(
+            'sahara-id', [(0, 'out1', ''), (2, 'out2', 'err2')])
+        execute.return_value = 2, stdout, stderr
+
+        self.assertEqual(
+            [(0, 'out1'), (2, 'out2')],
+            ssh_remote._execute_commands(['cmd1', 'cmd2', 'cmd3'],
+                                         raise_when_error=False))
+        self.assertRaises(ex.RemoteCommandException,
+                          ssh_remote._execute_commands,
+                          ['cmd1', 'cmd2', 'cmd3'])
+
+
+class TestWriteFiles(unittest2.TestCase):
+    def test_make_archive(self):
+        files = {'/etc/hadoop/core-site.xml': u'<configuration/>',
+                 'id_rsa': 'key'}
+
+        archive = ssh_remote._make_archive(files, {'id_rsa': 0o600})
+        with tarfile.open(fileobj=six.BytesIO(archive), mode='r:gz') as tar:
+            self.assertEqual(sorted(files), sorted(tar.getnames()))
+            for name, data in six.iteritems(files):
+                self.assertEqual(data, tar.extractfile(name).read())
+            self.assertEqual(
+                0o644, tar.getmember('/etc/hadoop/core-site.xml').mode)
+            self.assertEqual(0o600, tar.getmember('id_rsa').mode)
+
+    @mock.patch('sahara.utils.ssh_remote._execute_command')
+    @mock.patch('sahara.utils.ssh_remote._write_fl')
+    @mock.patch('sahara.utils.ssh_remote._local')
+    def test_write_files_bundled(self, local, write_fl, execute):
+        execute.return_value = 0, 'a\nb\n', ''
+
+        ssh_remote._write_files_to({'a': 'data', 'b': 'data'})
+        self.assertEqual(1, write_fl.call_count)
+        self.assertEqual(2, execute.call_count)
+        cmd = execute.call_args_list[0][0][0]
+        self.assertNotIn('chown', cmd)
+        self.assertFalse(execute.call_args_list[0][1]['run_as_root'])
+
+    @mock.patch('sahara.utils.ssh_remote._execute_command')
+    @mock.patch('sahara.utils.ssh_remote._write_fl')
+    @mock.patch('sahara.utils.ssh_remote._local')
+    def test_write_files_bundled_as_root(self, local, write_fl, execute):
+        execute.return_value = 0, 'a\nb\n', ''
+        sftp = local.ssh.open_sftp.return_value
+        sftp.stat.return_value = mock.Mock(st_uid=1000, st_gid=1001)
+
+        ssh_remote._write_files_to({'a': 'data', 'b': 'data'},
+                                   run_as_root=True)
+        cmd = execute.call_args_list[0][0][0]
+        self.assertIn('chown 1000:1001 ', cmd)
+        self.assertTrue(execute.call_args_list[0][1]['run_as_root'])
+
+    @mock.patch('sahara.utils.ssh_remote._execute_command')
+    @mock.patch('sahara.utils.ssh_remote._write_fl')
+    @mock.patch('sahara.utils.ssh_remote._local')
+    def test_write_single_file_mode(self, local, write_fl, execute):
+        sftp = local.ssh.open_sftp.return_value
+
+        ssh_remote._write_files_to({'script.sh': 'data'},
+                                   modes={'script.sh': 0o755})
+        sftp.chmod.assert_called_once_with('script.sh', 0o755)
+        self.assertEqual(0, execute.call_count)
+
+    @mock.patch('sahara.utils.ssh_remote._execute_command')
+    @mock.patch('sahara.utils.ssh_remote._write_fl')
+    @mock.patch('sahara.utils.ssh_remote._local')
+    def test_write_files_bundled_failed(self, local, write_fl, execute):
+        execute.return_value = 2, 'a\n', 'tar: b: Cannot open'
+
+        self.assertRaises(ex.RemoteCommandException,
+                          ssh_remote._write_files_to,
+                          {'a': 'data', 'b': 'data'})
+        # archive is removed anyway
+        self.assertIn('rm -f', execute.call_args[0][0])
+
+
+class TestWriteChangedFiles(base.SaharaTestCase):
+    def setUp(self):
+        super(TestWriteChangedFiles, self).setUp()
+        self.instance = mock.Mock()
+        self.instance.id = 'instance_id'
+        self.instance.node_group.cluster.id = 'cluster_id'
+
+    @mock.patch('sahara.utils.ssh_remote._write_files_to')
+    @mock.patch('sahara.utils.ssh_remote._execute_command')
+    def test_write_changed_files(self, execute, write_files):
+        execute.return_value = 0, '%s  a\n%s  b\n' % (
+            ssh_remote._get_hash('data'), ssh_remote._get_hash('old'))
+
+        written = ssh_remote._write_changed_files_to(
+            {'a': 'data', 'b': 'data', 'c': 'data'})
+
+        self.assertEqual(['b', 'c'], sorted(written))
+        write_files.assert_called_once_with({'b': 'data', 'c': 'data'},
+                                            False, None)
+
+    def test_instance_is_always_checked(self):
+        helper = ssh_remote.InstanceInteropHelper(self.instance)
+        with mock.patch.object(helper, '_run_s') as run:
+            run.side_effect = lambda func, timeout, files, *args: []
+
+            helper.write_files_to({'a': 'data', 'b': 'data'},
+                                  only_changed=True)
+            # files could be changed on the instance meanwhile
+            helper.write_file_to('a', 'data', only_changed=True)
+
+            self.assertEqual(2, run.call_count)
+            self.assertEqual(ssh_remote._write_changed_files_to,
+                             run.call_args[0][0])
+            self.assertEqual({'a': 'data'}, run.call_args[0][2])
+
+    def test_replace_remote_string(self):
+        helper = ssh_remote.InstanceInteropHelper(self.instance)
+        with mock.patch.object(helper, '_run_s') as run:
+            helper.replace_remote_string('a', 'old', 'new')
+
+        run.assert_called_once_with(ssh_remote._replace_remote_string, 120,
+                                    'a', 'old', 'new')
+
+
+class FakeConnection(object):
+    def __init__(self, key, cluster_id, conn_params):
+        self.key = key
+        self.cluster_id = cluster_id
+        self.last_used = 0
+        self.alive = True
+        self.closed = False
+
+    def is_alive(self):
+        return self.alive
+
+    def close(self):
+        self.closed = True
+
+
+@mock.patch('sahara.utils.ssh_remote._Connection', FakeConnection)
+class TestConnectionPool(base.SaharaTestCase):
+    def setUp(self):
+        super(TestConnectionPool, self).setUp()
+        self.pool = ssh_remote._ConnectionPool()
+        self.key = ('10.0.0.1', 'ubuntu', 'fingerprint', None)
+
+    def test_reuse_connection(self):
+        conn = self.pool.get(self.key, 'cluster', ())
+        self.pool.put(conn)
+
+        self.assertIs(conn, self.pool.get(self.key, 'cluster', ()))
+        self.assertFalse(conn.closed)
+
+    def test_broken_connection_is_replaced(self):
+        conn = self.pool.get(self.key, 'cluster', ())
+        self.pool.put(conn)
+        conn.alive = False
+
+        new_conn = self.pool.get(self.key, 'cluster', ())
+        self.assertIsNot(conn, new_conn)
+        self.assertTrue(conn.closed)
+
+    def test_not_reusable_connection_is_closed(self):
+        conn = self.pool.get(self.key, 'cluster', ())
+        self.pool.put(conn, reusable=False)
+
+        self.assertTrue(conn.closed)
+        self.assertIsNot(conn, self.pool.get(self.key, 'cluster', ()))
+
+    def test_close_idle(self):
+        self.override_config('remote_connection_idle_timeout', 10)
+        conn = self.pool.get(self.key, 'cluster', ())
+        self.pool.put(conn)
+
+        conn.last_used -= 100
+        self.pool.close_idle()
+        self.assertTrue(conn.closed)
+
+    def test_close_cluster(self):
+        conn1 = self.pool.get(self.key, 'cluster1', ())
+        conn2 = self.pool.get(('10.0.0.2',) + self.key[1:], 'cluster2', ())
+        self.pool.put(conn1)
+        self.pool.put(conn2)
+
+        self.pool.close_cluster('cluster1')
+        self.assertTrue(conn1.closed)
+        self.assertFalse(conn2.closed)
+
+    def test_pool_size(self):
+        self.override_config('remote_connection_pool_size', 1)
+        conn1 = self.pool.get(self.key, 'cluster', ())
+        conn2 = self.pool.get(self.key, 'cluster', ())
+        self.pool.put(conn1)
+        self.pool.put(conn2)
+
+        self.assertTrue(conn1.closed)
+        self.assertFalse(conn2.closed)
+
+
+@mock.patch('sahara.utils.openstack.neutron.forget_http_adapter')
+class TestSessionCache(base.SaharaTestCase):
+    def setUp(self):
+        super(TestSessionCache, self).setUp()
+        self.cache = ssh_remote._SessionCache()
+
+    def test_get(self, forget_adapter):
+        session = mock.Mock()
+        self.cache.put(('cluster', '10.0.0.1', 11000), session)
+
+        self.assertIs(session, self.cache.get(('cluster', '10.0.0.1', 11000)))
+        self.assertIsNone(self.cache.get(('cluster', '10.0.0.1', 8080)))
+
+    def test_least_recently_used_closed(self, forget_adapter):
+        self.override_config('http_session_cache_size', 2)
+        sessions = [mock.Mock() for i in range(3)]
+        self.cache.put(('cluster', '10.0.0.1', 80), sessions[0])
+        self.cache.put(('cluster', '10.0.0.2', 80), sessions[1])
+        self.cache.get(('cluster', '10.0.0.1', 80))
+        self.cache.put(('cluster', '10.0.0.3', 80), sessions[2])
+
+        self.assertFalse(sessions[0].close.called)
+        self.assertTrue(sessions[1].close.called)
+        self.assertFalse(sessions[2].close.called)
+        forget_adapter.assert_called_once_with('10.0.0.2', 80)
+
+    @mock.patch('sahara.utils.ssh_remote.time.time')
+    def test_close_idle(self, time, forget_adapter):
+        self.override_config('http_session_idle_timeout', 10)
+        old, fresh = mock.Mock(), mock.Mock()
+        time.return_value = 100
+        self.cache.put(('cluster', '10.0.0.1', 80), old)
+        time.return_value = 105
+        self.cache.put(('cluster', '10.0.0.2', 80), fresh)
+
+        time.return_value = 112
+        self.cache.close_idle()
+        self.assertTrue(old.close.called)
+        self.assertFalse(fresh.close.called)
+
+    def test_close_cluster_and_host(self, forget_adapter):
+        sessions = [mock.Mock() for i in range(3)]
+        self.cache.put(('cluster1', '10.0.0.1', 80), sessions[0])
+        self.cache.put(('cluster1', '10.0.0.2', 80), sessions[1])
+        self.cache.put(('cluster2', '10.0.0.3', 80), sessions[2])
+
+        self.cache.close_host('10.0.0.2')
+        self.assertEqual([False, True, False],
+                         [s.close.called for s in sessions])
+
+        self.cache.close_cluster('cluster1')
+        self.assertEqual([True, True, False],
+                         [s.close.called for s in sessions])
+        self.assertIsNone(self.cache.get(('cluster1', '10.0.0.1', 80)))
+
+
+class TestRemoteScheduling(base.SaharaTestCase):
+    def setUp(self):
+        super(TestRemoteScheduling, self).setUp()
+        self.scheduler = scheduler.FairScheduler(1, 1)
+        patcher = mock.patch('sahara.utils.ssh_remote._remote_scheduler',
+                             self.scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _make_helper(self, cluster_id, executed):
+        instance = mock.Mock()
+        instance.node_group.cluster.id = cluster_id
+        helper = ssh_remote.InstanceInteropHelper(instance)
+
+        def _run(func, timeout, cmd, *args):
+            executed.append(cmd)
+            return 0, ''
+
+        helper._run_with_log = mock.Mock(side_effect=_run)
+        return helper
+
+    def test_interactive_overtakes_provisioning(self):
+        executed = []
+        provisioning = self._make_helper('cluster_1', executed)
+        job = self._make_helper('cluster_2', executed)
+
+        def _get_job_status():
+            with remote.interactive():
+                job.execute_command('job-status')
+
+        # all the slots are taken
+        self.scheduler.acquire('tenant_1', 'cluster_0')
+        for idx in range(3):
+            eventlet.spawn(provisioning.execute_command, 'configure')
+        eventlet.sleep(0)
+        eventlet.spawn(_get_job_status)
+        eventlet.sleep(0)
+        self.assertEqual(4, self.scheduler.stats()['queued'])
+
+        self.scheduler.release('tenant_1', 'cluster_0')
+        for idx in range(4):
+            eventlet.sleep(0)
+
+        self.assertEqual(['job-status', 'configure', 'configure',
+                          'configure'], executed)
@@ -21,6 +21,10 @@ from sahara import context
 
 conductor = c.API
 
+# ids of clusters being terminated by this process, operations on them
+# are cancelled without asking the database
+_cancelled_clusters = set()
+
 
 def find_dict(iterable, **rules):
     """Search for dict in iterable of dicts using specified key-value rules."""
@@ -65,11 +69,24 @@ def format_cluster_status(cluster):
     return msg % ("Unknown", "Unknown")
 
 
+def cancel_cluster_operations(cluster_id):
+    """Makes wait loops of operations on the cluster stop."""
+    _cancelled_clusters.add(cluster_id)
+
+
+def forget_cancelled_cluster(cluster_id):
+    _cancelled_clusters.discard(cluster_id)
+
+
 def check_cluster_exists(cluster):
+    if cluster.id in _cancelled_clusters:
+        return False
+
     ctx = context.ctx()
-    # check if cluster still exists (it might have been removed)
-    cluster = conductor.cluster_get(ctx, cluster)
-    return cluster is not None
+    # check if cluster still exists (it might have been removed or
+    # be deleted by another process)
+    status = conductor.cluster_get_status(ctx, cluster)
+    return status is not None and status != "Deleting"
 
 
 def get_instances(cluster, instances_ids=None):
@@ -0,0 +1,181 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-process registry of counters and latency histograms.
+
+Metrics are identified by a name and a set of labels, e.g.
+``remote.latency`` with labels ``operation`` and ``call_site``.
+The registry lives in memory of the sahara process and is periodically
+dumped to a file if 'metrics_dump_file' is set.
+"""
+
+import bisect
+import contextlib
+import json
+import os
+import sys
+
+from eventlet.green import time
+from oslo.config import cfg
+import six
+
+from sahara.openstack.common import log as logging
+
+
+metrics_opts = [
+    cfg.StrOpt('metrics_dump_file',
+               help='File to periodically dump in-process metrics (remote '
+                    'operation latencies, transferred bytes, queue depths) '
+                    'to, in JSON format. Metrics are not dumped if not set.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(metrics_opts)
+
+LOG = logging.getLogger(__name__)
+
+# upper bounds of histogram buckets, in seconds
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 300)
+
+
+class Histogram(object):
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # the last counter is for values above the highest bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        buckets = dict(('le_%s' % bound, count) for bound, count
+                       in zip(self.buckets, self.counts))
+        buckets['inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'buckets': buckets
+        }
+
+
+_histograms = {}
+_counters = {}
+_gauges = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(six.iteritems(labels)))
+
+
+def observe(name, value, **labels):
+    """Records a value, e.g. latency in seconds, in the histogram."""
+    key = _key(name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = Histogram()
+    histogram.observe(value)
+
+
+def increment(name, value=1, **labels):
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def register_gauge(name, func):
+    """Registers function returning current value of the gauge."""
+    _gauges[name] = func
+
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    """Records time spent in the block in the histogram."""
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        observe(name, time.time() - start_time, **labels)
+
+
+def get_call_site(skip_modules):
+    """Returns 'module:function' of the closest caller outside of modules.
+
+    Used to attribute metrics of low level helpers to e.g. plugin steps
+    calling them.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__')
+        if module not in skip_modules:
+            return '%s:%s' % (module, frame.f_code.co_name)
+        frame = frame.f_back
+    return 'unknown'
+
+
+def _labels_to_dict(name, labels):
+    result = dict(labels)
+    result['name'] = name
+    return result
+
+
+def snapshot():
+    histograms = []
+    for (name, labels), histogram in six.iteritems(_histograms):
+        item = _labels_to_dict(name, labels)
+        item.update(histogram.to_dict())
+        histograms.append(item)
+
+    counters = []
+    for (name, labels), value in six.iteritems(_counters):
+        item = _labels_to_dict(name, labels)
+        item['value'] = value
+        counters.append(item)
+
+    gauges = {}
+    for name, func in six.iteritems(_gauges):
+        try:
+            gauges[name] = func()
+        except Exception as e:
+            LOG.warn("Failed to get value of gauge %s: %s", name, e)
+
+    return {
+        'timestamp': time.time(),
+        'histograms': histograms,
+        'counters': counters,
+        'gauges': gauges
+    }
+
+
+def dump(path):
+    # write to a temporary file first so that readers never see
+    # a partially written dump
+    tmp_path = '%s.tmp' % path
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot(), f, indent=2, sort_keys=True)
+    os.rename(tmp_path, path)
+
+
+def reset():
+    _histograms.clear()
+    _counters.clear()
@@ -13,66 +13,59 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
-
 from oslo.config import cfg
+
+from sahara import context
 from sahara import exceptions as ex
+from sahara.utils.openstack import catalog
 
 
 CONF = cfg.CONF
 
 
+def get_client(service, create_client):
+    """Returns client of the service cached in the current context.
+
+    Clients are created by create_client(ctx) and shared by the context
+    and its clones, so all threads of an operation reuse connections
+    of the same client. The client is recreated when the token or the
+    tenant of the context changes, e.g. when a trust is used.
+    """
+    ctx = context.current()
+    token, tenant_id, client = ctx.clients.get(service, (None, None, None))
+    if client is None or token != ctx.token or tenant_id != ctx.tenant_id:
+        client = create_client(ctx)
+        ctx.clients[service] = (ctx.token, ctx.tenant_id, client)
+    return client
+
+
 def url_for(service_catalog, service_type, admin=False, endpoint_type=None):
+    """Returns url of the service endpoint.
+
+    service_catalog is either JSON string or catalog.ServiceCatalog,
+    e.g. service_catalog_index of the context, which is parsed already.
+    """
     if not endpoint_type:
         endpoint_type = 'publicURL'
     if admin:
         endpoint_type = 'adminURL'
 
-    service = _get_service_from_catalog(service_catalog, service_type)
-
-    if service:
-        endpoints = service['endpoints']
-        if CONF.os_region_name:
-            endpoints = [e for e in endpoints
-                         if e['region'] == CONF.os_region_name]
-        try:
-            return _get_endpoint_url(endpoints, endpoint_type)
-        except Exception:
-            raise ex.SystemError(
-                "Endpoint with type %s is not found for service %s"
-                % (endpoint_type, service_type))
-
-    else:
+    if not isinstance(service_catalog, catalog.ServiceCatalog):
+        service_catalog = catalog.ServiceCatalog(service_catalog)
+
+    if service_type not in service_catalog.service_types:
         raise ex.SystemError('Service "%s" not found in service catalog'
                              % service_type)
 
+    url = service_catalog.get_endpoint(service_type,
+                                       catalog.get_interface(endpoint_type),
+                                       CONF.os_region_name or None)
+    if url is None:
+        raise ex.SystemError(
+            "Endpoint with type %s is not found for service %s"
+            % (endpoint_type, service_type))
 
-def _get_service_from_catalog(catalog, service_type):
-    if catalog:
-        catalog = json.loads(catalog)
-        for service in catalog:
-            if service['type'] == service_type:
-                return service
-
-    return None
-
-
-def _get_endpoint_url(endpoints, endpoint_type):
-    if 'interface' in endpoints[0]:
-        endpoint_type = endpoint_type[0:-3]
-        for endpoint in endpoints:
-            if endpoint['interface'] == endpoint_type:
-                return endpoint['url']
-    return _get_case_insensitive(endpoints[0], endpoint_type)
-
-
-def _get_case_insensitive(dictionary, key):
-    for k, v in dictionary.items():
-        if str(k).lower() == str(key).lower():
-            return v
-
-    #this will raise an exception as usual if key was not found
-    return dictionary[key]
+    return url
 
 
 def retrieve_auth_url():
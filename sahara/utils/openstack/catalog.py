@@ -0,0 +1,69 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import six
+
+
+# keys of endpoint urls in Keystone v2 catalog
+V2_INTERFACES = {
+    'publicurl': 'public',
+    'adminurl': 'admin',
+    'internalurl': 'internal'
+}
+
+
+def get_interface(endpoint_type):
+    """Converts endpoint type, e.g. 'publicURL', to interface 'public'."""
+    return endpoint_type[0:-3].lower()
+
+
+class ServiceCatalog(object):
+    """Endpoints of the service catalog indexed for lookups.
+
+    The catalog, in Keystone v2 or v3 format, is parsed once and
+    endpoint urls are keyed by (service type, region, interface).
+    """
+
+    def __init__(self, service_catalog):
+        self.service_types = set()
+        self._endpoints = {}
+        if service_catalog:
+            for service in json.loads(service_catalog):
+                self._add_service(service)
+
+    def _add_service(self, service):
+        service_type = service['type']
+        self.service_types.add(service_type)
+
+        for endpoint in service.get('endpoints', []):
+            if 'interface' in endpoint:
+                urls = {endpoint['interface']: endpoint['url']}
+            else:
+                urls = dict((V2_INTERFACES[key.lower()], url)
+                            for key, url in six.iteritems(endpoint)
+                            if key.lower() in V2_INTERFACES)
+
+            region = endpoint.get('region')
+            for interface, url in six.iteritems(urls):
+                self._endpoints.setdefault(
+                    (service_type, region, interface), url)
+                # the first endpoint is used if region isn't specified
+                self._endpoints.setdefault(
+                    (service_type, None, interface), url)
+
+    def get_endpoint(self, service_type, interface, region=None):
+        return self._endpoints.get((service_type, region, interface))
@@ -15,13 +15,15 @@
 
 from cinderclient.v1 import client as cinder_client
 
-from sahara import context
 from sahara.utils.openstack import base
 
 
 def client():
-    ctx = context.current()
-    volume_url = base.url_for(ctx.service_catalog, 'volume')
+    return base.get_client('cinder', _create_client)
+
+
+def _create_client(ctx):
+    volume_url = base.url_for(ctx.service_catalog_index, 'volume')
 
     cinder = cinder_client.Client(ctx.username,
                                   ctx.token,
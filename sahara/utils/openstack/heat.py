@@ -18,11 +18,11 @@ import json
 from heatclient import client as heat_client
 from oslo.config import cfg
 
-from sahara import context
 from sahara import exceptions as ex
 from sahara.openstack.common import log as logging
 from sahara.utils import files as f
 from sahara.utils.openstack import base
+from sahara.utils import poll_utils
 
 
 CONF = cfg.CONF
@@ -30,8 +30,11 @@ LOG = logging.getLogger(__name__)
 
 
 def client():
-    ctx = context.current()
-    heat_url = base.url_for(ctx.service_catalog, 'orchestration')
+    return base.get_client('heat', _create_client)
+
+
+def _create_client(ctx):
+    heat_url = base.url_for(ctx.service_catalog_index, 'orchestration')
     return heat_client.Client('1', heat_url, token=ctx.token)
 
 
@@ -224,15 +227,20 @@ class ClusterStack(object):
         self.heat_stack = heat_stack
 
     def wait_till_active(self):
-        while self.heat_stack.stack_status in ('CREATE_IN_PROGRESS',
-                                               'UPDATE_IN_PROGRESS'):
-            context.sleep(1)
-            self.heat_stack.get()
+        poll_utils.poll(self._is_stack_ready, 'await_heat_stack',
+                        timeout=CONF.heat_stack_timeout,
+                        delay=1, max_delay=10, backoff=1.5)
 
         if self.heat_stack.stack_status not in ('CREATE_COMPLETE',
                                                 'UPDATE_COMPLETE'):
             raise ex.HeatStackException(self.heat_stack.stack_status)
 
+    def _is_stack_ready(self):
+        in_progress = ('CREATE_IN_PROGRESS', 'UPDATE_IN_PROGRESS')
+        if self.heat_stack.stack_status in in_progress:
+            self.heat_stack.get()
+        return self.heat_stack.stack_status not in in_progress
+
     def get_node_group_instances(self, node_group):
         insts = []
 
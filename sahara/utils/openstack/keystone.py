@@ -17,7 +17,6 @@ from keystoneclient.v2_0 import client as keystone_client
 from keystoneclient.v3 import client as keystone_client_v3
 from oslo.config import cfg
 
-from sahara import context
 from sahara.utils.openstack import base
 
 
@@ -34,7 +33,10 @@ CONF.register_opts(opts)
 
 
 def client():
-    ctx = context.current()
+    return base.get_client('keystone', _create_client)
+
+
+def _create_client(ctx):
     auth_url = base.retrieve_auth_url()
 
     if CONF.use_identity_api_v3:
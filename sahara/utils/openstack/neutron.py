@@ -13,39 +13,101 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import atexit
 import os
-import shlex
+import shutil
+import socket
+import sys
+import tempfile
 
 from eventlet.green import subprocess as e_subprocess
+from eventlet.green import time
+from eventlet import semaphore
 from neutronclient.neutron import client as neutron_cli
+from oslo.config import cfg
 import requests
 from requests import adapters
 
-from sahara import context
 from sahara import exceptions as ex
 from sahara.openstack.common import log as logging
 from sahara.utils.openstack import base
 
 
+opts = [
+    cfg.IntOpt('neutron_router_cache_ttl',
+               default=600,
+               help='Time in seconds the router of a network, used to '
+                    'access instances through its namespace, is cached.')
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+
 LOG = logging.getLogger(__name__)
 
+# network id -> (router id, expiration time)
+_routers = {}
+
+# router id -> NetnsProxy
+_proxies = {}
+_proxies_lock = semaphore.Semaphore()
+_proxy_dir = None
+
 
 def client():
-    ctx = context.ctx()
+    return base.get_client('neutron', _create_client)
+
+
+def _create_client(ctx):
     args = {
         'username': ctx.username,
         'tenant_name': ctx.tenant_name,
         'tenant_id': ctx.tenant_id,
         'token': ctx.token,
-        'endpoint_url': base.url_for(ctx.service_catalog, 'network')
+        'endpoint_url': base.url_for(ctx.service_catalog_index, 'network')
     }
     return neutron_cli.Client('2.0', **args)
 
 
+def invalidate_router(network):
+    """Forgets the cached router of the network and closes its proxy."""
+    if _routers.pop(network, None):
+        _close_unused_proxies()
+
+
+def close_expired_proxies():
+    """Forgets expired routers and closes proxies into their namespaces."""
+    now = time.time()
+    for network, (router_id, expiration) in list(_routers.items()):
+        if expiration <= now:
+            _routers.pop(network, None)
+    _close_unused_proxies()
+
+
+def _close_unused_proxies():
+    # a router could be cached for several networks
+    used = set(router_id for router_id, expiration in _routers.values())
+    with _proxies_lock:
+        unused = [_proxies.pop(qrouter) for qrouter in list(_proxies)
+                  if qrouter not in used]
+    for proxy in unused:
+        proxy.close()
+
+
+def _close_all_proxies():
+    with _proxies_lock:
+        proxies = list(_proxies.values())
+        _proxies.clear()
+    for proxy in proxies:
+        proxy.close()
+
+    if _proxy_dir:
+        shutil.rmtree(_proxy_dir, ignore_errors=True)
+
+
 class NeutronClientRemoteWrapper():
     neutron = None
     adapters = {}
-    routers = {}
 
     def __init__(self, network, uri, token, tenant_name):
         self.neutron = neutron_cli.Client('2.0',
@@ -55,29 +117,30 @@ class NeutronClientRemoteWrapper():
         self.network = network
 
     def get_router(self):
-        matching_router = NeutronClientRemoteWrapper.routers.get(self.network,
-                                                                 None)
-        if matching_router:
+        router_id, expiration = _routers.get(self.network, (None, 0))
+        if router_id and expiration > time.time():
             LOG.debug('Returning cached qrouter')
-            return matching_router['id']
-
-        routers = self.neutron.list_routers()['routers']
-        for router in routers:
-            device_id = router['id']
-            ports = self.neutron.list_ports(device_id=device_id)['ports']
-            port = next((port for port in ports
-                         if port['network_id'] == self.network), None)
-            if port:
-                matching_router = router
-                NeutronClientRemoteWrapper.routers[
-                    self.network] = matching_router
-                break
-
-        if not matching_router:
+            return router_id
+
+        # a single query for the router interface in the network
+        # instead of listing ports of every router
+        ports = self.neutron.list_ports(
+            network_id=self.network,
+            device_owner='network:router_interface')['ports']
+        port = next((port for port in ports
+                     if port['network_id'] == self.network and
+                     port['device_owner'] == 'network:router_interface'),
+                    None)
+
+        if not port:
+            invalidate_router(self.network)
             raise ex.SystemError('Neutron router corresponding to network {0} '
                                  'is not found'.format(self.network))
 
-        return matching_router['id']
+        router_id = port['device_id']
+        _routers[self.network] = (router_id,
+                                  time.time() + CONF.neutron_router_cache_ttl)
+        return router_id
 
     def get_http_session(self, host, port=None, *args, **kwargs):
         session = requests.Session()
@@ -92,33 +155,35 @@ class NeutronClientRemoteWrapper():
         adapters = []
         if not port:
             # returning all registered adapters for given host
-            adapters = [adapter for adapter in self.adapters
+            adapters = [adapter for adapter in self.adapters.values()
                         if adapter.host == host]
         else:
             # need to retrieve or create specific adapter
-            adapter = self.adapters.get((host, port), None, *args, **kwargs)
+            adapter = self.adapters.get((host, port), None)
             if not adapter:
                 LOG.debug('Creating neutron adapter for {0}:{1}'
                           .format(host, port))
                 qrouter = self.get_router()
                 adapter = \
-                    NeutronHttpAdapter(qrouter, host, port)
+                    NeutronHttpAdapter(qrouter, host, port, *args, **kwargs)
                 self.adapters[(host, port)] = adapter
-                adapters = [adapter]
+            adapters = [adapter]
 
         return adapters
 
 
+def forget_http_adapter(host, port):
+    """Drops the cached adapter for the host and port if any."""
+    NeutronClientRemoteWrapper.adapters.pop((host, port), None)
+
+
 class NeutronHttpAdapter(adapters.HTTPAdapter):
     port = None
     host = None
 
     def __init__(self, qrouter, host, port, *args, **kwargs):
         super(NeutronHttpAdapter, self).__init__(*args, **kwargs)
-        command = 'ip netns exec qrouter-{0} nc {1} {2}'.format(qrouter,
-                                                                host, port)
-        LOG.debug('Neutron adapter created with cmd {0}'.format(command))
-        self.cmd = shlex.split(command)
+        self.qrouter = qrouter
         self.port = port
         self.host = host
 
@@ -130,14 +195,10 @@ class NeutronHttpAdapter(adapters.HTTPAdapter):
             if http_conn.sock is None:
                 if hasattr(http_conn, 'connect'):
                     sock = self._connect()
-                    LOG.debug('HTTP connecction {0} getting new '
-                              'netcat socket {1}'.format(http_conn, sock))
+                    LOG.debug('HTTP connection {0} getting new '
+                              'namespace proxy socket {1}'
+                              .format(http_conn, sock))
                     http_conn.sock = sock
-            else:
-                if hasattr(http_conn.sock, 'is_netcat_socket'):
-                    LOG.debug('pooled http connection has existing '
-                              'netcat socket. resetting pipe...')
-                    http_conn.sock.reset()
 
             pool_conn._put_conn(http_conn)
 
@@ -149,62 +210,108 @@ class NeutronHttpAdapter(adapters.HTTPAdapter):
         super(NeutronHttpAdapter, self).close()
 
     def _connect(self):
-        LOG.debug('returning netcat socket with command {0}'
-                  .format(self.cmd))
-        return NetcatSocket(self.cmd)
+        return connect_through_proxy(get_netns_proxy(self.qrouter),
+                                     self.host, self.port)
 
 
-class NetcatSocket:
+def _get_proxy_executable():
+    return '%s/_sahara-netns-proxy' % os.path.dirname(sys.argv[0])
 
-    def _create_process(self):
-        self.process = e_subprocess.Popen(self.cmd,
-                                          stdin=e_subprocess.PIPE,
-                                          stdout=e_subprocess.PIPE,
-                                          stderr=e_subprocess.PIPE)
 
-    def __init__(self, cmd):
-        self.cmd = cmd
-        self._create_process()
+def _read_line(sock):
+    # read byte by byte not to consume data following the line
+    line = ''
+    while not line.endswith('\n'):
+        char = sock.recv(1)
+        if not char:
+            raise socket.error('Namespace proxy closed the connection')
+        line += char
+    return line.strip()
 
-    def send(self, content):
-        try:
-            self.process.stdin.write(content)
-        except IOError as e:
-            raise ex.SystemError(e)
-        return len(content)
-
-    def sendall(self, content):
-        return self.send(content)
-
-    def makefile(self, mode, *arg):
-        if mode.startswith('r'):
-            return self.process.stdout
-        if mode.startswith('w'):
-            return self.process.stdin
-        raise ex.IncorrectStateError("Unknown file mode %s" % mode)
-
-    def recv(self, size):
-        try:
-            return os.read(self.process.stdout.fileno(), size)
-        except IOError as e:
-            raise ex.SystemError(e)
 
-    def _terminate(self):
-        self.process.terminate()
+class NetnsProxy(object):
+    """Long-lived process forwarding connections into a router namespace.
 
-    def close(self):
-        LOG.debug('Socket close called')
-        self._terminate()
+    The process is started once per namespace and serves all SSH and
+    HTTP connections to instances behind the router, so a connection
+    costs a unix socket connect instead of a fork and exec of 'ip netns
+    exec ... nc'.
+    """
 
-    def settimeout(self, timeout):
-        pass
+    def __init__(self, qrouter, path):
+        self.qrouter = qrouter
+        self.path = path
 
-    def fileno(self):
-        return self.process.stdin.fileno()
+        cmd = ['ip', 'netns', 'exec', 'qrouter-%s' % qrouter,
+               _get_proxy_executable(), path]
+        LOG.debug('Starting namespace proxy with cmd {0}'.format(cmd))
+        with open(os.devnull, 'w') as devnull:
+            self.process = e_subprocess.Popen(cmd,
+                                              close_fds=True,
+                                              stdin=e_subprocess.PIPE,
+                                              stdout=e_subprocess.PIPE,
+                                              stderr=devnull)
 
-    def is_netcat_socket(self):
-        return True
+        if self.process.stdout.readline().strip() != 'ready':
+            self.close()
+            raise ex.SystemError('Failed to start proxy in namespace '
+                                 'qrouter-{0}'.format(qrouter))
 
-    def reset(self):
-        self._terminate()
-        self._create_process()
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def close(self):
+        LOG.debug('Stopping namespace proxy for qrouter-{0}'
+                  .format(self.qrouter))
+        # the proxy exits as soon as its stdin is closed
+        self.process.stdin.close()
+        self.process.wait()
+        # a new proxy couldn't listen on the path of a stale socket
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def get_netns_proxy(qrouter):
+    """Returns path of the unix socket of the proxy into the namespace.
+
+    The proxy process is started if it is not running yet.
+    """
+    global _proxy_dir
+
+    with _proxies_lock:
+        proxy = _proxies.pop(qrouter, None)
+        if proxy:
+            if proxy.is_alive():
+                _proxies[qrouter] = proxy
+                return proxy.path
+            proxy.close()
+
+        if not _proxy_dir:
+            _proxy_dir = tempfile.mkdtemp(prefix='sahara-netns-')
+            atexit.register(_close_all_proxies)
+        proxy = NetnsProxy(qrouter,
+                           os.path.join(_proxy_dir, '%s.sock' % qrouter))
+        _proxies[qrouter] = proxy
+        return proxy.path
+
+
+def connect_through_proxy(path, host, port):
+    """Returns socket connected to host:port through the namespace proxy."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        sock.sendall('%s %s\n' % (host, port))
+        response = _read_line(sock)
+    except socket.error as e:
+        sock.close()
+        raise ex.SystemError('Failed to connect to namespace proxy {0}: {1}'
+                             .format(path, e))
+
+    if response != 'OK':
+        sock.close()
+        raise ex.SystemError('Namespace proxy failed to connect to '
+                             '{0}:{1}: {2}'.format(host, port, response))
+
+    return sock
@@ -13,18 +13,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import re
+
+from eventlet.green import time
+from eventlet import semaphore
 from novaclient import exceptions as nova_ex
 from novaclient.v1_1 import client as nova_client
 
-from sahara import context
 import sahara.utils.openstack.base as base
 from sahara.utils.openstack import images
 
 
 def client():
-    ctx = context.current()
+    return base.get_client('nova', _create_client)
+
+
+def _create_client(ctx):
     auth_url = base.retrieve_auth_url()
-    compute_url = base.url_for(ctx.service_catalog, 'compute')
+    compute_url = base.url_for(ctx.service_catalog_index, 'compute')
 
     nova = nova_client.Client(username=ctx.username,
                               api_key=None,
@@ -65,6 +71,60 @@ def get_instance_info(instance):
     return client().servers.get(instance.instance_id)
 
 
+def get_instances_info(cluster, instances):
+    """Returns servers of the cluster instances keyed by server id.
+
+    Servers are fetched by a single detailed list request filtered by
+    the cluster name prefix of instance names. Servers missing in the
+    list are requested one by one.
+    """
+    nova = client()
+    server_ids = set(instance.instance_id for instance in instances)
+    name_filter = '^%s-' % _escape_regex(cluster.name.lower())
+
+    servers = dict((server.id, server) for server in
+                   nova.servers.list(search_opts={'name': name_filter})
+                   if server.id in server_ids)
+    for server_id in server_ids - set(servers):
+        servers[server_id] = nova.servers.get(server_id)
+
+    return servers
+
+
+class ServerInfoCache(object):
+    """Servers of cluster instances shared by concurrent pollers.
+
+    Pollers which request servers at about the same time reuse the ones
+    fetched by a single get_instances_info call if they are not older
+    than 'max_age' seconds.
+    """
+
+    def __init__(self, cluster, instances, max_age=1):
+        self.max_age = max_age
+        self._cluster = cluster
+        self._instances = instances
+        self._lock = semaphore.Semaphore()
+        self._servers = {}
+        self._updated_at = None
+
+    def get(self, instance):
+        with self._lock:
+            now = time.time()
+            if (self._updated_at is None or
+                    now - self._updated_at >= self.max_age or
+                    instance.instance_id not in self._servers):
+                self._servers = get_instances_info(self._cluster,
+                                                   self._instances)
+                self._updated_at = now
+            return self._servers[instance.instance_id]
+
+
+def _escape_regex(string):
+    # re.escape escapes every non-alphanumeric character on python 2,
+    # e.g. '_', which isn't portable across regex engines of databases
+    return re.sub(r'([.^$*+?{}\[\]\\|()])', r'\\\1', string)
+
+
 def get_network(**kwargs):
     try:
         return client().networks.find(**kwargs)
@@ -0,0 +1,108 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+from eventlet.green import time
+from oslo.config import cfg
+
+from sahara import context
+from sahara import exceptions as ex
+from sahara.openstack.common import log as logging
+from sahara.utils import general as g
+from sahara.utils import metrics
+
+
+timeouts_opts = [
+    cfg.IntOpt('await_instances_timeout',
+               default=3600,
+               help='Timeout in seconds for instances to become active '
+                    'and get IP addresses.'),
+    cfg.IntOpt('volume_available_timeout',
+               default=1800,
+               help='Timeout in seconds for Cinder volumes to become '
+                    'available.'),
+    cfg.IntOpt('heat_stack_timeout',
+               default=3600,
+               help='Timeout in seconds for Heat stack to be created or '
+                    'updated.'),
+    cfg.IntOpt('ambari_request_timeout',
+               default=3600,
+               help='Timeout in seconds for Ambari agents to register and '
+                    'for Ambari asynchronous requests to complete.'),
+    cfg.IntOpt('datanodes_startup_timeout',
+               default=3600,
+               help='Timeout in seconds for all datanodes of a cluster to '
+                    'start up.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(timeouts_opts)
+
+LOG = logging.getLogger(__name__)
+
+# predicate returns it to report that the condition is not met yet,
+# but some progress was made, e.g. part of instances became active
+PROGRESSED = object()
+
+
+def poll(predicate, operation, timeout=None, delay=1, max_delay=None,
+         backoff=1, jitter=0, cluster=None):
+    """Calls predicate until it returns True.
+
+    The delay between calls starts at 'delay' seconds and is multiplied
+    by 'backoff' after every unsuccessful call, but doesn't exceed
+    'max_delay'. It is reset to the initial value when predicate returns
+    PROGRESSED. Every sleep is randomly shortened by up to 'jitter'
+    fraction of the delay to spread polls of simultaneous waiters.
+
+    Returns True when the condition is met and False if 'cluster' was
+    deleted while waiting. Raises TimeoutException if the condition is
+    not met in 'timeout' seconds.
+    """
+    start_time = time.time()
+    current_delay = delay
+    result = 'error'
+    try:
+        while True:
+            status = predicate()
+            if status is PROGRESSED:
+                current_delay = delay
+            elif status:
+                result = 'done'
+                return True
+
+            if cluster is not None and not g.check_cluster_exists(cluster):
+                LOG.info("Stop waiting for %s since cluster %s has been "
+                         "deleted", operation, cluster.name)
+                result = 'cancelled'
+                return False
+
+            elapsed = time.time() - start_time
+            if timeout is not None and elapsed >= timeout:
+                result = 'timeout'
+                raise ex.TimeoutException(operation, timeout)
+
+            sleep_time = current_delay * random.uniform(1 - jitter, 1)
+            if timeout is not None:
+                sleep_time = min(sleep_time, timeout - elapsed)
+            context.sleep(sleep_time)
+
+            current_delay *= backoff
+            if max_delay is not None:
+                current_delay = min(current_delay, max_delay)
+    finally:
+        metrics.observe('poll.duration', time.time() - start_time,
+                        operation=operation, result=result)
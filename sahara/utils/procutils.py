@@ -13,40 +13,151 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import logging
 import os
 import pickle
+import struct
 import sys
 
+import eventlet
+from eventlet import event
 from eventlet.green import subprocess
+from eventlet import semaphore
 from eventlet import timeout as e_timeout
 
 from sahara import context
+from sahara.utils import metrics
 
 
 LOG = logging.getLogger(__name__)
 
+_FRAME_HEADER = struct.Struct('!I')
+
+
+def write_frame(stream, obj):
+    """Writes pickled object to the stream prefixed with its length."""
+    data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    stream.write(_FRAME_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def _read_exactly(stream, size):
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            raise EOFError('Stream is closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
+
+
+def read_frame(stream):
+    """Reads object written to the stream by write_frame."""
+    size, = _FRAME_HEADER.unpack(_read_exactly(stream, _FRAME_HEADER.size))
+    return pickle.loads(_read_exactly(stream, size))
+
 
 def _get_sub_executable():
     return '%s/_sahara-subprocess' % os.path.dirname(sys.argv[0])
 
 
+class Subprocess(object):
+    """Child process which serves concurrent requests.
+
+    Every request is sent in a separate frame tagged with a request id.
+    The child process runs requests in parallel and answers them in
+    any order, a reader greenthread dispatches the answers to callers
+    waiting for them.
+    """
+
+    def __init__(self, popen):
+        self.popen = popen
+        self.pid = popen.pid
+        self.stdin = popen.stdin
+        self.stdout = popen.stdout
+        self.stderr = popen.stderr
+
+        self._ids = itertools.count()
+        self._waiters = {}
+        self.terminated = False
+        # number of requests sent to the child process
+        self.requests = 0
+        self._write_lock = semaphore.Semaphore()
+        self._reader = eventlet.spawn(self._read_responses)
+
+    def poll(self):
+        return self.popen.poll()
+
+    def kill(self):
+        self.popen.kill()
+
+    def call(self, func, args=(), kwargs={}, timeout=None):
+        """Runs the function in the subprocess and returns its result.
+
+        Raises EOFError if the subprocess stops responding and eventlet
+        Timeout if there is no answer in 'timeout' seconds.
+        """
+        # there is no switch to the reader between the check and adding
+        # the waiter, so the waiter is failed by the reader if it dies
+        if self.terminated:
+            raise self._get_terminated_error()
+
+        self.requests += 1
+        request_id = next(self._ids)
+        waiter = event.Event()
+        self._waiters[request_id] = waiter
+        try:
+            with self._write_lock:
+                # the call is pickled separately, so the subprocess could
+                # report unpickling errors back to the caller
+                payload = pickle.dumps((func, args, kwargs),
+                                       pickle.HIGHEST_PROTOCOL)
+                write_frame(self.stdin, (request_id, payload))
+
+            with e_timeout.Timeout(timeout):
+                return waiter.wait()
+        finally:
+            self._waiters.pop(request_id, None)
+
+    def _read_responses(self):
+        try:
+            while True:
+                request_id, result = read_frame(self.stdout)
+                waiter = self._waiters.get(request_id)
+                # waiter could be gone because of timeout
+                if waiter is not None:
+                    waiter.send(result)
+        except Exception as e:
+            LOG.debug('Subprocess %s has stopped responding: %s'
+                      % (self.pid, e))
+        finally:
+            # the reader could be killed as well, calls can't be answered
+            # without it anyway
+            self.terminated = True
+            for waiter in list(self._waiters.values()):
+                if not waiter.ready():
+                    waiter.send_exception(self._get_terminated_error())
+
+    def _get_terminated_error(self):
+        return EOFError('Subprocess %s has terminated' % self.pid)
+
+
 def start_subprocess():
-    return subprocess.Popen((sys.executable, _get_sub_executable()),
-                            close_fds=True,
-                            stdin=subprocess.PIPE,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE)
+    with metrics.timer('subprocess.spawn'):
+        return Subprocess(subprocess.Popen((sys.executable,
+                                            _get_sub_executable()),
+                                           close_fds=True,
+                                           stdin=subprocess.PIPE,
+                                           stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE))
 
 
-def run_in_subprocess(proc, func, args=(), kwargs={}):
+def run_in_subprocess(proc, func, args=(), kwargs={}, timeout=None):
     try:
-        pickle.dump(func, proc.stdin)
-        pickle.dump(args, proc.stdin)
-        pickle.dump(kwargs, proc.stdin)
-        proc.stdin.flush()
-
-        result = pickle.load(proc.stdout)
+        result = proc.call(func, args, kwargs, timeout)
 
         if 'exception' in result:
             raise SubprocessException(result['exception'])
@@ -59,23 +170,13 @@ def run_in_subprocess(proc, func, args=(), kwargs={}):
         context.sleep(0)
 
 
-def _finish(cleanup_func):
-    cleanup_func()
-    sys.stdin.close()
-    sys.stdout.close()
-    sys.stderr.close()
-    sys.exit(0)
-
-
 def shutdown_subprocess(proc, cleanup_func):
     try:
         with e_timeout.Timeout(5):
-            # timeout would mean that our single-threaded subprocess
-            # is hung on previous task which blocks _finish to complete
-            run_in_subprocess(proc, _finish, (cleanup_func,))
+            run_in_subprocess(proc, cleanup_func)
     except BaseException:
         # exception could be caused by either timeout, or
-        # successful shutdown, ignoring anyway
+        # failed cleanup, ignoring anyway
         pass
     finally:
         kill_subprocess(proc)
@@ -93,6 +194,128 @@ def kill_subprocess(proc):
         pass
 
 
+def is_alive(proc):
+    return proc.poll() is None and not proc.terminated
+
+
+class SubprocessPool(object):
+    """Keeps warm subprocesses ready to be leased.
+
+    Forking a new interpreter and importing all the modules takes
+    a noticeable time, so the pool pre-forks 'min_size' subprocesses.
+    Every subprocess serves up to 'max_leases' leases at the same time,
+    at most 'max_size' subprocesses without leases are kept, a
+    subprocess is recycled after it has run 'max_tasks' requests and
+    crashed subprocesses are dropped. Subprocesses are pre-forked in
+    background.
+    """
+
+    def __init__(self, min_size=0, max_size=0, max_tasks=0, max_leases=1):
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.max_tasks = max_tasks
+        self.max_leases = max(1, max_leases)
+        self._leases = {}
+        self._spawning = 0
+        self._lock = semaphore.Semaphore()
+
+        self._spawn_refill()
+
+    def get(self):
+        with self._lock:
+            self._drop_crashed()
+            available = [proc for proc in self._leases
+                         if self._leases[proc] < self.max_leases and
+                         not self._is_exhausted(proc)]
+            proc = None
+            if available:
+                proc = min(available, key=lambda p: self._leases[p])
+                self._lease(proc)
+
+        if proc is None:
+            proc = start_subprocess()
+            with self._lock:
+                self._lease(proc)
+
+        self._spawn_refill()
+        return proc
+
+    def put(self, proc):
+        with self._lock:
+            if proc not in self._leases:
+                return
+
+            self._leases[proc] -= 1
+            if self._leases[proc] > 0 and is_alive(proc):
+                return
+
+            if (is_alive(proc) and not self._is_exhausted(proc) and
+                    self._count_idle() <= self.max_size):
+                return
+
+            self._remove(proc)
+
+        kill_subprocess(proc)
+        self._spawn_refill()
+
+    def close(self):
+        with self._lock:
+            procs = [proc for proc in self._leases if not self._leases[proc]]
+            for proc in procs:
+                self._remove(proc)
+
+        for proc in procs:
+            kill_subprocess(proc)
+
+    def _lease(self, proc):
+        self._leases[proc] = self._leases.get(proc, 0) + 1
+
+    def _remove(self, proc):
+        self._leases.pop(proc, None)
+
+    def _is_exhausted(self, proc):
+        # a leased subprocess keeps serving its leases, it's just not
+        # leased anymore and is recycled once they are returned
+        return self.max_tasks and proc.requests >= self.max_tasks
+
+    def _count_idle(self):
+        return len([proc for proc in self._leases if not self._leases[proc]])
+
+    def _count_spare(self):
+        return len([proc for proc in self._leases
+                    if not self._leases[proc] and
+                    not self._is_exhausted(proc)])
+
+    def _drop_crashed(self):
+        for proc in list(self._leases):
+            if not is_alive(proc):
+                LOG.warning('Pooled subprocess %s has crashed' % proc.pid)
+                self._remove(proc)
+                kill_subprocess(proc)
+
+    def _spawn_refill(self):
+        if self._count_spare() + self._spawning < self.min_size:
+            eventlet.spawn_n(self._refill)
+
+    def _refill(self):
+        while True:
+            with self._lock:
+                if self._count_spare() + self._spawning >= self.min_size:
+                    return
+                self._spawning += 1
+
+            try:
+                proc = start_subprocess()
+            except Exception:
+                LOG.exception('Failed to pre-fork subprocess')
+                return
+            finally:
+                self._spawning -= 1
+
+            with self._lock:
+                self._leases[proc] = 0
+
+
 class SubprocessException(Exception):
     def __init__(self, e):
         super(SubprocessException, self).__init__(e)
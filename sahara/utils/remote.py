@@ -15,27 +15,68 @@
 # limitations under the License.
 
 import abc
+import contextlib
 
 from oslo.config import cfg
 import six
 
+from sahara import context
+from sahara import exceptions as ex
+from sahara.openstack.common import log as logging
+
 
 # These options are for SSH remote only
 ssh_opts = [
     cfg.IntOpt('global_remote_threshold', default=100,
                help='Maximum number of remote operations that will '
-                    'be running at the same time. Note that each '
-                    'remote operation requires its own process to '
-                    'run.'),
+                    'be running at the same time.'),
     cfg.IntOpt('cluster_remote_threshold', default=70,
                help='The same as global_remote_threshold, but for '
                     'a single cluster.'),
+    cfg.DictOpt('remote_tenant_weights', default={},
+                help='Relative shares of remote operation slots given to '
+                     'tenants when the slots are contended, in form of '
+                     'tenant_id:weight pairs. Tenants which are not listed '
+                     'have weight 1.'),
+    cfg.IntOpt('remote_connection_idle_timeout', default=300,
+               help='Time in seconds an authenticated SSH connection to an '
+                    'instance is kept open after its last use so that '
+                    'subsequent remote operations could reuse it. Set to 0 '
+                    'to disable connection reuse.'),
+    cfg.IntOpt('remote_connection_pool_size', default=100,
+               help='Maximum number of idle SSH connections kept open for '
+                    'reuse.'),
+    cfg.IntOpt('subprocess_pool_min_size', default=5,
+               help='Number of pre-forked subprocesses kept ready to run '
+                    'remote operations.'),
+    cfg.IntOpt('subprocess_pool_max_size', default=20,
+               help='Maximum number of idle subprocesses kept for reuse '
+                    'after remote operations are finished.'),
+    cfg.IntOpt('subprocess_max_tasks', default=1000,
+               help='Number of remote operations a subprocess runs '
+                    'before it is replaced with a new one. Set to 0 to '
+                    'reuse subprocesses indefinitely.'),
+    cfg.IntOpt('subprocess_max_connections', default=20,
+               help='Maximum number of SSH connections served by a single '
+                    'subprocess at the same time.'),
+    cfg.IntOpt('http_session_cache_size', default=100,
+               help='Maximum number of cached HTTP sessions to instances, '
+                    'e.g. to Oozie or Ambari servers. The least recently '
+                    'used sessions are closed first.'),
+    cfg.IntOpt('http_session_idle_timeout', default=600,
+               help='Time in seconds a cached HTTP session to an instance '
+                    'is kept after its last use.'),
+    cfg.IntOpt('http_session_pool_size', default=10,
+               help='Maximum number of keep-alive connections kept by '
+                    'an HTTP session to an instance.'),
 ]
 
 
 CONF = cfg.CONF
 CONF.register_opts(ssh_opts)
 
+LOG = logging.getLogger(__name__)
+
 
 DRIVER = None
 
@@ -54,6 +95,22 @@ class RemoteDriver(object):
     def get_userdata_template(self):
         """Returns userdata template preparing instance to work with driver."""
 
+    @abc.abstractmethod
+    def close_cluster_connections(self, cluster):
+        """Closes all cached connections to the cluster instances.
+
+        Both SSH connections and HTTP sessions are closed, other cached
+        data about the cluster instances is dropped too.
+        """
+
+    @abc.abstractmethod
+    def close_idle_connections(self):
+        """Closes cached connections which are not used for a long time."""
+
+    @abc.abstractmethod
+    def get_remote_stats(self):
+        """Returns numbers of running and queued remote operations."""
+
 
 @six.add_metaclass(abc.ABCMeta)
 class Remote(object):
@@ -67,7 +124,7 @@ class Remote(object):
 
     @abc.abstractmethod
     def close_http_sessions(self):
-        """Closes all cached HTTP sessions."""
+        """Closes cached HTTP sessions to the instance."""
 
     @abc.abstractmethod
     def execute_command(self, cmd, run_as_root=False, get_stderr=False,
@@ -78,14 +135,40 @@ class Remote(object):
         """
 
     @abc.abstractmethod
-    def write_file_to(self, remote_file, data, run_as_root=False, timeout=120):
+    def execute_commands(self, cmds, run_as_root=False, get_stderr=False,
+                         stop_on_error=True, raise_when_error=True,
+                         timeout=300):
+        """Execute a batch of commands remotely in a single round trip.
+
+        Commands run one after another. If stop_on_error is set, the batch
+        is interrupted by the first failed command. Return list of exit
+        code, stdout data and stderr data for every executed command.
+        """
+
+    @abc.abstractmethod
+    def write_file_to(self, remote_file, data, run_as_root=False, timeout=120,
+                      only_changed=False):
         """Create remote file using existing ssh connection and write the given
         data to it.
+
+        See write_files_to for the description of only_changed.
         """
 
     @abc.abstractmethod
-    def write_files_to(self, files, run_as_root=False, timeout=120):
+    def write_files_to(self, files, run_as_root=False, timeout=120,
+                       only_changed=False, modes=None):
         """Copy file->data dictionary in a single ssh connection.
+
+        Several files are transferred as a single archive and unpacked
+        remotely by a single command. Written files are owned by the ssh
+        user even if run_as_root is set.
+
+        modes is an optional file->mode dictionary, files not listed there
+        are written with the default mode.
+
+        If only_changed is set, files which already have the given content
+        are not written. Files are compared by checksums computed remotely
+        by a single command.
         """
 
     @abc.abstractmethod
@@ -113,3 +196,84 @@ def get_remote(instance):
 def get_userdata_template():
     """Returns userdata template as a string."""
     return DRIVER.get_userdata_template()
+
+
+def close_cluster_connections(cluster):
+    """Closes all cached connections to the cluster instances."""
+    DRIVER.close_cluster_connections(cluster)
+
+
+def close_idle_connections():
+    """Closes cached connections which are not used for a long time."""
+    DRIVER.close_idle_connections()
+
+
+def get_remote_stats():
+    """Returns numbers of running and queued remote operations.
+
+    Operations are counted in total and by tenant and cluster.
+    """
+    return DRIVER.get_remote_stats()
+
+
+@contextlib.contextmanager
+def interactive():
+    """Marks remote operations started inside the block as interactive.
+
+    Interactive operations, e.g. job submission, are short and somebody
+    waits for their results, so they are run before queued bulk
+    operations like cluster provisioning.
+    """
+    ctx = context.current()
+    previous = ctx.remote_interactive
+    ctx.remote_interactive = True
+    try:
+        yield
+    finally:
+        ctx.remote_interactive = previous
+
+
+def _broadcast_to_instance(instance, cmds, files, run_as_root,
+                           raise_when_error, results, failures):
+    try:
+        with get_remote(instance) as r:
+            if files:
+                r.write_files_to(files, run_as_root=run_as_root)
+            if cmds:
+                results[instance.instance_name] = r.execute_commands(
+                    cmds, run_as_root=run_as_root,
+                    raise_when_error=raise_when_error)
+    except Exception as e:
+        LOG.warn("Broadcast to instance %s failed: %s",
+                 instance.instance_name, e)
+        failures[instance.instance_name] = e
+
+
+def broadcast(instances, cmds=None, files=None, run_as_root=False,
+              max_parallel=None, raise_when_error=True):
+    """Runs the same commands and writes the same files on many instances.
+
+    Instances are processed in parallel, at most max_parallel at a time.
+    Files are written first, then commands are executed as a batch, see
+    Remote.execute_commands. Concurrency is additionally limited by the
+    remote operations thresholds.
+
+    Returns dict of instance name -> list of commands results. If some
+    instances fail, RemoteBroadcastException with all failures is raised
+    after the rest instances are processed.
+    """
+    if not instances:
+        return {}
+
+    results = {}
+    failures = {}
+    with context.ThreadGroup(max_parallel or len(instances)) as tg:
+        for instance in instances:
+            tg.spawn('broadcast-to-%s' % instance.instance_name,
+                     _broadcast_to_instance, instance, cmds, files,
+                     run_as_root, raise_when_error, results, failures)
+
+    if failures:
+        raise ex.RemoteBroadcastException(failures)
+
+    return results
@@ -0,0 +1,161 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import itertools
+
+from eventlet import event
+
+from sahara.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class _Waiter(object):
+    def __init__(self, seq, tenant_id, cluster_id, interactive):
+        self.seq = seq
+        self.tenant_id = tenant_id
+        self.cluster_id = cluster_id
+        self.interactive = interactive
+        self.granted = False
+        self.event = event.Event()
+
+
+class FairScheduler(object):
+    """Shares a limited number of slots between tenants and clusters.
+
+    At most 'capacity' slots are given out at the same time and at most
+    'cluster_capacity' of them to a single cluster. Waiting requests are
+    served in weighted fair queuing order: a tenant gets slots in
+    proportion to its weight no matter how many requests it has queued,
+    and clusters of the same tenant share its slots the same way.
+    Interactive requests are served before bulk ones.
+    """
+
+    def __init__(self, capacity, cluster_capacity, weights=None):
+        self.capacity = capacity
+        self.cluster_capacity = cluster_capacity
+        self.weights = weights or {}
+
+        self._seq = itertools.count()
+        self._queue = []
+        self._running = 0
+        self._running_by_tenant = collections.defaultdict(int)
+        self._running_by_cluster = collections.defaultdict(int)
+        # virtual time when the tenant (cluster) is served next,
+        # the tenant with the lowest one is the first in line
+        self._clock = 0.0
+        self._tenant_vtime = {}
+        self._cluster_vtime = {}
+
+    def acquire(self, tenant_id, cluster_id, interactive=False):
+        waiter = _Waiter(next(self._seq), tenant_id, cluster_id, interactive)
+        self._queue.append(waiter)
+        self._dispatch()
+
+        if waiter.granted:
+            return
+
+        LOG.debug('Waiting for remote slot: tenant %s, cluster %s, '
+                  '%s requests queued', tenant_id, cluster_id,
+                  len(self._queue))
+        try:
+            waiter.event.wait()
+        except BaseException:
+            # e.g. the waiting thread was killed
+            if waiter.granted:
+                self.release(tenant_id, cluster_id)
+            else:
+                self._queue.remove(waiter)
+            raise
+
+    def release(self, tenant_id, cluster_id):
+        self._running -= 1
+        self._decrement(self._running_by_tenant, tenant_id)
+        self._decrement(self._running_by_cluster, cluster_id)
+        self._forget_idle(tenant_id, cluster_id)
+        self._dispatch()
+
+    def stats(self):
+        queued_by_tenant = collections.defaultdict(int)
+        queued_by_cluster = collections.defaultdict(int)
+        for waiter in self._queue:
+            queued_by_tenant[waiter.tenant_id] += 1
+            queued_by_cluster[waiter.cluster_id] += 1
+
+        return {
+            'running': self._running,
+            'queued': len(self._queue),
+            'running_by_tenant': dict(self._running_by_tenant),
+            'running_by_cluster': dict(self._running_by_cluster),
+            'queued_by_tenant': dict(queued_by_tenant),
+            'queued_by_cluster': dict(queued_by_cluster)
+        }
+
+    def _dispatch(self):
+        while self._running < self.capacity:
+            waiter = self._pick()
+            if waiter is None:
+                return
+
+            self._queue.remove(waiter)
+            self._grant(waiter)
+            waiter.event.send()
+
+    def _pick(self):
+        eligible = [w for w in self._queue
+                    if self._running_by_cluster.get(w.cluster_id, 0) <
+                    self.cluster_capacity]
+        if not eligible:
+            return None
+
+        return min(eligible, key=lambda w: (
+            not w.interactive,
+            self._vtime(self._tenant_vtime, w.tenant_id),
+            self._vtime(self._cluster_vtime, w.cluster_id),
+            w.seq))
+
+    def _grant(self, waiter):
+        waiter.granted = True
+        self._running += 1
+        self._running_by_tenant[waiter.tenant_id] += 1
+        self._running_by_cluster[waiter.cluster_id] += 1
+
+        start = self._vtime(self._tenant_vtime, waiter.tenant_id)
+        step = 1.0 / float(self.weights.get(waiter.tenant_id, 1))
+        self._clock = max(self._clock, start)
+        self._tenant_vtime[waiter.tenant_id] = start + step
+        self._cluster_vtime[waiter.cluster_id] = self._vtime(
+            self._cluster_vtime, waiter.cluster_id) + step
+
+    def _vtime(self, vtimes, key):
+        # newcomers and tenants which were idle for a while should not
+        # get all the slots to catch up with the rest
+        return max(vtimes.get(key, 0.0), self._clock)
+
+    def _decrement(self, counters, key):
+        counters[key] -= 1
+        if counters[key] <= 0:
+            del counters[key]
+
+    def _forget_idle(self, tenant_id, cluster_id):
+        if (tenant_id not in self._running_by_tenant and
+                not any(w.tenant_id == tenant_id for w in self._queue)):
+            self._tenant_vtime.pop(tenant_id, None)
+
+        if (cluster_id not in self._running_by_cluster and
+                not any(w.cluster_id == cluster_id for w in self._queue)):
+            self._cluster_vtime.pop(cluster_id, None)
@@ -29,9 +29,26 @@ Note that the module offloads the ssh calls to a child process.
 It was implemented that way because we found no way to run paramiko
 and eventlet together. The private high-level module methods are
 implementations which are run in a separate process.
+
+Child processes are leased from a pool of pre-forked subprocesses,
+each of them could hold many SSH connections and serve requests to
+them concurrently. Authenticated SSH connections are cached in a pool
+and reused by subsequent remote operations on the same instance until
+they stay idle for 'remote_connection_idle_timeout' seconds or the
+cluster is terminated.
+
+When instances are accessed through network namespaces, connections go
+through a long-lived proxy process started once per router namespace
+(see sahara.utils.openstack.neutron).
 """
 
+import collections
+import hashlib
+import itertools
 import logging
+import select
+import tarfile
+import threading
 import time
 import uuid
 
@@ -47,66 +64,113 @@ from sahara import exceptions as ex
 from sahara.openstack.common import excutils
 from sahara.utils import crypto
 from sahara.utils import hashabledict as h
+from sahara.utils import metrics
 from sahara.utils.openstack import base
 from sahara.utils.openstack import neutron
 from sahara.utils import procutils
 from sahara.utils import remote
+from sahara.utils import scheduler
 
 
 LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
 
 
-_ssh = None
-_sessions = {}
+# SSH client used by the current thread
+_local = threading.local()
+# SSH clients opened in the subprocess, keyed by connection id
+_connections = {}
 
 
 INFRA = None
 
 
-_global_remote_semaphore = None
+_remote_scheduler = None
+_subprocess_pool = None
 
 
 def _get_proxy(neutron_info):
-    client = neutron.NeutronClientRemoteWrapper(neutron_info['network'],
-                                                neutron_info['uri'],
-                                                neutron_info['token'],
-                                                neutron_info['tenant'])
-    qrouter = client.get_router()
-    proxy = paramiko.ProxyCommand('ip netns exec qrouter-{0} nc {1} 22'
-                                  .format(qrouter, neutron_info['host']))
-
-    return proxy
+    return neutron.connect_through_proxy(neutron_info['proxy'],
+                                         neutron_info['host'], 22)
 
 
 def _connect(host, username, private_key, neutron_info=None):
-    global _ssh
-
     LOG.debug('Creating SSH connection')
     proxy = None
     if type(private_key) in [str, unicode]:
         private_key = crypto.to_paramiko_private_key(private_key)
-    _ssh = paramiko.SSHClient()
-    _ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    _local.ssh = paramiko.SSHClient()
+    _local.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     if neutron_info:
         LOG.debug('creating proxy using info: {0}'.format(neutron_info))
         proxy = _get_proxy(neutron_info)
-    _ssh.connect(host, username=username, pkey=private_key, sock=proxy)
+    _local.ssh.connect(host, username=username, pkey=private_key, sock=proxy)
 
 
 def _cleanup():
-    global _ssh
-    _ssh.close()
+    _local.ssh.close()
+
+
+def _open_connection(conn_id, *conn_params):
+    _connect(*conn_params)
+    _connections[conn_id] = _local.ssh
+
+
+def _close_connection(conn_id):
+    ssh = _connections.pop(conn_id, None)
+    if ssh:
+        ssh.close()
+
+
+def _run_on_connection(conn_id, func, args, kwargs):
+    # the subprocess runs calls in parallel threads, each of them
+    # should work with SSH client of its own connection
+    _local.ssh = _connections[conn_id]
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _local.ssh = None
+
+
+def _check_connection():
+    transport = _local.ssh.get_transport()
+    return transport is not None and transport.is_active()
 
 
-def _read_paramimko_stream(recv_func):
-    result = ''
-    buf = recv_func(1024)
-    while buf != '':
-        result += buf
-        buf = recv_func(1024)
+_READ_CHUNK_SIZE = 32768
 
-    return result
+
+def _read_paramiko_streams(chan):
+    """Drains stdout and stderr of the channel at the same time.
+
+    Reading streams one by one could hang if the command fills the
+    buffer of the other stream.
+    """
+    stdout = []
+    stderr = []
+
+    while True:
+        select.select([chan], [], [], 1)
+
+        while chan.recv_ready():
+            stdout.append(chan.recv(_READ_CHUNK_SIZE))
+
+        while chan.recv_stderr_ready():
+            stderr.append(chan.recv_stderr(_READ_CHUNK_SIZE))
+
+        if (chan.exit_status_ready() and not chan.recv_ready() and
+                not chan.recv_stderr_ready()):
+            break
+
+    # read data which could arrive along with the exit status
+    for recv_func, result in ((chan.recv, stdout),
+                              (chan.recv_stderr, stderr)):
+        data = recv_func(_READ_CHUNK_SIZE)
+        while data:
+            result.append(data)
+            data = recv_func(_READ_CHUNK_SIZE)
+
+    return ''.join(stdout), ''.join(stderr)
 
 
 def _escape_quotes(command):
@@ -117,17 +181,13 @@ def _escape_quotes(command):
 
 def _execute_command(cmd, run_as_root=False, get_stderr=False,
                      raise_when_error=True):
-    global _ssh
-
-    chan = _ssh.get_transport().open_session()
+    chan = _local.ssh.get_transport().open_session()
     if run_as_root:
         chan.exec_command('sudo bash -c "%s"' % _escape_quotes(cmd))
     else:
         chan.exec_command(cmd)
 
-    # todo(dmitryme): that could hang if stderr buffer overflows
-    stdout = _read_paramimko_stream(chan.recv)
-    stderr = _read_paramimko_stream(chan.recv_stderr)
+    stdout, stderr = _read_paramiko_streams(chan)
 
     ret_code = chan.recv_exit_status()
 
@@ -141,13 +201,141 @@ def _execute_command(cmd, run_as_root=False, get_stderr=False,
         return ret_code, stdout
 
 
-def _get_http_client(host, port, neutron_info, *args, **kwargs):
-    global _sessions
+def _make_batch_script(cmds, marker, run_as_root, stop_on_error):
+    script = []
+    for idx, cmd in enumerate(cmds):
+        begin = '%s-begin-%d' % (marker, idx)
+        end = '%s-end-%d' % (marker, idx)
+        # every command runs in a subshell, just like it would run in
+        # a separate session; output is delimited by unique markers
+        script.append("echo '%s'; echo '%s' >&2" % (begin, begin))
+        if run_as_root:
+            script.append('sudo bash -c "%s"' % _escape_quotes(cmd))
+        else:
+            script.append('(\n%s\n)' % cmd)
+        script.append("rc=$?; printf '\\n%s %%d\\n' $rc; "
+                      "printf '\\n%s\\n' >&2" % (end, end))
+        if stop_on_error:
+            script.append('[ $rc -eq 0 ] || exit $rc')
+
+    return '\n'.join(script)
+
+
+def _split_batch_output(output, marker, idx):
+    begin = '%s-begin-%d\n' % (marker, idx)
+    end = '\n%s-end-%d' % (marker, idx)
+
+    start = output.find(begin)
+    finish = output.find(end, start)
+    if start < 0 or finish < 0:
+        return None, None
+
+    tail = output[finish + len(end):].split('\n', 1)[0].strip()
+    ret_code = int(tail) if tail else None
+    return ret_code, output[start + len(begin):finish]
+
+
+def _execute_commands(cmds, run_as_root=False, get_stderr=False,
+                      stop_on_error=True, raise_when_error=True):
+    marker = 'sahara-%s' % uuid.uuid4().hex
+    script = _make_batch_script(cmds, marker, run_as_root, stop_on_error)
+    ret_code, stdout, stderr = _execute_command(script, get_stderr=True,
+                                                raise_when_error=False)
+
+    results = []
+    for idx, cmd in enumerate(cmds):
+        cmd_code, cmd_stdout = _split_batch_output(stdout, marker, idx)
+        if cmd_code is None:
+            # command was not started because of previous failure
+            break
+
+        cmd_stderr = _split_batch_output(stderr, marker, idx)[1] or ''
+        if cmd_code and raise_when_error:
+            raise ex.RemoteCommandException(cmd=cmd, ret_code=cmd_code,
+                                            stdout=cmd_stdout,
+                                            stderr=cmd_stderr)
+
+        if get_stderr:
+            results.append((cmd_code, cmd_stdout, cmd_stderr))
+        else:
+            results.append((cmd_code, cmd_stdout))
+
+    return results
+
+
+def _get_netns_proxy(neutron_info):
+    client = neutron.NeutronClientRemoteWrapper(neutron_info['network'],
+                                                neutron_info['uri'],
+                                                neutron_info['token'],
+                                                neutron_info['tenant'])
+    try:
+        return neutron.get_netns_proxy(client.get_router())
+    except ex.SystemError:
+        # the router could be replaced, e.g. its namespace is gone
+        neutron.invalidate_router(neutron_info['network'])
+        raise
+
+
+class _SessionCache(object):
+    """LRU cache of HTTP sessions to instances.
+
+    Sessions are keyed by (cluster id, host, port). At most
+    'http_session_cache_size' sessions are kept, the least recently used
+    ones are closed first. Sessions idle for 'http_session_idle_timeout'
+    seconds are closed as well as all sessions of a terminated cluster.
+    """
+
+    def __init__(self):
+        # key -> (session, last used time), the least recently used first
+        self._sessions = collections.OrderedDict()
+
+    def get(self, key):
+        entry = self._sessions.pop(key, None)
+        if entry is None:
+            return None
+
+        self._sessions[key] = (entry[0], time.time())
+        return entry[0]
+
+    def put(self, key, session):
+        self._sessions[key] = (session, time.time())
+
+        extra = len(self._sessions) - CONF.http_session_cache_size
+        self._close_all(list(self._sessions)[:max(extra, 0)])
+
+    def close_idle(self):
+        deadline = time.time() - CONF.http_session_idle_timeout
+        self._close_all([key for key, (session, last_used)
+                         in six.iteritems(self._sessions)
+                         if last_used < deadline])
+
+    def close_cluster(self, cluster_id):
+        self._close_all([key for key in self._sessions
+                         if key[0] == cluster_id])
+
+    def close_host(self, host):
+        self._close_all([key for key in self._sessions if key[1] == host])
+
+    def _close_all(self, keys):
+        for key in keys:
+            session, last_used = self._sessions.pop(key)
+            LOG.debug('Closing HTTP session to {0}:{1}'.format(*key[1:]))
+            session.close()
+            neutron.forget_http_adapter(*key[1:])
+
 
-    _http_session = _sessions.get((host, port), None)
+_session_cache = _SessionCache()
+
+
+def _get_http_client(cluster_id, host, port, neutron_info, *args, **kwargs):
+    _http_session = _session_cache.get((cluster_id, host, port))
     LOG.debug('cached HTTP session for {0}:{1} is {2}'.format(host, port,
                                                               _http_session))
     if not _http_session:
+        # a session is used for a single host, e.g. Oozie or Ambari server
+        kwargs.setdefault('pool_connections', 1)
+        kwargs.setdefault('pool_maxsize', CONF.http_session_pool_size)
+
         if neutron_info:
             neutron_client = neutron.NeutronClientRemoteWrapper(
                 neutron_info['network'], neutron_info['uri'],
@@ -174,7 +362,7 @@ def _get_http_client(host, port, neutron_info, *args, **kwargs):
 
         LOG.debug('caching session {0} for {1}:{2}'
                   .format(_http_session, host, port))
-        _sessions[(host, port)] = _http_session
+        _session_cache.put((cluster_id, host, port), _http_session)
 
     return _http_session
 
@@ -185,29 +373,104 @@ def _write_fl(sftp, remote_file, data):
     fl.close()
 
 
-def _write_file(sftp, remote_file, data, run_as_root):
+def _write_file(sftp, remote_file, data, run_as_root, mode=None):
     if run_as_root:
         temp_file = 'temp-file-%s' % six.text_type(uuid.uuid4())
         _write_fl(sftp, temp_file, data)
+        if mode is not None:
+            sftp.chmod(temp_file, mode)
         _execute_command(
             'mv %s %s' % (temp_file, remote_file), run_as_root=True)
     else:
         _write_fl(sftp, remote_file, data)
+        if mode is not None:
+            sftp.chmod(remote_file, mode)
 
 
 def _write_file_to(remote_file, data, run_as_root=False):
-    global _ssh
+    _write_file(_local.ssh.open_sftp(), remote_file, data, run_as_root)
+
+
+def _make_archive(files, modes=None):
+    modes = modes or {}
+    archive = six.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+        for remote_file, data in six.iteritems(files):
+            if isinstance(data, six.text_type):
+                data = data.encode('utf-8')
+            info = tarfile.TarInfo(remote_file)
+            info.size = len(data)
+            info.mode = modes.get(remote_file, 0o644)
+            info.mtime = time.time()
+            tar.addfile(info, six.BytesIO(data))
+
+    return archive.getvalue()
+
+
+def _write_files_to(files, run_as_root=False, modes=None):
+    modes = modes or {}
+    sftp = _local.ssh.open_sftp()
+
+    if len(files) < 2:
+        for fl, data in six.iteritems(files):
+            _write_file(sftp, fl, data, run_as_root, modes.get(fl))
+        return
+
+    # all files are packed into a single archive which is extracted
+    # remotely, that saves a round trip per file
+    archive = 'temp-archive-%s.tar.gz' % six.text_type(uuid.uuid4())
+    _write_fl(sftp, archive, _make_archive(files, modes))
+
+    cmd = 'tar -xzvpPf %s --no-same-owner' % archive
+    if run_as_root:
+        # files written one by one are moved in place by root and keep the
+        # ssh user as the owner, extracted files have to be handed over
+        owner = sftp.stat(archive)
+        cmd += ' && chown %s:%s %s' % (owner.st_uid, owner.st_gid,
+                                       ' '.join(files))
+    try:
+        ret_code, stdout, stderr = _execute_command(
+            cmd, run_as_root=run_as_root, get_stderr=True,
+            raise_when_error=False)
+    finally:
+        _execute_command('rm -f %s' % archive, raise_when_error=False)
+
+    if ret_code:
+        written = set(stdout.splitlines())
+        failed = [fl for fl in files if fl not in written]
+        LOG.error('Failed to write files %s' % failed)
+        raise ex.RemoteCommandException(cmd=cmd, ret_code=ret_code,
+                                        stdout=stdout, stderr=stderr)
 
-    _write_file(_ssh.open_sftp(), remote_file, data, run_as_root)
 
+def _get_hash(data):
+    if isinstance(data, six.text_type):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
 
-def _write_files_to(files, run_as_root=False):
-    global _ssh
 
-    sftp = _ssh.open_sftp()
+def _get_remote_hashes(remote_files, run_as_root):
+    # missing files are just not listed in the output
+    ret_code, stdout = _execute_command(
+        'sha256sum %s 2>/dev/null' % ' '.join(remote_files),
+        run_as_root=run_as_root, raise_when_error=False)
 
-    for fl, data in files.iteritems():
-        _write_file(sftp, fl, data, run_as_root)
+    hashes = {}
+    for line in stdout.splitlines():
+        file_hash, _, remote_file = line.partition('  ')
+        if remote_file:
+            hashes[remote_file] = file_hash
+    return hashes
+
+
+def _write_changed_files_to(files, run_as_root=False, modes=None):
+    hashes = _get_remote_hashes(list(files), run_as_root)
+    changed = dict((remote_file, data)
+                   for remote_file, data in six.iteritems(files)
+                   if hashes.get(remote_file) != _get_hash(data))
+    if changed:
+        _write_files_to(changed, run_as_root, modes)
+    return list(changed)
 
 
 def _read_file(sftp, remote_file):
@@ -218,15 +481,13 @@ def _read_file(sftp, remote_file):
 
 
 def _read_file_from(remote_file, run_as_root=False):
-    global _ssh
-
     fl = remote_file
     if run_as_root:
         fl = 'temp-file-%s' % (six.text_type(uuid.uuid4()))
         _execute_command('cp %s %s' % (remote_file, fl), run_as_root=True)
 
     try:
-        return _read_file(_ssh.open_sftp(), fl)
+        return _read_file(_local.ssh.open_sftp(), fl)
     except IOError:
         LOG.error('Can\'t read file "%s"' % remote_file)
         raise
@@ -244,11 +505,9 @@ def _replace_remote_string(remote_file, old_str, new_str):
 
 
 def _execute_on_vm_interactive(cmd, matcher):
-    global _ssh
-
     buf = ''
 
-    channel = _ssh.invoke_shell()
+    channel = _local.ssh.invoke_shell()
     LOG.debug('channel is {0}'.format(channel))
     try:
         LOG.debug('sending cmd {0}'.format(cmd))
@@ -264,14 +523,167 @@ def _execute_on_vm_interactive(cmd, matcher):
         channel.close()
 
 
-def _acquire_remote_semaphore():
-    context.current().remote_semaphore.acquire()
-    _global_remote_semaphore.acquire()
+def _acquire_remote_slot(cluster_id):
+    ctx = context.current()
+    with metrics.timer('remote.slot_wait'):
+        _remote_scheduler.acquire(ctx.tenant_id, cluster_id,
+                                  ctx.remote_interactive)
+
+
+def _release_remote_slot(cluster_id):
+    _remote_scheduler.release(context.current().tenant_id, cluster_id)
+
+
+_METRICS_SKIP_MODULES = frozenset([__name__, remote.__name__, 'contextlib'])
+
+
+def _get_call_site():
+    return metrics.get_call_site(_METRICS_SKIP_MODULES)
+
+
+def _count_bytes(name, operation, size):
+    metrics.increment(name, size, operation=operation,
+                      call_site=_get_call_site())
+
+
+# seconds to wait for a check of an idle connection to answer
+_CHECK_TIMEOUT = 10
+
+
+class _Connection(object):
+    """SSH connection opened in a child process.
+
+    A single child process could hold connections to many instances
+    and serve requests to them in parallel.
+    """
+
+    _ids = itertools.count()
+
+    def __init__(self, key, cluster_id, conn_params):
+        self.key = key
+        self.cluster_id = cluster_id
+        self.last_used = time.time()
+        self.id = next(self._ids)
+        self.proc = _subprocess_pool.get()
+        try:
+            procutils.run_in_subprocess(self.proc, _open_connection,
+                                        (self.id,) + tuple(conn_params))
+        except BaseException:
+            with excutils.save_and_reraise_exception():
+                self.close()
+
+    def run(self, func, args=(), kwargs={}, timeout=None):
+        return procutils.run_in_subprocess(self.proc, _run_on_connection,
+                                           (self.id, func, args, kwargs),
+                                           timeout=timeout)
+
+    def is_alive(self):
+        if not procutils.is_alive(self.proc):
+            return False
+
+        try:
+            return self.run(_check_connection, timeout=_CHECK_TIMEOUT)
+        except (Exception, e_timeout.Timeout):
+            return False
+
+    def close(self):
+        try:
+            with e_timeout.Timeout(5):
+                procutils.run_in_subprocess(self.proc, _close_connection,
+                                            (self.id,))
+        except BaseException:
+            LOG.debug('Failed to close SSH connection to %s' % self.key[0])
+        finally:
+            _subprocess_pool.put(self.proc)
+
+
+class _ConnectionPool(object):
+    """Keeps idle SSH connections for reuse.
+
+    Connections are keyed by (management ip, username, key fingerprint,
+    neutron proxy) and are closed once they are idle for longer than
+    'remote_connection_idle_timeout' seconds.
+    """
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = semaphore.Semaphore()
+
+    def get(self, key, cluster_id, conn_params):
+        self.close_idle()
+
+        while True:
+            with self._lock:
+                conns = self._idle.get(key)
+                conn = conns.pop() if conns else None
+                if conns is not None and not conns:
+                    del self._idle[key]
 
+            if conn is None:
+                return _Connection(key, cluster_id, conn_params)
 
-def _release_remote_semaphore():
-    _global_remote_semaphore.release()
-    context.current().remote_semaphore.release()
+            if conn.is_alive():
+                LOG.debug('Reusing SSH connection to %s' % key[0])
+                return conn
+
+            LOG.debug('Cached SSH connection to %s is broken' % key[0])
+            conn.close()
+
+    def put(self, conn, reusable=True):
+        if not reusable or CONF.remote_connection_idle_timeout <= 0:
+            conn.close()
+            return
+
+        conn.last_used = time.time()
+        with self._lock:
+            self._idle.setdefault(conn.key, []).append(conn)
+            extra = self._pop_oldest(self._count_idle() -
+                                     CONF.remote_connection_pool_size)
+
+        self._close_all(extra)
+
+    def close_idle(self):
+        deadline = time.time() - CONF.remote_connection_idle_timeout
+        self._close_all(self._pop(lambda conn: conn.last_used < deadline))
+
+    def close_cluster(self, cluster_id):
+        self._close_all(self._pop(lambda conn: conn.cluster_id == cluster_id))
+
+    def _count_idle(self):
+        return sum(len(conns) for conns in six.itervalues(self._idle))
+
+    def _pop_oldest(self, count):
+        if count <= 0:
+            return []
+
+        conns = sorted((conn for conns in six.itervalues(self._idle)
+                        for conn in conns), key=lambda conn: conn.last_used)
+        oldest = set(conns[:count])
+        self._remove(lambda conn: conn in oldest)
+        return list(oldest)
+
+    def _pop(self, predicate):
+        with self._lock:
+            return self._remove(predicate)
+
+    def _remove(self, predicate):
+        removed = []
+        for key in list(self._idle):
+            conns = self._idle[key]
+            removed += [conn for conn in conns if predicate(conn)]
+            conns[:] = [conn for conn in conns if not predicate(conn)]
+            if not conns:
+                del self._idle[key]
+
+        return removed
+
+    def _close_all(self, conns):
+        for conn in conns:
+            LOG.debug('Closing idle SSH connection to %s' % conn.key[0])
+            conn.close()
+
+
+_connection_pool = _ConnectionPool()
 
 
 class InstanceInteropHelper(remote.Remote):
@@ -279,26 +691,27 @@ class InstanceInteropHelper(remote.Remote):
         self.instance = instance
 
     def __enter__(self):
-        _acquire_remote_semaphore()
+        _acquire_remote_slot(self.instance.node_group.cluster.id)
         try:
             self.bulk = BulkInstanceInteropHelper(self.instance)
             return self.bulk
         except Exception:
             with excutils.save_and_reraise_exception():
-                _release_remote_semaphore()
+                _release_remote_slot(self.instance.node_group.cluster.id)
 
     def __exit__(self, *exc_info):
         try:
             self.bulk.close()
         finally:
-            _release_remote_semaphore()
+            _release_remote_slot(self.instance.node_group.cluster.id)
 
     def get_neutron_info(self):
         neutron_info = h.HashableDict()
         neutron_info['network'] = \
             self.instance.node_group.cluster.neutron_management_network
         ctx = context.current()
-        neutron_info['uri'] = base.url_for(ctx.service_catalog, 'network')
+        neutron_info['uri'] = base.url_for(ctx.service_catalog_index,
+                                           'network')
         neutron_info['token'] = ctx.token
         neutron_info['tenant'] = ctx.tenant_name
         neutron_info['host'] = self.instance.management_ip
@@ -310,38 +723,65 @@ class InstanceInteropHelper(remote.Remote):
         info = None
         if CONF.use_namespaces and not CONF.use_floating_ips:
             info = self.get_neutron_info()
+            # the proxy process is owned by this process, SSH connections
+            # opened in subprocesses just connect to its socket
+            info['proxy'] = _get_netns_proxy(info)
         return (self.instance.management_ip,
                 self.instance.node_group.image_username,
                 self.instance.node_group.cluster.management_private_key, info)
 
-    def _run(self, func, *args, **kwargs):
-        proc = procutils.start_subprocess()
+    def _get_conn_key(self, conn_params):
+        host, username, private_key, info = conn_params
+        fingerprint = hashlib.sha1(private_key).hexdigest()
+        proxy = (info['network'], info['host']) if info else None
+        return host, username, fingerprint, proxy
+
+    def _get_connection(self):
+        conn_params = self._get_conn_params()
+        return _connection_pool.get(self._get_conn_key(conn_params),
+                                    self.instance.node_group.cluster.id,
+                                    conn_params)
 
+    def _run(self, func, *args, **kwargs):
+        conn = self._get_connection()
+        reusable = False
         try:
-            procutils.run_in_subprocess(proc, _connect,
-                                        self._get_conn_params())
-            return procutils.run_in_subprocess(proc, func, args, kwargs)
-        except Exception:
-            with excutils.save_and_reraise_exception():
-                procutils.shutdown_subprocess(proc, _cleanup)
+            result = conn.run(func, args, kwargs)
+            reusable = True
+            return result
+        except procutils.SubprocessException:
+            # the remote call itself failed, but the connection
+            # is still usable
+            reusable = True
+            raise
         finally:
-            procutils.shutdown_subprocess(proc, _cleanup)
+            _connection_pool.put(conn, reusable)
 
     def _run_with_log(self, func, timeout, *args, **kwargs):
+        operation = func.__name__.lstrip('_')
+        call_site = _get_call_site()
         start_time = time.time()
         try:
             with e_timeout.Timeout(timeout):
                 return self._run(func, *args, **kwargs)
+        except BaseException:
+            metrics.increment('remote.errors', operation=operation,
+                              call_site=call_site)
+            raise
         finally:
+            duration = time.time() - start_time
+            metrics.observe('remote.latency', duration, operation=operation,
+                            call_site=call_site)
             self._log_command('%s took %.1f seconds to complete' % (
-                func.__name__, time.time() - start_time))
+                func.__name__, duration))
 
     def _run_s(self, func, timeout, *args, **kwargs):
-        _acquire_remote_semaphore()
+        cluster_id = self.instance.node_group.cluster.id
+        _acquire_remote_slot(cluster_id)
         try:
             return self._run_with_log(func, timeout, *args, **kwargs)
         finally:
-            _release_remote_semaphore()
+            _release_remote_slot(cluster_id)
 
     def get_http_client(self, port, info=None, *args, **kwargs):
         self._log_command('Retrieving http session for {0}:{1}'
@@ -350,33 +790,68 @@ class InstanceInteropHelper(remote.Remote):
             # need neutron info
             if not info:
                 info = self.get_neutron_info()
-        return _get_http_client(self.instance.management_ip, port, info,
+        return _get_http_client(self.instance.node_group.cluster.id,
+                                self.instance.management_ip, port, info,
                                 *args, **kwargs)
 
     def close_http_sessions(self):
-        global _sessions
-
         LOG.debug('closing host related http sessions')
-        for session in _sessions.values():
-            session.close()
+        _session_cache.close_host(self.instance.management_ip)
 
     def execute_command(self, cmd, run_as_root=False, get_stderr=False,
                         raise_when_error=True, timeout=300):
         self._log_command('Executing "%s"' % cmd)
-        return self._run_s(_execute_command, timeout, cmd, run_as_root,
-                           get_stderr, raise_when_error)
+        result = self._run_s(_execute_command, timeout, cmd, run_as_root,
+                             get_stderr, raise_when_error)
+        _count_bytes('remote.bytes_received', 'execute_command',
+                     sum(len(out) for out in result[1:]))
+        return result
+
+    def execute_commands(self, cmds, run_as_root=False, get_stderr=False,
+                         stop_on_error=True, raise_when_error=True,
+                         timeout=300):
+        self._log_command('Executing batch "%s"' % '; '.join(cmds))
+        return self._run_s(_execute_commands, timeout, cmds, run_as_root,
+                           get_stderr, stop_on_error, raise_when_error)
+
+    def write_file_to(self, remote_file, data, run_as_root=False, timeout=120,
+                      only_changed=False):
+        if only_changed:
+            self.write_files_to({remote_file: data}, run_as_root, timeout,
+                                only_changed=True)
+            return
 
-    def write_file_to(self, remote_file, data, run_as_root=False, timeout=120):
         self._log_command('Writing file "%s"' % remote_file)
         self._run_s(_write_file_to, timeout, remote_file, data, run_as_root)
+        _count_bytes('remote.bytes_sent', 'write_file_to', len(data))
+
+    def write_files_to(self, files, run_as_root=False, timeout=120,
+                       only_changed=False, modes=None):
+        if only_changed:
+            self._write_changed_files_to(files, run_as_root, timeout, modes)
+            return
 
-    def write_files_to(self, files, run_as_root=False, timeout=120):
         self._log_command('Writing files "%s"' % files.keys())
-        self._run_s(_write_files_to, timeout, files, run_as_root)
+        self._run_s(_write_files_to, timeout, files, run_as_root, modes)
+        _count_bytes('remote.bytes_sent', 'write_files_to',
+                     sum(len(data) for data in six.itervalues(files)))
+
+    def _write_changed_files_to(self, files, run_as_root, timeout, modes):
+        # hashes of all the files are checked on the instance by a single
+        # command, files could be changed there by anyone
+        self._log_command('Writing files "%s" if changed' % files.keys())
+        written = self._run_s(_write_changed_files_to, timeout, files,
+                              run_as_root, modes)
+
+        self._log_command('Written changed files "%s"' % written)
+        _count_bytes('remote.bytes_sent', 'write_files_to',
+                     sum(len(files[remote_file]) for remote_file in written))
 
     def read_file_from(self, remote_file, run_as_root=False, timeout=120):
         self._log_command('Reading file "%s"' % remote_file)
-        return self._run_s(_read_file_from, timeout, remote_file, run_as_root)
+        data = self._run_s(_read_file_from, timeout, remote_file, run_as_root)
+        _count_bytes('remote.bytes_received', 'read_file_from', len(data))
+        return data
 
     def replace_remote_string(self, remote_file, old_str, new_str,
                               timeout=120):
@@ -410,19 +885,22 @@ class InstanceInteropHelper(remote.Remote):
 class BulkInstanceInteropHelper(InstanceInteropHelper):
     def __init__(self, instance):
         super(BulkInstanceInteropHelper, self).__init__(instance)
-        self.proc = procutils.start_subprocess()
-        try:
-            procutils.run_in_subprocess(self.proc, _connect,
-                                        self._get_conn_params())
-        except Exception:
-            with excutils.save_and_reraise_exception():
-                procutils.shutdown_subprocess(self.proc, _cleanup)
+        self.conn = self._get_connection()
+        self.reusable = True
 
     def close(self):
-        procutils.shutdown_subprocess(self.proc, _cleanup)
+        _connection_pool.put(self.conn, self.reusable)
 
     def _run(self, func, *args, **kwargs):
-        return procutils.run_in_subprocess(self.proc, func, args, kwargs)
+        try:
+            return self.conn.run(func, args, kwargs)
+        except procutils.SubprocessException:
+            raise
+        except BaseException:
+            # e.g. on timeout the call could still be running
+            # in the subprocess
+            self.reusable = False
+            raise
 
     def _run_s(self, func, timeout, *args, **kwargs):
         return self._run_with_log(func, timeout, *args, **kwargs)
@@ -430,17 +908,38 @@ class BulkInstanceInteropHelper(InstanceInteropHelper):
 
 class SshRemoteDriver(remote.RemoteDriver):
     def setup_remote(self, engine):
-        global _global_remote_semaphore
+        global _remote_scheduler
+        global _subprocess_pool
         global INFRA
 
-        _global_remote_semaphore = semaphore.Semaphore(
-            CONF.global_remote_threshold)
+        _remote_scheduler = scheduler.FairScheduler(
+            CONF.global_remote_threshold, CONF.cluster_remote_threshold,
+            dict((tenant_id, float(weight)) for tenant_id, weight
+                 in six.iteritems(CONF.remote_tenant_weights)))
+
+        _subprocess_pool = procutils.SubprocessPool(
+            CONF.subprocess_pool_min_size, CONF.subprocess_pool_max_size,
+            CONF.subprocess_max_tasks, CONF.subprocess_max_connections)
 
         INFRA = engine
 
+        metrics.register_gauge('remote.slots', _remote_scheduler.stats)
+
     def get_remote(self, instance):
         return InstanceInteropHelper(instance)
 
     def get_userdata_template(self):
         # SSH does not need any instance customization
         return ""
+
+    def close_cluster_connections(self, cluster):
+        _connection_pool.close_cluster(cluster.id)
+        _session_cache.close_cluster(cluster.id)
+
+    def close_idle_connections(self):
+        _connection_pool.close_idle()
+        _session_cache.close_idle()
+        neutron.close_expired_proxies()
+
+    def get_remote_stats(self):
+        return _remote_scheduler.stats()
@@ -0,0 +1,58 @@
+# Copyright (c) 2014 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Timelines of clusters provisioning.
+
+Every status change of a cluster is recorded by the database layer,
+provisioning steps are recorded with the helpers below. Steps of
+a particular instance refer to it by name.
+"""
+
+import contextlib
+
+from sahara import conductor as c
+from sahara import context
+from sahara import exceptions as ex
+from sahara.openstack.common import log as logging
+from sahara.openstack.common import timeutils
+
+
+conductor = c.API
+LOG = logging.getLogger(__name__)
+
+
+def add_step(cluster, name, start_time, end_time=None, instance=None):
+    values = {'event_type': 'step',
+              'name': name,
+              'start_time': start_time,
+              'end_time': end_time or timeutils.utcnow()}
+    if instance is not None:
+        values['instance_name'] = instance.instance_name
+
+    try:
+        conductor.timeline_event_add(context.ctx(), cluster, values)
+    except ex.NotFoundException:
+        LOG.debug("Step %s is not recorded since cluster %s has been "
+                  "deleted", name, cluster.name)
+
+
+@contextlib.contextmanager
+def step(cluster, name, instance=None):
+    """Records the step of the cluster, even if it fails."""
+    start_time = timeutils.utcnow()
+    try:
+        yield
+    finally:
+        add_step(cluster, name, start_time, instance=instance)